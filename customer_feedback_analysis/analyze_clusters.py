@@ -1,27 +1,50 @@
 import json
+import os
 import numpy as np
 from collections import defaultdict
+from cluster_model import load_latest
+from embedding_cache import EmbeddingCache
+from encoding_pool import get_shared_encoder
+from feedback_store import ColumnarFeedback, save_columnar
+from instrumentation import stage
+from quantized_embeddings import load_embeddings
+from theme_labeling import (THEME_SEEDS, UNASSIGNED_THEME, centroid_distances, cluster_centroids, encode_theme_column,
+                            label_clusters, match_themes, theme_prototypes)
 
 def main():
     feedback_filepath = "sample_feedback.json"
     labels_filepath = "cluster_labels.npy"
     output_filepath = "clustered_feedback_analyzed.json"
+    output_format = "columnar"  # "columnar" writes memory-mappable column files; "json" also exports them as a list of dicts
+    columnar_output_dir = "clustered_feedback_analyzed"
+    export_json = False  # Also write output_filepath when using the columnar format
+    use_dedup = False  # Set True when cluster_labels.npy holds one label per deduplicated representative
+    group_ids_filepath = "feedback_group_ids.npy"  # Row-to-representative mapping, from dedup_feedback.py
+    model_dir = "cluster_models"  # Saved cluster models; the latest one stores the theme map
     num_samples_to_print = 4 # Number of feedback samples to print per cluster
+    theme_labeling = "centroid"  # "centroid" labels whole clusters, "row" labels each row, "manual" uses cluster_to_theme_map
+    theme_confidence_threshold = 0.3  # Minimum cosine similarity to a theme; below it the theme is "Unassigned"
+    embeddings_filepath = "feedback_embeddings.npy"
+    model_name = 'all-MiniLM-L6-v2'
+    cache_dir = "embedding_cache"  # Shared with embed_feedback.py; theme seeds are only encoded once
 
     # 1. Load feedback strings
-    try:
-        with open(feedback_filepath, 'r') as f:
-            feedback_strings = json.load(f)
-        print(f"Successfully loaded {len(feedback_strings)} feedback strings from {feedback_filepath}")
-    except FileNotFoundError:
-        print(f"Error: The file {feedback_filepath} was not found.")
-        return
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from {feedback_filepath}.")
-        return
-    except Exception as e:
-        print(f"An unexpected error occurred while reading {feedback_filepath}: {e}")
-        return
+    with stage("load_feedback") as metrics:
+        try:
+            with open(feedback_filepath, 'r') as f:
+                feedback_strings = json.load(f)
+            print(f"Successfully loaded {len(feedback_strings)} feedback strings from {feedback_filepath}")
+            metrics.rows = len(feedback_strings)
+            metrics.read_file(feedback_filepath)
+        except FileNotFoundError:
+            print(f"Error: The file {feedback_filepath} was not found.")
+            return
+        except json.JSONDecodeError:
+            print(f"Error: Could not decode JSON from {feedback_filepath}.")
+            return
+        except Exception as e:
+            print(f"An unexpected error occurred while reading {feedback_filepath}: {e}")
+            return
 
     # 2. Load cluster labels
     try:
@@ -34,6 +57,27 @@ def main():
         print(f"An unexpected error occurred while reading {labels_filepath}: {e}")
         return
 
+    # Expand representative labels back to every original feedback row
+    if use_dedup:
+        try:
+            group_ids = np.load(group_ids_filepath)
+            print(f"Successfully loaded row mapping for {len(group_ids)} feedback rows from {group_ids_filepath}")
+        except FileNotFoundError:
+            print(f"Error: The file {group_ids_filepath} was not found. Run dedup_feedback.py first.")
+            return
+        except Exception as e:
+            print(f"An unexpected error occurred while reading {group_ids_filepath}: {e}")
+            return
+        if len(group_ids) and group_ids.max() >= len(cluster_labels):
+            print(f"Error: {group_ids_filepath} refers to representatives beyond the {len(cluster_labels)} cluster labels.")
+            return
+        representative_labels = cluster_labels
+        representative_weights = np.bincount(group_ids, minlength=len(cluster_labels))  # Rows per representative
+        cluster_labels = cluster_labels[group_ids]
+    else:
+        representative_labels = cluster_labels
+        representative_weights = None
+
     # Validate inputs
     if not isinstance(feedback_strings, list) or not all(isinstance(item, str) for item in feedback_strings):
         print(f"Error: Expected {feedback_filepath} to contain a list of strings.")
@@ -47,10 +91,12 @@ def main():
     
     if not feedback_strings:
         print("Warning: Feedback file is empty. No analysis will be performed.")
-        # Create an empty JSON file for consistency
-        with open(output_filepath, 'w') as f:
-            json.dump([], f)
-        print(f"Saved empty list to {output_filepath}")
+        # Create an empty output for consistency
+        save_columnar(columnar_output_dir, [], cluster_labels, [], [])
+        print(f"Saved empty columns to {columnar_output_dir}/")
+        if output_format == "json" or export_json:
+            ColumnarFeedback(columnar_output_dir).export_json(output_filepath)
+            print(f"Saved empty list to {output_filepath}")
         return
 
     # Group feedback by cluster ID for theme analysis
@@ -65,7 +111,9 @@ def main():
             print(f"  Sample {i+1}: {text}")
     print("\n------------------------------------------------------------")
 
-    # 3. Manually define this map after observing the output above.
+    # 3. Map clusters to themes. The map below is only used in "manual" mode;
+    # otherwise it is replaced by automatic labeling against the theme seeds.
+    # Manually define this map after observing the output above.
     # This is a placeholder. The actual mapping will be determined by inspecting the output.
     cluster_to_theme_map = {
         0: "New Feature Suggestions",
@@ -74,7 +122,70 @@ def main():
         3: "Positive Product Usability"
         # Add more if there are more clusters, or adjust based on actual cluster IDs found
     }
-    
+
+    predefined_themes = list(THEME_SEEDS)
+    row_themes = None
+    row_centroid_distance = None  # Lets report_clusters.py pick the most representative samples
+
+    try:
+        cluster_model = load_latest(model_dir)
+    except Exception as e:
+        print(f"Warning: Could not load cluster model from {model_dir}: {e}")
+        cluster_model = None
+
+    if theme_labeling in ("centroid", "row"):
+        def encode(texts):
+            # The model is only loaded when theme seeds are missing from the embedding cache.
+            return get_shared_encoder(model_name).encode(texts)
+
+        with stage("theme_prototypes"):
+            try:
+                embeddings = load_embeddings(embeddings_filepath, mmap_mode='r')
+                theme_names, prototypes = theme_prototypes(THEME_SEEDS, EmbeddingCache(cache_dir, model_name), encode)
+            except FileNotFoundError:
+                print(f"Error: The file {embeddings_filepath} was not found.")
+                return
+            except Exception as e:
+                print(f"An error occurred while preparing theme prototypes: {e}")
+                return
+        if embeddings.ndim != 2 or len(embeddings) != len(representative_labels):
+            print(f"Error: Expected {embeddings_filepath} to hold one embedding per cluster label, got shape {embeddings.shape}.")
+            return
+
+        with stage("theme_labeling", rows=len(embeddings)):
+            centroids = cluster_centroids(embeddings, representative_labels, sample_weight=representative_weights)
+            row_centroid_distance = centroid_distances(embeddings, representative_labels, centroids)
+            if use_dedup:
+                row_centroid_distance = row_centroid_distance[group_ids]
+
+            if theme_labeling == "centroid":
+                cluster_to_theme_map, confidences = label_clusters(centroids, theme_names, prototypes, theme_confidence_threshold)
+                print("\nAutomatic theme labels per cluster:")
+                for cid, theme in cluster_to_theme_map.items():
+                    print(f"  Cluster {cid}: {theme} (similarity {confidences[cid]:.3f})")
+                if cluster_model is not None and cluster_model.n_clusters == len(cluster_to_theme_map):
+                    cluster_model.theme_map = dict(cluster_to_theme_map)
+                    cluster_model.update(model_dir)
+                    print(f"Saved theme map with cluster model v{cluster_model.version}.")
+            else:
+                theme_indices, _ = match_themes(embeddings, prototypes, theme_confidence_threshold)
+                names = np.array(theme_names + [UNASSIGNED_THEME])
+                row_themes = names[np.where(theme_indices >= 0, theme_indices, len(theme_names))]
+                if use_dedup:
+                    row_themes = row_themes[group_ids]
+                theme_counts = dict(zip(*np.unique(row_themes, return_counts=True)))
+                print(f"\nAutomatic theme labels per row: {theme_counts}")
+
+    elif cluster_model is not None and cluster_model.theme_map:
+        # Cluster IDs are aligned across refits, so a theme map saved with the model stays valid.
+        cluster_to_theme_map = dict(cluster_model.theme_map)
+        print(f"Using theme map saved with cluster model v{cluster_model.version}.")
+    elif cluster_model is not None:
+        # Persist the manual map with the model so later runs and assign mode reuse it.
+        cluster_model.theme_map = dict(cluster_to_theme_map)
+        cluster_model.update(model_dir)
+        print(f"Saved theme map with cluster model v{cluster_model.version}.")
+
     # Ensure all found cluster IDs are in the map, if not, assign a default
     unique_cluster_ids = np.unique(cluster_labels)
     for cid in unique_cluster_ids:
@@ -83,44 +194,49 @@ def main():
             cluster_to_theme_map[cid] = f"Unmapped Theme for Cluster {cid}"
 
 
-    predefined_themes = [
-        "Positive Product Usability",
-        "Customer Support Complaints",
-        "Pricing Plan Questions",
-        "New Feature Suggestions"
-    ]
-    print(f"\nPredefined themes for mapping: {predefined_themes}")
-    print("Please update 'cluster_to_theme_map' in the script based on the samples.")
+    if theme_labeling == "manual":
+        print(f"\nPredefined themes for mapping: {predefined_themes}")
+        print("Please update 'cluster_to_theme_map' in the script based on the samples.")
 
 
-    # 4. Create the list of dictionaries
-    analyzed_feedback_list = []
-    for feedback, label in zip(feedback_strings, cluster_labels):
-        theme_label = cluster_to_theme_map.get(label, "Unknown Theme") # Default if label not in map
-        analyzed_feedback_list.append({
-            'feedback_text': feedback,
-            'cluster_id': int(label), # Ensure label is native int for JSON
-            'theme_label': theme_label
-        })
-
-    # 5. Save to JSON
-    try:
-        with open(output_filepath, 'w') as f:
-            json.dump(analyzed_feedback_list, f, indent=2)
-        print(f"\nAnalyzed feedback saved to {output_filepath}")
-    except Exception as e:
-        print(f"An error occurred while saving to {output_filepath}: {e}")
-        return
+    # 4. Build the theme column as dictionary codes into a small list of theme names
+    if row_themes is not None:
+        theme_names, theme_codes = np.unique(row_themes, return_inverse=True)
+        theme_names = theme_names.tolist()
+    else:
+        theme_names, theme_codes = encode_theme_column(cluster_labels, cluster_to_theme_map) # "Unknown Theme" if label not in map
+
+    # 5. Save the analyzed feedback
+    with stage("save_output", rows=len(feedback_strings)) as metrics:
+        try:
+            # The column files are always written; the JSON file is exported from them row by row.
+            save_columnar(columnar_output_dir, feedback_strings, cluster_labels, theme_codes, theme_names,
+                          centroid_distance=row_centroid_distance)
+            print(f"\nAnalyzed feedback saved to {columnar_output_dir}/")
+            for column_file in os.listdir(columnar_output_dir):
+                metrics.wrote_file(os.path.join(columnar_output_dir, column_file))
+            if output_format == "json" or export_json:
+                ColumnarFeedback(columnar_output_dir).export_json(output_filepath)
+                print(f"\nAnalyzed feedback saved to {output_filepath}")
+                metrics.wrote_file(output_filepath)
+        except Exception as e:
+            print(f"An error occurred while saving the analyzed feedback: {e}")
+            return
 
     # 6. Print the first 5 entries for verification
     try:
-        with open(output_filepath, 'r') as f:
-            first_five = json.load(f)[:5]
-        print(f"\nFirst 5 entries from {output_filepath}:")
+        if output_format == "columnar":
+            first_five = ColumnarFeedback(columnar_output_dir).head(5)
+            source = columnar_output_dir
+        else:
+            with open(output_filepath, 'r') as f:
+                first_five = json.load(f)[:5]
+            source = output_filepath
+        print(f"\nFirst 5 entries from {source}:")
         for i, entry in enumerate(first_five):
             print(f" Entry {i+1}: {entry}")
     except Exception as e:
-        print(f"An error occurred while reading back and printing {output_filepath}: {e}")
+        print(f"An error occurred while reading back and printing the analyzed feedback: {e}")
 
 if __name__ == "__main__":
     main()
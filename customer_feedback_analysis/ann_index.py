@@ -0,0 +1,259 @@
+import json
+import os
+import numpy as np
+from graph_store import normalize_rows, top_k_indices
+from quantized_embeddings import (check_dtype, load_embeddings, open_embeddings_output, save_embeddings,
+                                  write_embedding_rows)
+
+# Every index searches by cosine similarity and returns (ids, scores) arrays of shape
+# (num_queries, top_k); rows with fewer than top_k results are padded with id -1.
+
+def _pad(ids, scores, top_k):
+    missing = top_k - ids.shape[1]
+    if missing <= 0:
+        return ids, scores
+    return (np.pad(ids, ((0, 0), (0, missing)), constant_values=-1),
+            np.pad(scores, ((0, 0), (0, missing)), constant_values=-np.inf))
+
+def _write_meta(index_dir, meta):
+    with open(os.path.join(index_dir, "index.json"), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+class ExactIndex:
+    """Brute-force search: one matrix product per query batch. Recall is always 1."""
+    kind = "exact"
+
+    def __init__(self):
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+
+    def build(self, vectors):
+        self.vectors = np.ascontiguousarray(normalize_rows(vectors), dtype=np.float32)
+        return self
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, top_k=5):
+        queries = normalize_rows(np.atleast_2d(queries))
+        if len(self.vectors) == 0:
+            return _pad(np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32), top_k)
+        scores = queries @ self.vectors.T
+        ids = top_k_indices(scores, top_k)
+        return _pad(ids, np.take_along_axis(scores, ids, axis=1), top_k)
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "vectors.npy"), self.vectors)
+        _write_meta(index_dir, {'kind': self.kind, 'params': {}})
+
+    def _load(self, index_dir):
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode='r')
+        return self
+
+class IVFIndex:
+    """
+    Inverted-file index. A k-means coarse quantizer splits the vectors into nlist cells, and
+    each cell's vectors are stored contiguously. A query scores only the vectors in its nprobe
+    nearest cells. Raising nprobe trades latency for recall; nprobe == nlist is exact search.
+    On disk the cell vectors are kept as dtype ("float32", "float16" or "int8"), so an index over
+    a quantized graph store is no larger than the store's own embedding file.
+    """
+    kind = "ivf"
+
+    def __init__(self, nlist=None, nprobe=8, train_size=100000, random_state=42, dtype="float32"):
+        self.nlist = nlist  # Defaults to about sqrt(n) cells
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.random_state = random_state
+        self.dtype = check_dtype(dtype)
+        self._vectors_path = None  # Set when build() wrote the cell vectors to disk
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+
+    def build(self, vectors, chunk_size=65536, index_dir=None):
+        """
+        Trains the coarse quantizer on a sample, then assigns and reorders vectors chunk_size rows
+        at a time, so vectors can be a memory map (or an Int8Embeddings view) larger than RAM.
+        With index_dir the cell-ordered vectors are written straight to index_dir/vectors.npy
+        in self.dtype and memory-mapped back, instead of being held in memory until save().
+        """
+        from sklearn.cluster import MiniBatchKMeans
+        if not hasattr(vectors, 'shape'):
+            vectors = np.asarray(vectors, dtype=np.float32)
+        num_vectors = len(vectors)
+        if num_vectors == 0:
+            return self
+        nlist = max(1, min(self.nlist or int(np.sqrt(num_vectors)), num_vectors))
+        rng = np.random.default_rng(self.random_state)
+        sample = np.sort(rng.choice(num_vectors, size=min(num_vectors, self.train_size), replace=False))
+        kmeans = MiniBatchKMeans(n_clusters=nlist, random_state=self.random_state, batch_size=4096, n_init=3)
+        kmeans.fit(normalize_rows(vectors[sample]))
+        self.centroids = np.ascontiguousarray(normalize_rows(kmeans.cluster_centers_))
+
+        assignments = np.empty(num_vectors, dtype=np.int64)
+        for start in range(0, num_vectors, chunk_size):
+            chunk = normalize_rows(vectors[start:start + chunk_size])
+            assignments[start:start + chunk_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        # Stable sort keeps ids ascending inside each cell, so ties still go to the lower id.
+        self.ids = np.argsort(assignments, kind='stable')
+        self.list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=nlist), out=self.list_offsets[1:])
+        del assignments
+
+        dim = vectors.shape[1]
+        if index_dir is None:
+            cell_vectors, cell_scales = np.empty((num_vectors, dim), dtype=np.float32), None
+        else:
+            os.makedirs(index_dir, exist_ok=True)
+            vectors_path = os.path.join(index_dir, "vectors.npy")
+            cell_vectors, cell_scales = open_embeddings_output(vectors_path, num_vectors, dim, self.dtype)
+        for start in range(0, num_vectors, chunk_size):
+            chunk_ids = self.ids[start:start + chunk_size]
+            order = np.argsort(chunk_ids)  # Read the source rows in file order
+            rows = np.empty((len(chunk_ids), dim), dtype=np.float32)
+            rows[order] = normalize_rows(vectors[chunk_ids[order]])
+            write_embedding_rows(cell_vectors, cell_scales, start, rows)
+        if index_dir is not None:
+            cell_vectors.flush()
+            if cell_scales is not None:
+                cell_scales.flush()
+            del cell_vectors, cell_scales
+            cell_vectors = load_embeddings(vectors_path, mmap_mode='r')
+            self._vectors_path = os.path.abspath(vectors_path)
+        self.vectors = cell_vectors
+        return self
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, queries, top_k=5):
+        queries = normalize_rows(np.atleast_2d(queries))
+        ids = np.full((len(queries), top_k), -1, dtype=np.int64)
+        scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        if len(self.ids) == 0:
+            return ids, scores
+        probes = top_k_indices(queries @ self.centroids.T, self.nprobe)
+        for row, cells in enumerate(probes):
+            positions = np.concatenate([np.arange(self.list_offsets[cell], self.list_offsets[cell + 1])
+                                        for cell in np.sort(cells)])
+            candidate_scores = np.asarray(self.vectors[positions], dtype=np.float32) @ queries[row]
+            best = top_k_indices(candidate_scores[np.newaxis], top_k)[0]
+            ids[row, :len(best)] = self.ids[positions[best]]
+            scores[row, :len(best)] = candidate_scores[best]
+        return ids, scores
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "centroids.npy"), self.centroids)
+        np.save(os.path.join(index_dir, "list_offsets.npy"), self.list_offsets)
+        np.save(os.path.join(index_dir, "ids.npy"), self.ids)
+        vectors_path = os.path.join(index_dir, "vectors.npy")
+        if self._vectors_path != os.path.abspath(vectors_path):  # Not already written by build()
+            save_embeddings(vectors_path, self.vectors, dtype=self.dtype)
+        _write_meta(index_dir, {'kind': self.kind, 'params': {
+            'nlist': len(self.centroids), 'nprobe': self.nprobe, 'train_size': self.train_size,
+            'random_state': self.random_state, 'dtype': self.dtype}})
+
+    def _load(self, index_dir):
+        self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+        self.list_offsets = np.load(os.path.join(index_dir, "list_offsets.npy"))
+        self.ids = np.load(os.path.join(index_dir, "ids.npy"), mmap_mode='r')
+        self.vectors = load_embeddings(os.path.join(index_dir, "vectors.npy"), mmap_mode='r')
+        return self
+
+class HNSWIndex:
+    """
+    Hierarchical navigable small-world graph via the optional hnswlib package
+    (pip install hnswlib). M and ef_construction set graph quality at build time;
+    ef_search trades latency for recall per query.
+    """
+    kind = "hnsw"
+
+    def __init__(self, M=16, ef_construction=200, ef_search=64, num_threads=-1):
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.num_threads = num_threads
+        self._index = None
+        self._count = 0
+
+    @staticmethod
+    def _hnswlib():
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("HNSWIndex needs the optional hnswlib package: pip install hnswlib")
+        return hnswlib
+
+    def build(self, vectors):
+        hnswlib = self._hnswlib()
+        vectors = np.ascontiguousarray(normalize_rows(vectors), dtype=np.float32)
+        self._count = len(vectors)
+        self._index = hnswlib.Index(space='cosine', dim=vectors.shape[1])
+        self._index.init_index(max_elements=max(self._count, 1), ef_construction=self.ef_construction, M=self.M)
+        if self._count:
+            self._index.add_items(vectors, np.arange(self._count), num_threads=self.num_threads)
+        self._index.set_ef(self.ef_search)
+        return self
+
+    def __len__(self):
+        return self._count
+
+    def set_ef(self, ef_search):
+        self.ef_search = ef_search
+        if self._index is not None:
+            self._index.set_ef(ef_search)
+
+    def search(self, queries, top_k=5):
+        queries = normalize_rows(np.atleast_2d(queries))
+        k = min(top_k, self._count)
+        if k == 0:
+            return _pad(np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32), top_k)
+        labels, distances = self._index.knn_query(queries, k=k, num_threads=self.num_threads)
+        return _pad(labels.astype(np.int64), (1 - distances).astype(np.float32), top_k)
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        self._index.save_index(os.path.join(index_dir, "hnsw.bin"))
+        _write_meta(index_dir, {'kind': self.kind, 'dim': self._index.dim, 'count': self._count, 'params': {
+            'M': self.M, 'ef_construction': self.ef_construction, 'ef_search': self.ef_search,
+            'num_threads': self.num_threads}})
+
+    def _load(self, index_dir, dim=None, count=None):
+        hnswlib = self._hnswlib()
+        self._count = count
+        self._index = hnswlib.Index(space='cosine', dim=dim)
+        self._index.load_index(os.path.join(index_dir, "hnsw.bin"), max_elements=max(count, 1))
+        self._index.set_ef(self.ef_search)
+        return self
+
+INDEX_TYPES = {cls.kind: cls for cls in (ExactIndex, IVFIndex, HNSWIndex)}
+
+def build_index(kind, vectors, index_dir=None, **params):
+    """
+    Builds an index of the given kind ("exact", "ivf" or "hnsw") over vectors. With index_dir
+    the index is also saved there; an IVF index then streams its vectors to disk while building.
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index kind {kind!r}; expected one of {sorted(INDEX_TYPES)}.")
+    index = INDEX_TYPES[kind](**params)
+    if index_dir is None:
+        return index.build(vectors)
+    if kind == "ivf":
+        index.build(vectors, index_dir=index_dir)
+    else:
+        index.build(vectors)
+    index.save(index_dir)
+    return index
+
+def load_index(index_dir, **overrides):
+    """Loads an index saved with save(); search-time parameters such as nprobe or ef_search can be overridden."""
+    with open(os.path.join(index_dir, "index.json"), 'r') as f:
+        meta = json.load(f)
+    params = dict(meta['params'], **overrides)
+    index = INDEX_TYPES[meta['kind']](**params)
+    if meta['kind'] == "hnsw":
+        return index._load(index_dir, dim=meta['dim'], count=meta['count'])
+    return index._load(index_dir)
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+class MicroBatcher:
+    """
+    Gathers concurrent requests into micro-batches for a batch function such as graphrag_batch.
+    A batch is dispatched as soon as it holds max_batch_size requests, or when its oldest request
+    has waited long enough. That wait is max_wait_ms, shortened when needed so that the wait plus
+    the in-flight batch plus this batch stays within p99_target_ms (batch time is a moving average).
+    process_batch(items) -> results runs on a single worker thread, so the event loop keeps accepting
+    requests while the model encodes, and the next batch fills up in the meantime. A result that is an
+    Exception instance fails only its own request; an exception raised by process_batch fails the batch.
+    """
+
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=10.0, p99_target_ms=None, window=1000):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.p99_target_ms = p99_target_ms
+        self.batch_ms = 0.0  # Moving average of process_batch wall time
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self._latencies_ms = deque(maxlen=window)
+        self._pending = deque()  # (item, future, enqueued_at)
+        self._wakeup = None
+        self._task = None
+        self._executor = None
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batch")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._pending:
+            _, future, _ = self._pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("MicroBatcher stopped"))
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def submit(self, item):
+        """Queues one request and returns its result once its batch has been processed."""
+        if self._task is None:
+            raise RuntimeError("MicroBatcher.start() has not been awaited")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        self._wakeup.set()
+        return await future
+
+    def wait_ms(self):
+        """Current wait budget for the oldest queued request."""
+        if self.p99_target_ms is None:
+            return self.max_wait_ms
+        return max(0.0, min(self.max_wait_ms, self.p99_target_ms - 2 * self.batch_ms))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            deadline = self._pending[0][2] + self.wait_ms() / 1000
+            while len(self._pending) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch_size))]
+            batch = [entry for entry in batch if not entry[1].done()]  # Drop callers that gave up
+            if batch:
+                await self._dispatch(loop, batch)
+
+    async def _dispatch(self, loop, batch):
+        start = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self._executor, self.process_batch, [item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"process_batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            self.errors += len(batch)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        elapsed_ms = (finished - start) * 1000
+        self.batch_ms = elapsed_ms if self.batches == 0 else 0.8 * self.batch_ms + 0.2 * elapsed_ms
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future, enqueued_at), result in zip(batch, results):
+            self._latencies_ms.append((finished - enqueued_at) * 1000)
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                self.errors += 1
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        latencies = np.asarray(self._latencies_ms)
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'errors': self.errors,
+            'queued': len(self._pending),
+            'mean_batch_size': round(self.items / self.batches, 2) if self.batches else None,
+            'batch_ms': round(self.batch_ms, 3),
+            'wait_ms': round(self.wait_ms(), 3),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+            'p99_ms': round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+        }
+
+# Minimal HTTP/1.1 stand-in on asyncio streams: POST / takes a JSON request and answers with the
+# JSON result, GET /stats returns the batcher statistics. Connections are kept alive between requests.
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+async def read_http_message(reader):
+    """Reads one request or response; returns (start_line, headers, body), or None at end of stream."""
+    start_line = await reader.readline()
+    if not start_line:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return start_line.decode('latin-1').strip(), headers, body
+
+def write_http_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    writer.write((f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                  f"Content-Type: application/json; charset=utf-8\r\n"
+                  f"Content-Length: {len(body)}\r\n"
+                  f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1') + body)
+
+async def handle_http_request(batcher, start_line, body, validate=None):
+    """Routes one request and returns (status, payload)."""
+    method, _, rest = start_line.partition(" ")
+    path = rest.split(" ")[0]
+    if method == "GET" and path == "/stats":
+        return 200, batcher.stats()
+    if method != "POST" or path != "/":
+        return 404, {'error': f"{method} {path} is not served; use POST / or GET /stats"}
+    try:
+        request = json.loads(body.decode('utf-8'))
+        if validate is not None:
+            request = validate(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        return 400, {'error': str(e)}
+    try:
+        return 200, await batcher.submit(request)
+    except Exception as e:
+        return 500, {'error': str(e)}
+
+async def start_http_server(batcher, host="127.0.0.1", port=8080, validate=None):
+    """Starts serving batcher over HTTP on an already running loop; port 0 picks a free port."""
+    async def handle_connection(reader, writer):
+        try:
+            while True:
+                message = await read_http_message(reader)
+                if message is None:
+                    break
+                start_line, headers, body = message
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await handle_http_request(batcher, start_line, body, validate=validate)
+                write_http_response(writer, status, payload, keep_alive=keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # Client went away or sent a malformed message
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_connection, host, port)
+
+def run_http_server(batcher, host="127.0.0.1", port=8080, validate=None):
+    """Blocks serving batcher over HTTP until interrupted."""
+    async def serve():
+        async with batcher:
+            server = await start_http_server(batcher, host, port, validate=validate)
+            print(f"Serving on http://{host}:{server.sockets[0].getsockname()[1]} "
+                  f"(max_batch_size={batcher.max_batch_size}, max_wait_ms={batcher.max_wait_ms}, "
+                  f"p99_target_ms={batcher.p99_target_ms})")
+            async with server:
+                await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("Server stopped.")
+
+class HTTPClient:
+    """Keep-alive JSON client for the stand-in server, used by the load benchmark."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def post(self, payload, path="/"):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self._writer.write((f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+                            ).encode('latin-1') + body)
+        await self._writer.drain()
+        message = await read_http_message(self._reader)
+        if message is None:
+            raise ConnectionError("Server closed the connection")
+        status_line, _, response_body = message
+        status = int(status_line.split(" ")[1])
+        return status, json.loads(response_body.decode('utf-8'))
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
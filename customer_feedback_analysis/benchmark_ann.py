@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from ann_index import build_index, load_index
+from benchmark_pipeline import append_results, current_commit, load_encoder, print_table
+from generate_sample_feedback import generate_feedback_corpus
+
+ANN_COLUMNS = ['index', 'params', 'build_s', 'load_s', 'recall_at_k', 'mean_ms', 'p99_ms']
+
+def recall_at_k(approx_ids, exact_ids):
+    """Mean fraction of the exact top-k ids that the approximate search also returned."""
+    hits = [len(set(approx.tolist()) & set(exact.tolist())) for approx, exact in zip(approx_ids, exact_ids)]
+    return float(np.mean(hits)) / exact_ids.shape[1]
+
+def time_queries(index, queries, top_k):
+    """Answers queries one at a time, like graphrag() does, and returns (ids, per-query latencies in ms)."""
+    ids = np.empty((len(queries), top_k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for row, query in enumerate(queries):
+        start = time.perf_counter()
+        ids[row] = index.search(query, top_k)[0][0]
+        latencies[row] = (time.perf_counter() - start) * 1000
+    return ids, latencies
+
+def benchmark_index(kind, vectors, queries, exact_ids, top_k, work_dir, build_params, sweep_param, sweep_values):
+    """Builds, saves and reloads one index, then sweeps its search-time parameter; returns one record per value."""
+    start = time.perf_counter()
+    index = build_index(kind, vectors, **build_params)
+    build_s = time.perf_counter() - start
+    index_dir = os.path.join(work_dir, kind)
+    index.save(index_dir)
+    records = []
+    for value in sweep_values:
+        start = time.perf_counter()
+        index = load_index(index_dir, **({sweep_param: value} if sweep_param else {}))
+        load_s = time.perf_counter() - start
+        ids, latencies = time_queries(index, queries, top_k)
+        records.append({
+            'index': kind,
+            'params': f"{sweep_param}={value}" if sweep_param else "-",
+            'build_s': round(build_s, 3),
+            'load_s': round(load_s, 4),
+            'recall_at_k': round(recall_at_k(ids, exact_ids), 4),
+            'mean_ms': round(float(latencies.mean()), 3),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        })
+    return records
+
+def main():
+    """
+    Measures recall@k against exact search and per-query latency for every retrieval index,
+    sweeping each index's search-time knob, and appends the results to a CSV table.
+    """
+    num_vectors = 100_000
+    num_queries = 200
+    top_k = 10
+    encoder_name = "stub"  # Or a SentenceTransformer model name, see benchmark_pipeline.load_encoder
+    ivf_params = {'nlist': None}  # None picks about sqrt(num_vectors) cells
+    ivf_nprobe_values = [1, 2, 4, 8, 16, 32]
+    hnsw_params = {'M': 16, 'ef_construction': 200}
+    hnsw_ef_values = [16, 32, 64, 128, 256]
+    results_filepath = "ann_benchmark_results.csv"
+
+    encoder = load_encoder(encoder_name)
+    print(f"Encoding {num_vectors} corpus texts and {num_queries} queries...")
+    corpus = list(generate_feedback_corpus(num_vectors, seed=1, duplicate_rate=0.0))
+    queries = list(generate_feedback_corpus(num_queries, seed=2, duplicate_rate=0.0))
+    vectors = np.asarray(encoder.encode(corpus), dtype=np.float32)
+    query_vectors = np.asarray(encoder.encode(queries), dtype=np.float32)
+
+    work_dir = tempfile.mkdtemp(prefix="ann_bench_")
+    try:
+        print("Benchmarking exact search...")
+        exact_ids, _ = time_queries(build_index("exact", vectors), query_vectors, top_k)
+        records = benchmark_index("exact", vectors, query_vectors, exact_ids, top_k, work_dir, {}, None, [None])
+        print("Benchmarking IVF...")
+        records += benchmark_index("ivf", vectors, query_vectors, exact_ids, top_k, work_dir, ivf_params,
+                                   'nprobe', ivf_nprobe_values)
+        try:
+            print("Benchmarking HNSW...")
+            records += benchmark_index("hnsw", vectors, query_vectors, exact_ids, top_k, work_dir, hnsw_params,
+                                       'ef_search', hnsw_ef_values)
+        except ImportError as e:
+            print(f"  Skipping HNSW: {e}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = current_commit()
+    print(f"\nRecall@{top_k} vs latency over {num_vectors} vectors (commit {commit}, encoder: {encoder_name}):")
+    print_table(records, ANN_COLUMNS, width=14)
+    append_results(results_filepath, records, ANN_COLUMNS, commit, num_vectors=num_vectors, top_k=top_k)
+    print(f"\nResults appended to {results_filepath}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import contextlib
+import csv
+import importlib.util
+import io
+import os
+import random
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from cluster_feedback import EmbeddingShards, fit_minibatch_kmeans
+from embed_feedback import embed_streaming, iter_feedback_jsonl
+from embedding_cache import EmbeddingCache
+from feedback_store import save_columnar
+from generate_sample_feedback import generate_feedback_corpus, write_feedback_jsonl
+from report_clusters import report_columnar
+from stub_encoder import HashingEncoder
+from theme_labeling import THEME_SEEDS, centroid_distances, cluster_centroids, encode_theme_column, label_clusters, theme_prototypes
+
+GRAPH_RAG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "graph-rag.py")
+STAGE_COLUMNS = ['stage', 'size', 'wall_s', 'cpu_s', 'peak_traced_mb', 'max_rss_mb', 'rows_per_s']
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def load_encoder(encoder_name, **kwargs):
+    """HashingEncoder for "stub", so benchmarks run offline; otherwise the named SentenceTransformer model."""
+    if encoder_name == "stub":
+        return HashingEncoder()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(encoder_name, **kwargs)
+
+def measure(stage, size, rows, fn, trace_memory=True):
+    """Runs fn once and returns (result, record) with wall/CPU time, peak memory and throughput."""
+    if trace_memory:
+        tracemalloc.start()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    # Stage functions print progress meant for interactive runs; keep the benchmark output to the table.
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    peak_traced = None
+    if trace_memory:
+        peak_traced = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    record = {
+        'stage': stage,
+        'size': size,
+        'wall_s': round(wall, 4),
+        'cpu_s': round(cpu, 4),
+        'peak_traced_mb': None if peak_traced is None else round(peak_traced, 1),
+        # ru_maxrss is the process-wide high-water mark (KiB on Linux), not per stage.
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'rows_per_s': round(rows / wall, 1) if wall > 0 else None,
+    }
+    return result, record
+
+def load_graph_rag():
+    # graph-rag.py puts this directory on sys.path itself, so it shares these already imported modules.
+    spec = importlib.util.spec_from_file_location("graph_rag", GRAPH_RAG_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def benchmark_graph_retrieval(encoder, texts, num_nodes, num_queries, work_dir, seed=42):
+    """
+    Writes a random edge list over feedback strings, then times load_graph_store building the
+    on-disk graph store from it plus one graphrag_batch call over num_queries queries.
+    """
+    graph_rag = load_graph_rag()
+    graph_rag.model = encoder
+    graph_rag.use_query_cache = False  # Every query is answered from the store
+    rng = random.Random(seed)
+    nodes = list(dict.fromkeys(texts))[:num_nodes]
+    edges_filepath = os.path.join(work_dir, "graph_edges.csv")
+    with open(edges_filepath, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['source', 'target', 'relation'])
+        writer.writerows((node, rng.choice(nodes), "related") for node in nodes)
+    store = graph_rag.load_graph_store(os.path.join(work_dir, "graph_store"), edges_filepath)
+    graph_rag.graphrag_batch(rng.sample(nodes, min(num_queries, len(nodes))), store=store)
+    return store
+
+def run_size(size, work_dir, encoder, n_clusters=4, duplicate_rate=0.3, batch_size=4096, graph_nodes=20000,
+             graph_queries=20, trace_memory=True):
+    """Runs every stage once on a corpus of the given size and returns one record per stage."""
+    feedback_filepath = os.path.join(work_dir, "feedback.jsonl")
+    embeddings_filepath = os.path.join(work_dir, "embeddings.npy")
+    columnar_dir = os.path.join(work_dir, "analyzed")
+    records = []
+
+    def step(stage, rows, fn):
+        result, record = measure(stage, size, rows, fn, trace_memory=trace_memory)
+        records.append(record)
+        return result
+
+    step("generate", size, lambda: write_feedback_jsonl(
+        feedback_filepath, generate_feedback_corpus(size, seed=size, duplicate_rate=duplicate_rate)))
+    step("embed", size, lambda: embed_streaming(feedback_filepath, embeddings_filepath,
+                                                embeddings_filepath + ".checkpoint.json", encoder.encode,
+                                                batch_size=batch_size))
+    embeddings = EmbeddingShards([embeddings_filepath])
+    _, labels = step("cluster", size, lambda: fit_minibatch_kmeans(embeddings, n_clusters, batch_size=batch_size,
+                                                                   n_passes=1))
+
+    def analyze():
+        texts = list(iter_feedback_jsonl(feedback_filepath))
+        vectors = embeddings.shards[0]
+        theme_names, prototypes = theme_prototypes(THEME_SEEDS, EmbeddingCache(os.path.join(work_dir, "cache"), "stub"),
+                                                   encoder.encode)
+        centroids = cluster_centroids(vectors, labels)
+        theme_map, _ = label_clusters(centroids, theme_names, prototypes, 0.3)
+        names, codes = encode_theme_column(labels, theme_map)
+        save_columnar(columnar_dir, texts, labels, codes, names,
+                      centroid_distance=centroid_distances(vectors, labels, centroids))
+        return texts
+
+    texts = step("analyze", size, analyze)
+    step("report", size, lambda: report_columnar(columnar_dir))
+    # networkx is only needed for this stage; without it the stage is skipped, but its errors are never hidden.
+    if importlib.util.find_spec("networkx") is None:
+        print(f"  Skipping graph retrieval at size {size}: networkx is not installed.")
+    else:
+        num_nodes = min(size, graph_nodes)
+        step("graph_retrieval", num_nodes,
+             lambda: benchmark_graph_retrieval(encoder, texts, num_nodes, graph_queries, work_dir))
+    return records
+
+def print_table(records, columns=STAGE_COLUMNS, width=15):
+    print(" | ".join(f"{column:>{width}}" for column in columns))
+    for record in records:
+        print(" | ".join(f"{str(record[column]):>{width}}" for column in columns))
+
+def append_results(results_filepath, records, columns, commit, **tags):
+    """
+    Appends records to a CSV table that can be compared between commits. Every row gets the
+    commit, a timestamp and the tags (e.g. encoder=...), written before the record's columns.
+    """
+    fieldnames = ['commit', 'timestamp', *tags, *columns]
+    write_header = not os.path.exists(results_filepath)
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%S')
+    with open(results_filepath, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        if write_header:
+            writer.writeheader()
+        for record in records:
+            writer.writerow(dict(record, commit=commit, timestamp=timestamp, **tags))
+
+def main():
+    """
+    Times and memory-profiles every pipeline stage across corpus sizes and appends the results,
+    tagged with the current commit, to a CSV table that can be compared between commits.
+    """
+    sizes = [1_000, 10_000, 100_000]  # Up to 10_000_000; the corpus is streamed to disk, not held in memory
+    encoder_name = "stub"  # "stub" runs offline with HashingEncoder; otherwise a SentenceTransformer model name
+    duplicate_rate = 0.3
+    trace_memory = True  # tracemalloc gives per-stage peaks but slows pure-Python stages down noticeably
+    results_filepath = "benchmark_results.csv"
+    keep_work_dir = False
+
+    encoder = load_encoder(encoder_name)
+    commit = current_commit()
+    all_records = []
+    for size in sizes:
+        work_dir = tempfile.mkdtemp(prefix=f"feedback_bench_{size}_")
+        print(f"Benchmarking {size} rows in {work_dir}...")
+        try:
+            records = run_size(size, work_dir, encoder, duplicate_rate=duplicate_rate, trace_memory=trace_memory)
+        finally:
+            if not keep_work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        all_records.extend(records)
+
+    print(f"\nResults for commit {commit} (encoder: {encoder_name}):")
+    print_table(all_records)
+    append_results(results_filepath, all_records, STAGE_COLUMNS, commit, encoder=encoder_name)
+    print(f"\nResults appended to {results_filepath}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+from benchmark_ann import recall_at_k
+from benchmark_pipeline import append_results, current_commit, load_encoder, print_table
+from cluster_feedback import EmbeddingShards, fit_minibatch_kmeans
+from cluster_model import assign_nearest_centroid
+from generate_sample_feedback import generate_feedback_corpus
+from graph_store import GraphStore
+from quantized_embeddings import EMBEDDING_DTYPES, save_embeddings, scales_path
+
+QUANTIZATION_COLUMNS = ['dtype', 'feedback_mb', 'graph_mb', 'assign_agreement', 'refit_ari', 'recall_at_k',
+                        'search_ms_per_query']
+
+def file_bytes(*filepaths):
+    return sum(os.path.getsize(filepath) for filepath in filepaths if os.path.exists(filepath))
+
+def clustering_accuracy(embeddings_filepath, reference_labels, reference_centroids, n_clusters, batch_size):
+    """
+    Label agreement with float32 in two ways: assigning the quantized rows to the float32 centroids
+    isolates the rounding error, and refitting on the quantized file shows the end-to-end effect.
+    """
+    embeddings = EmbeddingShards([embeddings_filepath])
+    assigned, _ = assign_nearest_centroid(embeddings, reference_centroids)
+    _, refit_labels = fit_minibatch_kmeans(embeddings, n_clusters, batch_size=batch_size)
+    return {
+        'assign_agreement': round(float(np.mean(assigned == reference_labels)), 5),
+        'refit_ari': round(float(adjusted_rand_score(reference_labels, refit_labels)), 5),
+    }
+
+def retrieval_accuracy(store, query_vectors, exact_ids, top_k):
+    """Recall@k of store.search against the float32 store, and the mean latency of one batched search."""
+    start = time.perf_counter()
+    ids = store.search(query_vectors, top_k=top_k)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return {
+        'recall_at_k': round(recall_at_k(ids, exact_ids), 5),
+        'search_ms_per_query': round(elapsed_ms / len(query_vectors), 4),
+    }
+
+def main():
+    """
+    Reports what float16 and int8 embedding storage costs in accuracy against float32: cluster
+    label agreement for cluster_feedback.py, top-k recall for graph retrieval, and the disk size
+    of both files. Results are appended to a CSV table.
+    """
+    num_rows = 100_000
+    num_queries = 500
+    top_k = 10
+    n_clusters = 4
+    batch_size = 4096
+    encoder_name = "stub"  # Or a SentenceTransformer model name, see benchmark_pipeline.load_encoder
+    results_filepath = "quantization_results.csv"
+
+    encoder = load_encoder(encoder_name)
+    print(f"Encoding {num_rows} feedback strings and {num_queries} queries...")
+    corpus = list(dict.fromkeys(generate_feedback_corpus(num_rows, seed=1, duplicate_rate=0.0)))
+    queries = list(generate_feedback_corpus(num_queries, seed=2, duplicate_rate=0.0))
+    vectors = np.asarray(encoder.encode(corpus), dtype=np.float32)
+    query_vectors = np.asarray(encoder.encode(queries), dtype=np.float32)
+
+    work_dir = tempfile.mkdtemp(prefix="quantization_bench_")
+    records = []
+    try:
+        reference_labels = reference_centroids = exact_ids = None
+        for dtype in EMBEDDING_DTYPES:  # float32 first: it is the reference
+            print(f"Measuring {dtype}...")
+            embeddings_filepath = os.path.join(work_dir, f"embeddings_{dtype}.npy")
+            save_embeddings(embeddings_filepath, vectors, dtype=dtype)
+            store = GraphStore(os.path.join(work_dir, f"graph_{dtype}"), encoder_name, embedding_dtype=dtype)
+            store.add(nodes=corpus, encode_fn=lambda texts: vectors)
+            if dtype == "float32":
+                kmeans, reference_labels = fit_minibatch_kmeans(EmbeddingShards([embeddings_filepath]), n_clusters,
+                                                                batch_size=batch_size)
+                reference_centroids = kmeans.cluster_centers_
+                exact_ids = store.search(query_vectors, top_k=top_k)
+            record = {
+                'dtype': dtype,
+                'feedback_mb': round(file_bytes(embeddings_filepath, scales_path(embeddings_filepath)) / 2**20, 2),
+                'graph_mb': round(file_bytes(store.embeddings_path, store.scales_path) / 2**20, 2),
+            }
+            record.update(clustering_accuracy(embeddings_filepath, reference_labels, reference_centroids, n_clusters,
+                                              batch_size))
+            record.update(retrieval_accuracy(store, query_vectors, exact_ids, top_k))
+            records.append(record)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = current_commit()
+    print(f"\nQuantized embedding storage vs float32 over {len(corpus)} rows (commit {commit}, encoder: {encoder_name}):")
+    print_table(records, QUANTIZATION_COLUMNS, width=19)
+    append_results(results_filepath, records, QUANTIZATION_COLUMNS, commit, num_rows=len(corpus), top_k=top_k)
+    print(f"\nResults appended to {results_filepath}")
+
+if __name__ == "__main__":
+    main()
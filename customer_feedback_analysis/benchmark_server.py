@@ -0,0 +1,103 @@
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+import numpy as np
+from batch_server import HTTPClient, MicroBatcher, start_http_server
+from benchmark_pipeline import append_results, current_commit, load_encoder, load_graph_rag, print_table
+from generate_sample_feedback import generate_feedback_corpus
+from graph_store import GraphStore
+
+SERVER_COLUMNS = ['max_batch_size', 'max_wait_ms', 'concurrency', 'queries_per_s', 'mean_batch_size', 'p50_ms',
+                  'p99_ms', 'p99_target_ms']
+
+def build_benchmark_store(store_dir, encoder, num_nodes, edges_per_node=2, seed=42):
+    """Builds a graph store over synthetic feedback strings with random 'related' edges."""
+    rng = random.Random(seed)
+    nodes = list(dict.fromkeys(generate_feedback_corpus(num_nodes, seed=seed, duplicate_rate=0.0)))
+    edges = [(node, rng.choice(nodes), "related") for node in nodes for _ in range(edges_per_node)]
+    store = GraphStore(store_dir, "benchmark")
+    store.add(edges=edges, encode_fn=encoder.encode)
+    return store
+
+async def run_load(graph_rag, queries, concurrency, max_batch_size, max_wait_ms, p99_target_ms):
+    """Serves graphrag over HTTP on a free port and replays queries from concurrent keep-alive clients."""
+    batcher = MicroBatcher(graph_rag.handle_query_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                           p99_target_ms=p99_target_ms)
+    latencies = []
+    async with batcher:
+        server = await start_http_server(batcher, "127.0.0.1", 0, validate=graph_rag.validate_query_request)
+        port = server.sockets[0].getsockname()[1]
+
+        async def client(worker):
+            http = HTTPClient("127.0.0.1", port)
+            try:
+                for query in queries[worker::concurrency]:
+                    start = time.perf_counter()
+                    status, payload = await http.post({'query': query})
+                    if status != 200:
+                        raise RuntimeError(f"Query failed with {status}: {payload}")
+                    latencies.append((time.perf_counter() - start) * 1000)
+            finally:
+                await http.close()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(worker) for worker in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        server.close()
+        await server.wait_closed()
+        stats = batcher.stats()
+    latencies = np.asarray(latencies)
+    return {
+        'max_batch_size': max_batch_size,
+        'max_wait_ms': max_wait_ms,
+        'concurrency': concurrency,
+        'queries_per_s': round(len(queries) / elapsed, 1),
+        'mean_batch_size': stats['mean_batch_size'],
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'p99_target_ms': p99_target_ms,
+    }
+
+def main():
+    """
+    Load-tests the micro-batching graphrag server over local HTTP: throughput and client-side
+    p50/p99 latency for unbatched serving (max_batch_size=1) against batching policies.
+    """
+    num_nodes = 20_000
+    num_queries = 2_000
+    concurrency = 64
+    policies = [(1, 0), (8, 5), (32, 10), (64, 20)]  # (max_batch_size, max_wait_ms)
+    p99_target_ms = 250
+    # The stub encoder has no per-call forward-pass cost, so with it the gain comes from batched
+    # retrieval and fewer thread hand-offs only; set a SentenceTransformer model name to measure encoding too.
+    encoder_name = "stub"
+    results_filepath = "server_benchmark_results.csv"
+
+    encoder = load_encoder(encoder_name, device='cpu')
+    graph_rag = load_graph_rag()
+    graph_rag.model = encoder
+    graph_rag.use_query_cache = False  # Every request should reach the model and the graph
+    work_dir = tempfile.mkdtemp(prefix="server_bench_")
+    try:
+        print(f"Building a {num_nodes}-node graph store...")
+        graph_rag._store = build_benchmark_store(os.path.join(work_dir, "graph_store"), encoder, num_nodes)
+        queries = list(generate_feedback_corpus(num_queries, seed=7, duplicate_rate=0.0))
+        records = []
+        for max_batch_size, max_wait_ms in policies:
+            print(f"Serving with max_batch_size={max_batch_size}, max_wait_ms={max_wait_ms}...")
+            records.append(asyncio.run(run_load(graph_rag, queries, concurrency, max_batch_size, max_wait_ms,
+                                                p99_target_ms)))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = current_commit()
+    print(f"\nGraphRAG serving over {num_nodes} nodes, {num_queries} queries (commit {commit}, encoder: {encoder_name}):")
+    print_table(records, SERVER_COLUMNS)
+    append_results(results_filepath, records, SERVER_COLUMNS, commit, encoder=encoder_name, num_nodes=num_nodes)
+    print(f"\nResults appended to {results_filepath}")
+
+if __name__ == "__main__":
+    main()
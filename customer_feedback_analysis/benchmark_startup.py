@@ -0,0 +1,60 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(HERE)
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "sklearn", "matplotlib", "networkx")
+
+# (label, working directory, import statement) for every entry point that must start fast.
+TARGETS = [
+    ("graph-rag.py", REPO_ROOT,
+     "import importlib.util; spec = importlib.util.spec_from_file_location('graph_rag', 'graph-rag.py'); "
+     "spec.loader.exec_module(importlib.util.module_from_spec(spec))"),
+    ("embed_feedback", HERE, "import embed_feedback"),
+    ("encoding_pool", HERE, "import encoding_pool"),
+    ("graph_store", HERE, "import graph_store"),
+    ("ann_index", HERE, "import ann_index"),
+]
+
+def time_import(statement, cwd, runs):
+    """Runs the import in fresh interpreters; returns (median wall ms, heavy modules it loaded)."""
+    probe = f"{statement}; import sys, json; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    timings, loaded = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", probe], cwd=cwd, capture_output=True, text=True)
+        timings.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"Import failed: {result.stderr.strip().splitlines()[-1]}")
+        loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return statistics.median(timings), loaded
+
+def main():
+    """
+    Measures cold-start time (a fresh interpreter importing each entry point) against a budget
+    and checks that no heavy library is imported before it is used. Exits non-zero on a miss.
+    """
+    budget_ms = 250  # Import cost on top of bare interpreter startup
+    runs = 5
+
+    baseline_ms, _ = time_import("pass", HERE, runs)
+    print(f"Bare interpreter startup: {baseline_ms:.0f} ms (median of {runs})")
+    failures = 0
+    for label, cwd, statement in TARGETS:
+        total_ms, loaded = time_import(statement, cwd, runs)
+        import_ms = total_ms - baseline_ms
+        ok = import_ms <= budget_ms and not loaded
+        failures += not ok
+        heavy = f", loads {', '.join(loaded)}" if loaded else ""
+        print(f"  {label:<16} {import_ms:7.0f} ms{heavy}  {'OK' if ok else 'OVER BUDGET'}")
+    if failures:
+        print(f"{failures} entry point(s) exceed the {budget_ms} ms import budget or import heavy modules eagerly.")
+        sys.exit(1)
+    print(f"All entry points import within {budget_ms} ms without heavy modules.")
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,160 @@
+import glob
 import numpy as np
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from cluster_model import ClusterModel, load_latest
+from instrumentation import stage
+from k_selection import pick_best_k, sweep_k
+from quantized_embeddings import load_embeddings
+
+class EmbeddingShards:
+    """
+    Read-only, row-wise concatenation of one or more memory-mapped .npy embedding files, in any
+    format load_embeddings reads (float32, float16 or int8). Nothing is read into memory until
+    batches are requested, and batches come back as float32.
+    """
+
+    def __init__(self, filepaths):
+        if not filepaths:
+            raise FileNotFoundError("No embedding files matched.")
+        self.filepaths = list(filepaths)
+        self.shards = [load_embeddings(filepath, mmap_mode='r') for filepath in self.filepaths]
+        shapes = {shard.shape[1:] for shard in self.shards}
+        if len(shapes) != 1:
+            raise ValueError(f"Embedding shards have inconsistent row shapes: {sorted(shapes)}")
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+        self.shape = (int(self.offsets[-1]),) + shapes.pop()
+        self.ndim = len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, rows):
+        """Contiguous row slices only, read across shard boundaries, e.g. for chunked centroid assignment."""
+        if not isinstance(rows, slice) or rows.step not in (None, 1):
+            raise TypeError("EmbeddingShards only supports contiguous row slices.")
+        start, stop, _ = rows.indices(len(self))
+        blocks = [np.asarray(shard[max(start - offset, 0):max(stop - offset, 0)], dtype=np.float32)
+                  for shard, offset in zip(self.shards, self.offsets[:-1])]
+        return np.concatenate(blocks) if blocks else np.empty((0,) + self.shape[1:], dtype=np.float32)
+
+    def iter_batches(self, batch_size, rng=None):
+        """Yields (start_row, batch) blocks of at most batch_size rows, in shuffled block order if rng is given."""
+        blocks = [(shard_index, start)
+                  for shard_index, shard in enumerate(self.shards)
+                  for start in range(0, len(shard), batch_size)]
+        if rng is not None:
+            rng.shuffle(blocks)
+        for shard_index, start in blocks:
+            batch = np.asarray(self.shards[shard_index][start:start + batch_size], dtype=np.float32)
+            yield int(self.offsets[shard_index]) + start, batch
+
+def fit_minibatch_kmeans(embeddings, n_clusters, batch_size=4096, n_passes=3, random_state=42, sample_weight=None):
+    """
+    Fits MiniBatchKMeans with partial_fit over an EmbeddingShards view, so at most one
+    batch is held in memory at a time, then labels every row in a final streaming pass.
+    Returns (model, labels).
+    """
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, batch_size=batch_size, n_init=3)
+    rng = np.random.default_rng(random_state)
+    for pass_number in range(n_passes):
+        for start, batch in embeddings.iter_batches(batch_size, rng=rng):
+            # partial_fit initializes the centroids from its first batch, which needs enough rows.
+            if not hasattr(kmeans, 'cluster_centers_') and len(batch) < n_clusters:
+                continue
+            weights = None if sample_weight is None else sample_weight[start:start + len(batch)]
+            kmeans.partial_fit(batch, sample_weight=weights)
+        print(f"  Finished pass {pass_number + 1}/{n_passes}")
+
+    labels = np.empty(len(embeddings), dtype=np.int32)
+    for start, batch in embeddings.iter_batches(batch_size):
+        labels[start:start + len(batch)] = kmeans.predict(batch)
+    return kmeans, labels
+
+def assign_new_feedback(model_dir, embeddings_filepath, labels_filepath, drift_threshold, chunk_size=65536):
+    """
+    Labels new embeddings by nearest centroid of the latest saved model and reports drift.
+    Returns True when drift exceeds drift_threshold and a full refit is recommended.
+    """
+    model = load_latest(model_dir)
+    if model is None:
+        print(f"Error: No saved cluster model found in {model_dir}. Run in 'fit' mode first.")
+        return None
+    print(f"Loaded cluster model v{model.version} ({model.n_clusters} clusters, created {model.created_at}).")
+
+    try:
+        embeddings = load_embeddings(embeddings_filepath, mmap_mode='r')
+        print(f"Memory-mapped new embeddings from {embeddings_filepath}. Shape: {embeddings.shape}")
+    except FileNotFoundError:
+        print(f"Error: The file {embeddings_filepath} was not found.")
+        return None
+    if embeddings.ndim != 2 or embeddings.shape[1] != model.centroids.shape[1]:
+        print(f"Error: Expected embeddings of shape (n, {model.centroids.shape[1]}), got {embeddings.shape}.")
+        return None
+
+    with stage("assign", rows=embeddings.shape[0]):
+        labels, squared_distances = model.assign(embeddings, chunk_size=chunk_size)
+    np.save(labels_filepath, labels)
+    print(f"Assigned {len(labels)} new rows; labels saved to {labels_filepath}")
+    if len(labels) == 0:
+        return False
+
+    drift = model.drift(labels, squared_distances)
+    print(f"Drift: distance ratio {drift['distance_ratio']:.3f}, cluster share shift {drift['share_shift']:.3f}")
+    needs_refit = drift['distance_ratio'] > drift_threshold
+    if needs_refit:
+        print(f"Warning: Distance ratio exceeds {drift_threshold}. New feedback no longer fits the clusters well; run a full refit.")
+    return needs_refit
 
 def main():
     """
     Loads embeddings, performs K-Means clustering, and saves cluster labels.
+    In 'assign' mode, labels only new embeddings against the saved model instead.
     """
     embeddings_filepath = "feedback_embeddings.npy"
     labels_filepath = "cluster_labels.npy"
+    use_dedup = False  # Set True when the embeddings are of deduplicated representatives
+    weights_filepath = "feedback_weights.npy"  # Multiplicity of each representative, from dedup_feedback.py
     n_clusters = 4  # As specified: 4 themes
     random_state = 42 # For reproducibility
+    out_of_core = False  # Set True to cluster memory-mapped embeddings in bounded memory with MiniBatchKMeans
+    embedding_shard_pattern = None  # e.g. "feedback_embeddings_*.npy" to cluster several shard files as one
+    batch_size = 4096  # Rows per partial_fit batch in out-of-core mode
+    n_passes = 3  # Passes over the data in out-of-core mode
+    mode = "fit"  # "fit" refits and saves a new model version; "assign" labels new embeddings with the latest one
+    model_dir = "cluster_models"
+    new_embeddings_filepath = "new_feedback_embeddings.npy"
+    new_labels_filepath = "new_cluster_labels.npy"
+    drift_threshold = 1.25  # Refit when new rows sit this much farther from their centroids than at fit time
+    auto_k = False  # Set True to pick n_clusters from a parallel sweep over k_candidates
+    k_candidates = range(2, 11)
+    sweep_workers = None  # Defaults to one process per CPU core
+    k_sweep_sample_size = 10000  # Rows every k is fitted and scored on, fixed across k
+    k_sweep_cache_filepath = "k_sweep_cache.json"
 
-    # 1. Load the embeddings from feedback_embeddings.npy
-    try:
-        embeddings = np.load(embeddings_filepath)
-        print(f"Successfully loaded embeddings from {embeddings_filepath}. Shape: {embeddings.shape}")
-    except FileNotFoundError:
-        print(f"Error: The file {embeddings_filepath} was not found.")
-        return
-    except Exception as e:
-        print(f"An unexpected error occurred while reading {embeddings_filepath}: {e}")
+    if mode == "assign":
+        assign_new_feedback(model_dir, new_embeddings_filepath, new_labels_filepath, drift_threshold)
         return
 
+    # 1. Load the embeddings from feedback_embeddings.npy
+    with stage("load_embeddings") as metrics:
+        try:
+            if out_of_core:
+                shard_paths = sorted(glob.glob(embedding_shard_pattern)) if embedding_shard_pattern else [embeddings_filepath]
+                shard_paths = [path for path in shard_paths if not path.endswith(".scales.npy")]  # int8 row scales
+                embeddings = EmbeddingShards(shard_paths)
+                print(f"Memory-mapped embeddings from {len(shard_paths)} file(s). Shape: {embeddings.shape}")
+            else:
+                embeddings = load_embeddings(embeddings_filepath, mmap_mode=None)  # float16/int8 files come back as float32
+                print(f"Successfully loaded embeddings from {embeddings_filepath}. Shape: {embeddings.shape}")
+                metrics.read_file(embeddings_filepath)
+            metrics.rows = embeddings.shape[0]
+        except FileNotFoundError:
+            print(f"Error: The file {embeddings_filepath} was not found.")
+            return
+        except Exception as e:
+            print(f"An unexpected error occurred while reading {embeddings_filepath}: {e}")
+            return
+
     # Validate embeddings
     if embeddings.ndim != 2:
         print(f"Error: Embeddings are not a 2D array. Shape is {embeddings.shape}.")
@@ -37,25 +171,81 @@ def main():
         # For now, just returning. Or one could assign all to cluster 0 or handle as per requirements.
         return
 
+    sample_weight = None
+    if use_dedup:
+        try:
+            sample_weight = np.load(weights_filepath)
+            print(f"Successfully loaded multiplicity weights from {weights_filepath}. Total rows represented: {int(sample_weight.sum())}")
+        except FileNotFoundError:
+            print(f"Error: The file {weights_filepath} was not found. Run dedup_feedback.py first.")
+            return
+        except Exception as e:
+            print(f"An unexpected error occurred while reading {weights_filepath}: {e}")
+            return
+        if sample_weight.shape != (embeddings.shape[0],):
+            print(f"Error: Mismatch between weights ({sample_weight.shape[0]}) and embeddings ({embeddings.shape[0]}).")
+            return
+
+    # Optionally choose the number of clusters from quality scores
+    if auto_k:
+        with stage("k_sweep"):
+            try:
+                print(f"Sweeping k over {list(k_candidates)}...")
+                sweep_filepaths = embeddings.filepaths if out_of_core else embeddings_filepath
+                results = sweep_k(sweep_filepaths, list(k_candidates), weights_filepath=weights_filepath if use_dedup else None,
+                                  n_workers=sweep_workers, sample_size=k_sweep_sample_size,
+                                  random_state=random_state, cache_filepath=k_sweep_cache_filepath)
+            except Exception as e:
+                print(f"An error occurred during the k sweep: {e}")
+                return
+        best_k = pick_best_k(results)
+        if best_k is None:
+            print(f"Warning: k sweep produced no usable scores. Keeping n_clusters={n_clusters}.")
+        else:
+            print(f"Selected n_clusters={best_k} (silhouette={results[best_k]['silhouette']:.4f}).")
+            n_clusters = best_k
 
     # 2. Perform K-Means clustering
-    try:
-        print(f"Performing K-Means clustering with n_clusters={n_clusters} and random_state={random_state}...")
-        kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init='auto')
-        kmeans.fit(embeddings)
-        cluster_labels = kmeans.labels_
-        print("K-Means clustering complete.")
-    except Exception as e:
-        print(f"An error occurred during K-Means clustering: {e}")
-        return
+    with stage("kmeans_fit", rows=embeddings.shape[0]):
+        try:
+            if out_of_core:
+                print(f"Performing out-of-core MiniBatchKMeans clustering with n_clusters={n_clusters}, "
+                      f"batch_size={batch_size} and n_passes={n_passes}...")
+                kmeans, cluster_labels = fit_minibatch_kmeans(embeddings, n_clusters, batch_size=batch_size, n_passes=n_passes,
+                                                              random_state=random_state, sample_weight=sample_weight)
+            else:
+                print(f"Performing K-Means clustering with n_clusters={n_clusters} and random_state={random_state}...")
+                kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init='auto')
+                kmeans.fit(embeddings, sample_weight=sample_weight)
+                cluster_labels = kmeans.labels_
+            print("K-Means clustering complete.")
+        except Exception as e:
+            print(f"An error occurred during K-Means clustering: {e}")
+            return
+
+    # Keep cluster IDs stable across refits and persist the model for incremental assignment
+    with stage("save_model"):
+        try:
+            previous = load_latest(model_dir)
+            model, cluster_labels = ClusterModel.from_fit(kmeans.cluster_centers_, embeddings, cluster_labels,
+                                                          sample_weight=sample_weight, previous=previous)
+            model_path = model.save(model_dir)
+            if previous is not None and model.theme_map:
+                print(f"Aligned cluster IDs to model v{previous.version} and carried over its theme map.")
+            print(f"Cluster model saved to {model_path}")
+        except Exception as e:
+            print(f"Error saving cluster model to {model_dir}: {e}")
+            return
 
     # 3. Save the resulting cluster labels
-    try:
-        np.save(labels_filepath, cluster_labels)
-        print(f"Cluster labels saved to {labels_filepath}")
-    except Exception as e:
-        print(f"Error saving cluster labels to {labels_filepath}: {e}")
-        return
+    with stage("save_labels", rows=len(cluster_labels)) as metrics:
+        try:
+            np.save(labels_filepath, cluster_labels)
+            metrics.wrote_file(labels_filepath)
+            print(f"Cluster labels saved to {labels_filepath}")
+        except Exception as e:
+            print(f"Error saving cluster labels to {labels_filepath}: {e}")
+            return
 
     # 4. Print unique cluster labels and counts
     unique_labels, counts = np.unique(cluster_labels, return_counts=True)
@@ -0,0 +1,144 @@
+import glob
+import json
+import os
+import re
+import time
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+def assign_nearest_centroid(embeddings, centroids, chunk_size=65536):
+    """
+    Labels rows by nearest centroid, computing squared distances chunk by chunk as
+    ||x||^2 - 2 x.c + ||c||^2 so only a (chunk_size, n_clusters) block is ever materialized.
+    Works on memory-mapped arrays. Returns (labels, squared_distances).
+    """
+    centroids = np.asarray(centroids, dtype=np.float32)
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(embeddings), dtype=np.int32)
+    squared_distances = np.empty(len(embeddings), dtype=np.float32)
+    for start in range(0, len(embeddings), chunk_size):
+        chunk = np.asarray(embeddings[start:start + chunk_size], dtype=np.float32)
+        distances = chunk @ centroids.T
+        distances *= -2
+        distances += centroid_norms
+        distances += np.einsum('ij,ij->i', chunk, chunk)[:, None]
+        chunk_labels = distances.argmin(axis=1)
+        labels[start:start + len(chunk)] = chunk_labels
+        # Clamp tiny negative values produced by floating point cancellation.
+        squared_distances[start:start + len(chunk)] = np.maximum(distances[np.arange(len(chunk)), chunk_labels], 0)
+    return labels, squared_distances
+
+def align_to_previous(centroids, previous_centroids):
+    """
+    Returns a permutation so that centroids[permutation[i]] is the new centroid matched to
+    previous cluster i (Hungarian matching on squared centroid distances).
+    """
+    cost = ((previous_centroids[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+    previous_ids, new_ids = linear_sum_assignment(cost)
+    return new_ids[np.argsort(previous_ids)].astype(np.int64)
+
+def cluster_shares(labels, n_clusters, sample_weight=None):
+    counts = np.bincount(labels, weights=sample_weight, minlength=n_clusters).astype(np.float64)
+    total = counts.sum()
+    return counts / total if total else counts
+
+class ClusterModel:
+    """
+    Fitted centroids plus everything needed to label new feedback consistently:
+    the cluster-to-theme map, and the baseline distance and cluster shares observed at fit time
+    so drift can be measured when new embeddings are assigned.
+    """
+
+    def __init__(self, centroids, theme_map=None, baseline_sq_distance=None, baseline_shares=None,
+                 version=None, created_at=None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.theme_map = {int(k): v for k, v in (theme_map or {}).items()}
+        self.baseline_sq_distance = baseline_sq_distance
+        self.baseline_shares = None if baseline_shares is None else np.asarray(baseline_shares, dtype=np.float64)
+        self.version = version
+        self.created_at = created_at
+
+    @property
+    def n_clusters(self):
+        return len(self.centroids)
+
+    @classmethod
+    def from_fit(cls, centroids, embeddings, labels, sample_weight=None, previous=None):
+        """
+        Builds a model from freshly fitted centroids. When a previous model is given, cluster IDs
+        are aligned to it so they stay stable across refits and its theme map carries over.
+        Returns (model, labels) with labels renumbered to the aligned IDs.
+        """
+        centroids = np.asarray(centroids, dtype=np.float32)
+        labels = np.asarray(labels)
+        theme_map = None
+        if previous is not None and previous.centroids.shape == centroids.shape:
+            permutation = align_to_previous(centroids, previous.centroids)
+            centroids = centroids[permutation]
+            labels = np.argsort(permutation)[labels].astype(labels.dtype)
+            theme_map = {k: v for k, v in previous.theme_map.items() if k < len(centroids)}
+        _, squared_distances = assign_nearest_centroid(embeddings, centroids)
+        baseline = float(np.average(squared_distances, weights=sample_weight)) if len(squared_distances) else 0.0
+        shares = cluster_shares(labels, len(centroids), sample_weight)
+        return cls(centroids, theme_map, baseline, shares), labels
+
+    def assign(self, embeddings, chunk_size=65536):
+        return assign_nearest_centroid(embeddings, self.centroids, chunk_size=chunk_size)
+
+    def drift(self, labels, squared_distances):
+        """
+        Compares newly assigned rows with the fit-time baseline. Returns a dict with
+        distance_ratio (mean squared distance to the nearest centroid relative to fit time)
+        and share_shift (total variation distance between cluster shares).
+        """
+        ratio = float(squared_distances.mean() / self.baseline_sq_distance) if self.baseline_sq_distance else float('nan')
+        shares = cluster_shares(labels, self.n_clusters)
+        shift = float(0.5 * np.abs(shares - self.baseline_shares).sum()) if self.baseline_shares is not None else float('nan')
+        return {'distance_ratio': ratio, 'share_shift': shift, 'shares': shares.tolist()}
+
+    def save(self, model_dir):
+        """Writes the model as the next version in model_dir and returns its path."""
+        os.makedirs(model_dir, exist_ok=True)
+        self.version = (latest_version(model_dir) or 0) + 1
+        self.created_at = self.created_at or time.strftime('%Y-%m-%dT%H:%M:%S')
+        path = os.path.join(model_dir, f"cluster_model_v{self.version:04d}.npz")
+        self._write(path)
+        return path
+
+    def update(self, model_dir):
+        """Rewrites this version in place, e.g. after its theme map was edited."""
+        self._write(os.path.join(model_dir, f"cluster_model_v{self.version:04d}.npz"))
+
+    def _write(self, path):
+        meta = {
+            'version': self.version,
+            'created_at': self.created_at,
+            'theme_map': {str(k): v for k, v in sorted(self.theme_map.items())},
+            'baseline_sq_distance': self.baseline_sq_distance,
+        }
+        arrays = {'centroids': self.centroids, 'meta': np.array(json.dumps(meta))}
+        if self.baseline_shares is not None:
+            arrays['baseline_shares'] = self.baseline_shares
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            baseline_shares = data['baseline_shares'] if 'baseline_shares' in data.files else None
+            return cls(data['centroids'], meta['theme_map'], meta['baseline_sq_distance'], baseline_shares,
+                       meta['version'], meta['created_at'])
+
+def latest_version(model_dir):
+    versions = [int(m.group(1)) for path in glob.glob(os.path.join(model_dir, "cluster_model_v*.npz"))
+                if (m := re.search(r'cluster_model_v(\d+)\.npz$', path))]
+    return max(versions) if versions else None
+
+def load_latest(model_dir):
+    """Returns the newest saved ClusterModel in model_dir, or None when there is none."""
+    version = latest_version(model_dir)
+    if version is None:
+        return None
+    return ClusterModel.load(os.path.join(model_dir, f"cluster_model_v{version:04d}.npz"))
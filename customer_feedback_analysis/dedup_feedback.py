@@ -0,0 +1,146 @@
+import json
+import re
+import unicodedata
+import zlib
+import numpy as np
+
+# Mersenne prime used for the MinHash permutations
+_MINHASH_PRIME = (1 << 61) - 1
+
+def normalize_text(text):
+    """Case-folds, applies NFKC and collapses punctuation and whitespace runs to single spaces."""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return re.sub(r'[\W_]+', ' ', text).strip()
+
+def group_exact(texts):
+    """
+    Groups texts that are identical after normalization.
+    Returns (representatives, group_ids) where representatives holds the index of the first
+    occurrence of each group and group_ids maps every text to its group.
+    """
+    group_of = {}
+    representatives = []
+    group_ids = np.empty(len(texts), dtype=np.int64)
+    for i, text in enumerate(texts):
+        key = normalize_text(text)
+        group = group_of.get(key)
+        if group is None:
+            group = group_of[key] = len(representatives)
+            representatives.append(i)
+        group_ids[i] = group
+    return np.array(representatives, dtype=np.int64), group_ids
+
+def minhash_signatures(texts, num_perm=64, shingle_size=5, seed=42):
+    """Computes a (len(texts), num_perm) MinHash signature matrix over character shingles."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MINHASH_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _MINHASH_PRIME, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        text = normalize_text(text)
+        shingles = {text[j:j + shingle_size] for j in range(max(1, len(text) - shingle_size + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # uint64 arithmetic wraps, which is fine for hashing purposes.
+        signatures[i] = ((np.outer(a, hashes) + b[:, None]) % _MINHASH_PRIME).min(axis=1)
+    return signatures
+
+def lsh_groups(signatures, bands=16, threshold=0.8):
+    """
+    Finds near-duplicate groups with banded LSH over MinHash signatures.
+    Candidate pairs sharing a band bucket are merged when their estimated Jaccard
+    similarity reaches threshold. Returns a group id per row (the smallest row index in its group).
+    """
+    num_rows, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    parent = np.arange(num_rows)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        band_slice = np.ascontiguousarray(signatures[:, band * rows_per_band:(band + 1) * rows_per_band])
+        buckets = {}
+        for i in range(num_rows):
+            buckets.setdefault(band_slice[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            first = members[0]
+            for other in members[1:]:
+                root_first, root_other = find(first), find(other)
+                if root_first == root_other:
+                    continue
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    parent[max(root_first, root_other)] = min(root_first, root_other)
+    return np.array([find(i) for i in range(num_rows)], dtype=np.int64)
+
+def deduplicate(texts, near_duplicates=False, num_perm=64, bands=16, threshold=0.8):
+    """
+    Collapses exact (and optionally near) duplicates.
+    Returns (unique_texts, group_ids, weights): group_ids maps every input row to its
+    representative in unique_texts and weights holds the multiplicity of each representative.
+    """
+    representatives, group_ids = group_exact(texts)
+    if near_duplicates and len(representatives) > 1:
+        signatures = minhash_signatures([texts[i] for i in representatives], num_perm=num_perm)
+        merged = lsh_groups(signatures, bands=bands, threshold=threshold)
+        # Renumber the surviving groups densely, preserving first-occurrence order.
+        _, dense = np.unique(merged, return_inverse=True)
+        representatives = representatives[np.unique(merged)]
+        group_ids = dense[group_ids]
+    unique_texts = [texts[i] for i in representatives]
+    weights = np.bincount(group_ids, minlength=len(unique_texts))
+    return unique_texts, group_ids, weights
+
+def main():
+    """
+    Loads feedback, collapses duplicates and saves the unique representatives
+    together with the row-to-representative mapping and multiplicity weights.
+    """
+    feedback_filepath = "sample_feedback.json"
+    unique_filepath = "unique_feedback.json"
+    group_ids_filepath = "feedback_group_ids.npy"
+    weights_filepath = "feedback_weights.npy"
+    near_duplicates = False  # Set True to also merge near-duplicates with MinHash/LSH
+    similarity_threshold = 0.8  # Minimum estimated Jaccard similarity for near-duplicates
+
+    # 1. Load the list of feedback strings
+    try:
+        with open(feedback_filepath, 'r') as f:
+            feedback_strings = json.load(f)
+        print(f"Successfully loaded {len(feedback_strings)} feedback strings from {feedback_filepath}")
+    except FileNotFoundError:
+        print(f"Error: The file {feedback_filepath} was not found.")
+        return
+    except json.JSONDecodeError:
+        print(f"Error: Could not decode JSON from {feedback_filepath}.")
+        return
+    except Exception as e:
+        print(f"An unexpected error occurred while reading {feedback_filepath}: {e}")
+        return
+
+    if not isinstance(feedback_strings, list) or not all(isinstance(item, str) for item in feedback_strings):
+        print(f"Error: Expected {feedback_filepath} to contain a list of strings.")
+        return
+
+    # 2. Collapse duplicates
+    unique_texts, group_ids, weights = deduplicate(feedback_strings, near_duplicates=near_duplicates,
+                                                   threshold=similarity_threshold)
+    print(f"Collapsed {len(feedback_strings)} feedback strings into {len(unique_texts)} unique representatives.")
+
+    # 3. Save representatives, mapping and weights
+    try:
+        with open(unique_filepath, 'w') as f:
+            json.dump(unique_texts, f, indent=2)
+        np.save(group_ids_filepath, group_ids)
+        np.save(weights_filepath, weights)
+        print(f"Saved representatives to {unique_filepath}, row mapping to {group_ids_filepath} and weights to {weights_filepath}")
+    except Exception as e:
+        print(f"Error saving deduplicated feedback: {e}")
+        return
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,183 @@
+import itertools
 import json
+import os
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from embedding_cache import EmbeddingCache, encode_with_cache
+from encoding_pool import ParallelEncoder, get_shared_encoder
+from instrumentation import stage
+from quantized_embeddings import open_embeddings_output, reopen_embeddings_output, save_embeddings, write_embedding_rows
+
+def iter_feedback_jsonl(filepath):
+    """Yields feedback strings from a JSONL file with one JSON string per line."""
+    with open(filepath, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            text = json.loads(line)
+            if not isinstance(text, str):
+                raise ValueError(f"Line {line_number} of {filepath} is not a JSON string.")
+            yield text
+
+def count_jsonl_rows(filepath):
+    with open(filepath, 'r') as f:
+        return sum(1 for line in f if line.strip())
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def embed_streaming(input_filepath, embeddings_filepath, checkpoint_filepath, encode_fn, batch_size=1024,
+                    dtype="float32"):
+    """
+    Encodes a JSONL feedback file in fixed-size batches, writing each batch straight into a
+    preallocated memory-mapped .npy file stored as dtype ("float32", "float16" or "int8").
+    Progress is checkpointed after every batch so an interrupted run resumes at the last
+    finished batch. Returns the number of rows encoded.
+    """
+    num_rows = count_jsonl_rows(input_filepath)
+    input_stat = os.stat(input_filepath)
+    input_signature = {
+        'input_filepath': os.path.abspath(input_filepath),
+        'input_size': input_stat.st_size,
+        'input_mtime': input_stat.st_mtime,
+        'num_rows': num_rows,
+        'batch_size': batch_size,
+        'dtype': dtype,
+    }
+
+    rows_done = 0
+    output = scales = None
+    if os.path.exists(checkpoint_filepath) and os.path.exists(embeddings_filepath):
+        with open(checkpoint_filepath, 'r') as f:
+            checkpoint = json.load(f)
+        if {key: checkpoint.get(key) for key in input_signature} == input_signature:
+            rows_done = checkpoint['rows_done']
+            output, scales = reopen_embeddings_output(embeddings_filepath)
+            print(f"Resuming from checkpoint: {rows_done}/{num_rows} rows already encoded.")
+        else:
+            print(f"Checkpoint {checkpoint_filepath} does not match {input_filepath}; starting from scratch.")
+
+    if num_rows == 0:
+        np.save(embeddings_filepath, np.array([]))
+        print(f"Warning: {input_filepath} contains no feedback strings. Saved empty embeddings to {embeddings_filepath}.")
+        return 0
+
+    remaining = itertools.islice(iter_feedback_jsonl(input_filepath), rows_done, None)
+    for batch in iter_batches(remaining, batch_size):
+        embeddings = np.asarray(encode_fn(batch), dtype=np.float32)
+        if output is None:
+            output, scales = open_embeddings_output(embeddings_filepath, num_rows, embeddings.shape[1], dtype)
+        write_embedding_rows(output, scales, rows_done, embeddings)
+        output.flush()
+        if scales is not None:
+            scales.flush()
+        rows_done += len(batch)
+        # Write the checkpoint atomically so a crash mid-write never corrupts it.
+        with open(checkpoint_filepath + ".tmp", 'w') as f:
+            json.dump(dict(input_signature, rows_done=rows_done), f)
+        os.replace(checkpoint_filepath + ".tmp", checkpoint_filepath)
+        print(f"Encoded {rows_done}/{num_rows} rows.")
+
+    del output, scales
+    os.remove(checkpoint_filepath)
+    return rows_done
 
 def main():
     """
     Loads feedback, generates embeddings, and saves them.
     """
-    feedback_filepath = "sample_feedback.json"
+    use_dedup = False  # Set True after running dedup_feedback.py to encode only unique representatives
+    feedback_filepath = "unique_feedback.json" if use_dedup else "sample_feedback.json"
     embeddings_filepath = "feedback_embeddings.npy"
+    embedding_dtype = "float32"  # "float16" halves the file; "int8" (plus a per-row scale file) cuts it to about a quarter
     model_name = 'all-MiniLM-L6-v2'
+    use_cache = True  # Only strings not seen in earlier runs are sent to the model
+    cache_dir = "embedding_cache"
+    max_cache_entries = 1_000_000  # Least recently used entries beyond this are evicted
+    max_cache_age_runs = 30  # Entries unused for this many runs are evicted
+    streaming = False  # Set True to encode a JSONL input in batches with resumable memory-mapped output
+    streaming_input_filepath = "sample_feedback.jsonl"
+    checkpoint_filepath = "feedback_embeddings.checkpoint.json"
+    batch_size = 1024
+    num_workers = 0  # Set above 1 to encode on a pool of CPU worker processes
+    chunk_size = 256  # Strings handed to a worker at a time
+
+    # Initialize the SentenceTransformer model (deferred until a string actually needs encoding)
+    model = ParallelEncoder(model_name, num_workers=num_workers, chunk_size=chunk_size) if num_workers > 1 else None
+
+    def encode(texts):
+        nonlocal model
+        if model is None:
+            with stage("model_load"):
+                model = get_shared_encoder(model_name)
+                print("Model initialized successfully.")
+        print(f"Encoding {len(texts)} feedback strings...")
+        with stage("model_encode", rows=len(texts)):
+            return model.encode(texts, show_progress_bar=True)
 
-    # 1. Load the list of feedback strings from sample_feedback.json
     try:
-        with open(feedback_filepath, 'r') as f:
-            feedback_strings = json.load(f)
-        print(f"Successfully loaded {len(feedback_strings)} feedback strings from {feedback_filepath}")
-    except FileNotFoundError:
-        print(f"Error: The file {feedback_filepath} was not found.")
-        return
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from {feedback_filepath}.")
-        return
+        cache = EmbeddingCache(cache_dir, model_name) if use_cache else None
     except Exception as e:
-        print(f"An unexpected error occurred while reading {feedback_filepath}: {e}")
+        print(f"Error opening embedding cache in {cache_dir}: {e}")
         return
 
+    if streaming:
+        def encode_batch(texts):
+            if cache is None:
+                return encode(texts)
+            return encode_with_cache(texts, cache, encode, save=False)
+
+        with stage("encode_streaming") as metrics:
+            try:
+                num_rows = embed_streaming(streaming_input_filepath, embeddings_filepath, checkpoint_filepath,
+                                           encode_batch, batch_size=batch_size, dtype=embedding_dtype)
+                print(f"Streaming encode complete: {num_rows} rows saved to {embeddings_filepath}")
+                metrics.rows = num_rows
+                metrics.read_file(streaming_input_filepath)
+                metrics.wrote_file(embeddings_filepath)
+            except FileNotFoundError:
+                print(f"Error: The file {streaming_input_filepath} was not found.")
+                return
+            except Exception as e:
+                print(f"Error during streaming encode: {e}")
+                return
+            finally:
+                if cache is not None:
+                    cache.save()
+                if isinstance(model, ParallelEncoder):
+                    model.close()
+        if cache is not None:
+            try:
+                cache.compact(max_entries=max_cache_entries, max_age_runs=max_cache_age_runs)
+            except Exception as e:
+                print(f"Error compacting embedding cache: {e}")
+        return
+
+    # 1. Load the list of feedback strings
+    with stage("load_feedback") as metrics:
+        try:
+            with open(feedback_filepath, 'r') as f:
+                feedback_strings = json.load(f)
+            print(f"Successfully loaded {len(feedback_strings)} feedback strings from {feedback_filepath}")
+            metrics.rows = len(feedback_strings)
+            metrics.read_file(feedback_filepath)
+        except FileNotFoundError:
+            print(f"Error: The file {feedback_filepath} was not found.")
+            return
+        except json.JSONDecodeError:
+            print(f"Error: Could not decode JSON from {feedback_filepath}.")
+            return
+        except Exception as e:
+            print(f"An unexpected error occurred while reading {feedback_filepath}: {e}")
+            return
+
     if not isinstance(feedback_strings, list) or not all(isinstance(item, str) for item in feedback_strings):
         print(f"Error: Expected {feedback_filepath} to contain a list of strings.")
         return
@@ -37,23 +190,20 @@ def main():
         print(f"Saved empty embeddings to {embeddings_filepath}. Shape: {empty_embeddings.shape}")
         return
 
-    # 2. Initialize the SentenceTransformer model
-    try:
-        print(f"Initializing model: {model_name}...")
-        model = SentenceTransformer(model_name)
-        print("Model initialized successfully.")
-    except Exception as e:
-        print(f"Error initializing SentenceTransformer model: {e}")
-        return
-
-    # 3. Encode the feedback strings into embeddings
-    try:
-        print("Encoding feedback strings...")
-        embeddings = model.encode(feedback_strings, show_progress_bar=True)
-        print("Encoding complete.")
-    except Exception as e:
-        print(f"Error encoding feedback strings: {e}")
-        return
+    # 2. Encode the feedback strings into embeddings
+    with stage("encode", rows=len(feedback_strings)):
+        try:
+            if cache is not None:
+                embeddings = encode_with_cache(feedback_strings, cache, encode)
+            else:
+                embeddings = encode(feedback_strings)
+            print("Encoding complete.")
+        except Exception as e:
+            print(f"Error encoding feedback strings: {e}")
+            return
+        finally:
+            if isinstance(model, ParallelEncoder):
+                model.close()
 
     # Ensure embeddings is a NumPy array (it should be by default from encode)
     if not isinstance(embeddings, np.ndarray):
@@ -61,16 +211,27 @@ def main():
     else:
         embeddings_array = embeddings
 
-    # 4. Save the resulting embeddings as a NumPy array
-    try:
-        np.save(embeddings_filepath, embeddings_array)
-        print(f"Embeddings saved to {embeddings_filepath}")
-    except Exception as e:
-        print(f"Error saving embeddings to {embeddings_filepath}: {e}")
-        return
+    # 3. Save the resulting embeddings as a NumPy array
+    with stage("save_embeddings", rows=len(embeddings_array)) as metrics:
+        try:
+            save_embeddings(embeddings_filepath, embeddings_array, dtype=embedding_dtype)
+            metrics.wrote_file(embeddings_filepath)
+            print(f"Embeddings saved to {embeddings_filepath} as {embedding_dtype}")
+        except Exception as e:
+            print(f"Error saving embeddings to {embeddings_filepath}: {e}")
+            return
 
-    # 5. Print the shape of the embeddings array
+    # 4. Print the shape of the embeddings array
     print(f"Shape of the embeddings array: {embeddings_array.shape}")
 
+    # 5. Keep the cache bounded
+    if cache is not None:
+        try:
+            evicted = cache.compact(max_entries=max_cache_entries, max_age_runs=max_cache_age_runs)
+            if evicted:
+                print(f"Evicted {evicted} stale entries from the embedding cache.")
+        except Exception as e:
+            print(f"Error compacting embedding cache: {e}")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import re
+import numpy as np
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed store of sentence embeddings for one model.
+
+    Vectors live in a raw float32 file that is memory-mapped for reads and appended
+    to for writes; a parallel (N, 20) uint8 array of SHA-1 text digests acts as the index.
+    Every lookup stamps the touched rows with the current run number so that
+    compact() can evict entries that have not been used recently.
+    """
+
+    def __init__(self, cache_dir, model_name):
+        self.model_name = model_name
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)
+        self.directory = os.path.join(cache_dir, safe_name)
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        self.keys_path = os.path.join(self.directory, "keys.npy")
+        self.last_used_path = os.path.join(self.directory, "last_used.npy")
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.dim = None
+        self.generation = 0
+        self.keys = np.empty((0, 20), dtype=np.uint8)
+        self.last_used = np.empty(0, dtype=np.int64)
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get('model_name') != model_name:
+                raise ValueError(f"Cache at {self.directory} belongs to model {meta.get('model_name')!r}, not {model_name!r}.")
+            self.dim = meta['dim']
+            self.generation = meta['generation']
+            self.keys = np.load(self.keys_path)
+            self.last_used = np.load(self.last_used_path)
+        # Each instance represents one run; rows looked up in this run get this stamp.
+        self.generation += 1
+        self.row_of = {key: row for row, key in enumerate(digests(self.keys))}
+        self._pending_keys = []
+
+    def __len__(self):
+        return len(self.row_of)
+
+    @property
+    def num_rows(self):
+        """Rows in the vector file: saved keys plus keys added since the last save."""
+        return len(self.keys) + len(self._pending_keys)
+
+    @staticmethod
+    def text_key(text):
+        return hashlib.sha1(text.encode('utf-8')).digest()
+
+    def lookup(self, texts):
+        """Returns (keys, rows) for texts; rows is -1 where the text is not cached."""
+        keys = [self.text_key(text) for text in texts]
+        rows = np.fromiter((self.row_of.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+        hit_rows = rows[(rows >= 0) & (rows < len(self.last_used))]
+        self.last_used[hit_rows] = self.generation
+        return keys, rows
+
+    def add(self, keys, embeddings):
+        """Appends new vectors to the store and returns the rows they were written to."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or len(embeddings) != len(keys):
+            raise ValueError(f"Expected {len(keys)} embedding rows, got array of shape {embeddings.shape}.")
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match cache dimension {self.dim}.")
+
+        start = self.num_rows
+        # Write at the indexed end rather than appending, so rows left behind by a run
+        # that crashed before save() are overwritten instead of shifting the index.
+        with open(self.vectors_path, 'r+b' if os.path.exists(self.vectors_path) else 'wb') as f:
+            f.seek(start * self.dim * 4)
+            f.write(embeddings.tobytes())
+            f.truncate()
+        rows = np.arange(start, start + len(keys), dtype=np.int64)
+        for key, row in zip(keys, rows.tolist()):
+            self.row_of[key] = row
+        self._pending_keys.extend(keys)
+        return rows
+
+    def vectors(self):
+        """Read-only memory map over every cached vector."""
+        if self.dim is None or self.num_rows == 0:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self.num_rows, self.dim))
+
+    def save(self):
+        """Flushes the index and metadata to disk."""
+        if self._pending_keys:
+            new_keys = np.frombuffer(b"".join(self._pending_keys), dtype=np.uint8).reshape(-1, 20)
+            self.keys = np.concatenate([self.keys, new_keys])
+            self.last_used = np.concatenate([self.last_used, np.full(len(new_keys), self.generation, dtype=np.int64)])
+            self._pending_keys = []
+        np.save(self.keys_path, self.keys)
+        np.save(self.last_used_path, self.last_used)
+        meta = {
+            'model_name': self.model_name,
+            'dim': self.dim,
+            'count': int(len(self.keys)),
+            'generation': self.generation,
+        }
+        with open(self.meta_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def compact(self, max_entries=None, max_age_runs=None):
+        """
+        Evicts entries unused for more than max_age_runs runs, then keeps only the
+        max_entries most recently used. Rewrites the vector file when anything is dropped.
+        Returns the number of evicted entries.
+        """
+        self.save()
+        count = len(self.keys)
+        keep = np.ones(count, dtype=bool)
+        if max_age_runs is not None:
+            keep &= self.last_used > self.generation - max_age_runs
+        if max_entries is not None and keep.sum() > max_entries:
+            candidates = np.flatnonzero(keep)
+            # Stable sort so that ties keep the older rows first and the newest rows win.
+            order = np.argsort(self.last_used[candidates], kind='stable')
+            keep[candidates[order[:len(candidates) - max_entries]]] = False
+        evicted = int(count - keep.sum())
+        if evicted == 0:
+            return 0
+
+        kept_rows = np.flatnonzero(keep)
+        tmp_path = self.vectors_path + ".tmp"
+        if len(kept_rows):
+            old = self.vectors()
+            out = np.memmap(tmp_path, dtype=np.float32, mode='w+', shape=(len(kept_rows), self.dim))
+            chunk = 65536
+            for start in range(0, len(kept_rows), chunk):
+                out[start:start + chunk] = old[kept_rows[start:start + chunk]]
+            out.flush()
+            del out, old
+        else:
+            open(tmp_path, 'wb').close()
+        os.replace(tmp_path, self.vectors_path)
+
+        self.keys = self.keys[kept_rows]
+        self.last_used = self.last_used[kept_rows]
+        self.row_of = {key: row for row, key in enumerate(digests(self.keys))}
+        self.save()
+        return evicted
+
+def digests(keys):
+    """Rows of an (N, 20) uint8 digest array as 20-byte strings, trailing NUL bytes included."""
+    return np.ascontiguousarray(keys).view('V20').ravel().tolist()
+
+def encode_with_cache(texts, cache, encode_fn, save=True):
+    """
+    Returns embeddings for texts, calling encode_fn only on strings missing from the cache.
+    encode_fn takes a list of strings and returns a 2D array. Repeated strings are encoded once.
+    Pass save=False when calling per batch and save the cache once at the end.
+    """
+    keys, rows = cache.lookup(texts)
+    missing = np.flatnonzero(rows < 0)
+    num_encoded = 0
+    if len(missing):
+        new_texts = {}
+        for i in missing.tolist():
+            new_texts.setdefault(keys[i], texts[i])
+        new_keys = list(new_texts)
+        new_embeddings = encode_fn(list(new_texts.values()))
+        cache.add(new_keys, np.asarray(new_embeddings))
+        num_encoded = len(new_keys)
+        for i in missing.tolist():
+            rows[i] = cache.row_of[keys[i]]
+    if save:
+        cache.save()
+
+    print(f"Embedding cache: {len(texts) - len(missing)} hits, {num_encoded} strings encoded, {len(cache)} entries stored.")
+    vectors = cache.vectors()
+    # Gathering from the memmap in index order keeps page reads mostly sequential.
+    embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+    order = np.argsort(rows, kind='stable')
+    embeddings[order] = vectors[rows[order]]
+    return embeddings
@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import threading
+import time
+import numpy as np
+
+def load_sentence_transformer(model_name, device='cpu'):
+    # Imported here so that importing this module never pulls in torch.
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device=device)
+
+# Process-wide encoders, loaded on first use by get_shared_encoder.
+_shared_encoders = {}
+_shared_lock = threading.Lock()
+
+def get_shared_encoder(model_name, model_loader=None):
+    """
+    Returns the process-wide encoder for model_name, loading it on the first call only.
+    Every caller in the process shares the instance, so the model loads once and only if some
+    code path actually encodes text.
+    """
+    encoder = _shared_encoders.get(model_name)
+    if encoder is None:
+        with _shared_lock:
+            encoder = _shared_encoders.get(model_name)
+            if encoder is None:
+                print(f"Initializing model: {model_name}...")
+                if model_loader is None:
+                    encoder = load_sentence_transformer(model_name, device=None)
+                else:
+                    encoder = model_loader(model_name)
+                _shared_encoders[model_name] = encoder
+    return encoder
+
+# Set once per worker process by _init_worker.
+_worker_model = None
+_worker_batch_size = None
+
+def _init_worker(model_loader, model_name, threads_per_worker, batch_size):
+    global _worker_model, _worker_batch_size
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    _worker_model = model_loader(model_name)
+    _worker_batch_size = batch_size
+
+def _encode_chunk(task):
+    start, texts = task
+    embeddings = _worker_model.encode(texts, batch_size=_worker_batch_size, show_progress_bar=False)
+    return start, np.asarray(embeddings, dtype=np.float32)
+
+class ParallelEncoder:
+    """
+    CPU encoding engine that spreads text chunks over a pool of worker processes.
+
+    Each worker loads the model once and keeps it for the lifetime of the pool, so the
+    same encoder can be reused across many encode() calls. Results are written back in
+    input order into a single float32 array. The encode() signature matches
+    SentenceTransformer.encode closely enough to be passed wherever a model is expected.
+    """
+
+    def __init__(self, model_name, num_workers=None, chunk_size=256, batch_size=32,
+                 model_loader=load_sentence_transformer):
+        self.model_name = model_name
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.model_loader = model_loader
+        self.last_throughput = None
+        self._pool = None
+
+    def start(self):
+        if self._pool is None:
+            # Split the cores between workers so torch does not oversubscribe them.
+            threads_per_worker = max(1, (os.cpu_count() or 1) // self.num_workers)
+            # spawn rather than fork: forking a process that already initialized torch can deadlock.
+            context = multiprocessing.get_context('spawn')
+            print(f"Starting {self.num_workers} encoding workers for model {self.model_name}...")
+            self._pool = context.Pool(
+                self.num_workers,
+                initializer=_init_worker,
+                initargs=(self.model_loader, self.model_name, threads_per_worker, self.batch_size),
+            )
+        return self
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        self.close()
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        """Encodes a list of strings and returns a (len(texts), dim) float32 array in input order."""
+        if isinstance(texts, str):
+            return self.encode([texts])[0]
+        self.start()
+        started = time.perf_counter()
+        tasks = ((start, texts[start:start + self.chunk_size]) for start in range(0, len(texts), self.chunk_size))
+        output = None
+        done = 0
+        next_report = 0.1
+        for start, embeddings in self._pool.imap_unordered(_encode_chunk, tasks):
+            if output is None:
+                output = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+            output[start:start + len(embeddings)] = embeddings
+            done += len(embeddings)
+            if show_progress_bar and done >= next_report * len(texts):
+                print(f"  Encoded {done}/{len(texts)} strings")
+                next_report += 0.1
+        if output is None:
+            return np.empty((0, 0), dtype=np.float32)
+
+        elapsed = time.perf_counter() - started
+        self.last_throughput = len(texts) / elapsed if elapsed > 0 else float('inf')
+        print(f"Encoded {len(texts)} strings with {self.num_workers} workers in {elapsed:.2f}s "
+              f"({self.last_throughput:.1f} sentences/sec)")
+        return output
@@ -0,0 +1,87 @@
+import json
+import os
+import numpy as np
+
+def smallest_int_dtype(max_value, signed=True):
+    candidates = (np.int8, np.int16, np.int32, np.int64) if signed else (np.uint8, np.uint16, np.uint32, np.uint64)
+    for dtype in candidates:
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    raise ValueError(f"Value {max_value} does not fit in a 64-bit integer.")
+
+def save_columnar(output_dir, texts, cluster_ids, theme_codes, theme_names, centroid_distance=None):
+    """
+    Writes analyzed feedback as a directory of column files:
+      text_bytes.npy    UTF-8 bytes of every feedback string, concatenated
+      text_offsets.npy  int64 offsets into text_bytes (len(texts) + 1 entries)
+      cluster_id.npy    smallest integer dtype that fits the cluster IDs
+      theme_code.npy    dictionary codes into themes.json
+      themes.json       theme names, indexed by code
+      centroid_distance.npy  optional float32 cosine distance of each row to its cluster centroid
+    Every .npy column can be memory-mapped back without parsing.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    encoded = [text.encode('utf-8') for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(os.path.join(output_dir, "text_bytes.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(os.path.join(output_dir, "text_offsets.npy"), offsets)
+
+    cluster_ids = np.asarray(cluster_ids)
+    cluster_dtype = smallest_int_dtype(int(cluster_ids.max()) if len(cluster_ids) else 0)
+    np.save(os.path.join(output_dir, "cluster_id.npy"), cluster_ids.astype(cluster_dtype))
+    code_dtype = smallest_int_dtype(max(len(theme_names) - 1, 0), signed=False)
+    np.save(os.path.join(output_dir, "theme_code.npy"), np.asarray(theme_codes).astype(code_dtype))
+    with open(os.path.join(output_dir, "themes.json"), 'w') as f:
+        json.dump(list(theme_names), f, indent=2)
+    distance_path = os.path.join(output_dir, "centroid_distance.npy")
+    if centroid_distance is not None:
+        np.save(distance_path, np.asarray(centroid_distance, dtype=np.float32))
+    elif os.path.exists(distance_path):
+        # Never leave a stale column from an earlier run next to new rows.
+        os.remove(distance_path)
+
+class ColumnarFeedback:
+    """
+    Memory-mapped reader for the directory written by save_columnar. Column arrays are
+    exposed directly (cluster_id, theme_code); strings are decoded only when asked for.
+    """
+
+    def __init__(self, input_dir):
+        self.input_dir = input_dir
+        self.text_bytes = np.load(os.path.join(input_dir, "text_bytes.npy"), mmap_mode='r')
+        self.text_offsets = np.load(os.path.join(input_dir, "text_offsets.npy"), mmap_mode='r')
+        self.cluster_id = np.load(os.path.join(input_dir, "cluster_id.npy"), mmap_mode='r')
+        self.theme_code = np.load(os.path.join(input_dir, "theme_code.npy"), mmap_mode='r')
+        with open(os.path.join(input_dir, "themes.json"), 'r') as f:
+            self.theme_names = json.load(f)
+        distance_path = os.path.join(input_dir, "centroid_distance.npy")
+        self.centroid_distance = np.load(distance_path, mmap_mode='r') if os.path.exists(distance_path) else None
+        if not (len(self.text_offsets) - 1 == len(self.cluster_id) == len(self.theme_code)):
+            raise ValueError(f"Columns in {input_dir} have inconsistent lengths.")
+
+    def __len__(self):
+        return len(self.cluster_id)
+
+    def text(self, i):
+        start, end = int(self.text_offsets[i]), int(self.text_offsets[i + 1])
+        return bytes(self.text_bytes[start:end]).decode('utf-8')
+
+    def row(self, i):
+        return {
+            'feedback_text': self.text(i),
+            'cluster_id': int(self.cluster_id[i]),
+            'theme_label': self.theme_names[int(self.theme_code[i])],
+        }
+
+    def head(self, n=5):
+        return [self.row(i) for i in range(min(n, len(self)))]
+
+    def export_json(self, output_filepath):
+        """Writes the classic list-of-dicts JSON file, one row at a time."""
+        with open(output_filepath, 'w') as f:
+            f.write("[")
+            for i in range(len(self)):
+                f.write(",\n  " if i else "\n  ")
+                json.dump(self.row(i), f)
+            f.write("\n]\n" if len(self) else "]\n")
@@ -1,61 +1,131 @@
 import json
 import random
+from instrumentation import stage
+
+POSITIVE_USABILITY = [
+    "The interface is so intuitive!",
+    "I love how easy it is to use this product.",
+    "This is the most user-friendly software I've ever used.",
+    "Great design, very easy to navigate.",
+    "Kudos to the design team for making it so simple!",
+    "I was able to get started right away, no learning curve at all.",
+    "The user experience is fantastic.",
+    "Everything is exactly where I expect it to be.",
+    "Smooth and seamless operation.",
+    "Makes my work so much easier, thank you!"
+]
+
+SUPPORT_COMPLAINTS = [
+    "I was on hold for an hour waiting for support.",
+    "Customer service needs to be faster.",
+    "The wait times for support are unacceptable.",
+    "Nobody picked up when I called support.",
+    "It took three days to get a response to my email.",
+    "Can you please improve your support response time?",
+    "Frustratingly long hold times.",
+    "Support is very slow to respond.",
+    "I gave up waiting for a support agent.",
+    "Need more agents in customer support."
+]
+
+PRICING_QUESTIONS = [
+    "Can you explain the difference between the basic and premium plans?",
+    "Is there a discount for yearly subscriptions?",
+    "What are the features included in the pro plan?",
+    "How much does the enterprise level cost?",
+    "Are there any hidden fees I should be aware of?",
+    "Is it possible to upgrade my plan later?",
+    "Do you offer a non-profit discount?",
+    "What payment methods do you accept?",
+    "Could you detail the limitations of the free trial?",
+    "Is the pricing per user or per team?"
+]
+
+FEATURE_SUGGESTIONS = [
+    "It would be great if you could add a dark mode.",
+    "I wish there was an option to export data to CSV.",
+    "Please add an integration with Salesforce.",
+    "A mobile app would be fantastic!",
+    "Can you add support for two-factor authentication?",
+    "I'd love to see more customization options.",
+    "An API for developers would be a great addition.",
+    "Could you implement a bulk edit feature?",
+    "It would be helpful to have a search function within the settings.",
+    "Consider adding a feature to schedule reports."
+]
+
+THEME_TEMPLATES = {
+    "Positive Product Usability": POSITIVE_USABILITY,
+    "Customer Support Complaints": SUPPORT_COMPLAINTS,
+    "Pricing Plan Questions": PRICING_QUESTIONS,
+    "New Feature Suggestions": FEATURE_SUGGESTIONS,
+}
+
+# Building blocks that turn the 40 templates into a practically unbounded set of variants
+PREFIXES = ["", "", "", "Honestly, ", "Quick note: ", "To be fair, ", "Hi team, ", "Just wanted to say: ", "FYI: "]
+DETAIL_CLAUSES = [
+    "I have been a customer for {n} months.",
+    "Our team has {n} users on the account.",
+    "This came up again {n} times this week.",
+    "We rely on it for about {n} hours a day.",
+    "I already mentioned this in ticket {n}.",
+    "Several colleagues said the same thing.",
+    "This matters a lot for our workflow.",
+    "Thanks for reading this.",
+]
+
+def generate_feedback_corpus(num_items, seed=42, duplicate_rate=0.3, theme_mix=None, mean_extra_clauses=1.0,
+                             duplicate_pool_size=10000):
+    """
+    Yields num_items synthetic feedback strings, one at a time, so corpora of any size can be
+    streamed to disk. Deterministic for a given seed. Fresh items end with a unique reference
+    number, so the realized share of repeated items matches duplicate_rate.
+
+    duplicate_rate      probability that an item repeats an earlier one verbatim
+    theme_mix           {theme: weight} over THEME_TEMPLATES; uniform when None
+    mean_extra_clauses  mean number of detail clauses appended (geometric), which sets the length distribution
+    """
+    rng = random.Random(seed)
+    themes = list(theme_mix) if theme_mix else list(THEME_TEMPLATES)
+    weights = [theme_mix[theme] for theme in themes] if theme_mix else None
+    continue_probability = mean_extra_clauses / (1.0 + mean_extra_clauses)
+    pool = []  # Bounded reservoir of earlier items to draw duplicates from
+    for i in range(num_items):
+        if pool and rng.random() < duplicate_rate:
+            yield rng.choice(pool)
+            continue
+        theme = rng.choices(themes, weights)[0]
+        parts = [rng.choice(PREFIXES) + rng.choice(THEME_TEMPLATES[theme])]
+        while rng.random() < continue_probability:
+            parts.append(rng.choice(DETAIL_CLAUSES).format(n=rng.randint(2, 99999)))
+        parts.append(f"(ref {i})")
+        text = " ".join(parts)
+        if len(pool) < duplicate_pool_size:
+            pool.append(text)
+        else:
+            slot = rng.randint(0, i)
+            if slot < duplicate_pool_size:
+                pool[slot] = text
+        yield text
+
+def write_feedback_jsonl(filepath, texts):
+    """Writes an iterable of strings as JSONL (one JSON string per line) and returns the row count."""
+    count = 0
+    with open(filepath, 'w') as f:
+        for text in texts:
+            f.write(json.dumps(text))
+            f.write("\n")
+            count += 1
+    return count
 
 def get_sample_feedback():
     """Generates a list of simulated customer survey strings."""
     feedback_list = []
 
-    positive_usability = [
-        "The interface is so intuitive!",
-        "I love how easy it is to use this product.",
-        "This is the most user-friendly software I've ever used.",
-        "Great design, very easy to navigate.",
-        "Kudos to the design team for making it so simple!",
-        "I was able to get started right away, no learning curve at all.",
-        "The user experience is fantastic.",
-        "Everything is exactly where I expect it to be.",
-        "Smooth and seamless operation.",
-        "Makes my work so much easier, thank you!"
-    ]
-
-    support_complaints = [
-        "I was on hold for an hour waiting for support.",
-        "Customer service needs to be faster.",
-        "The wait times for support are unacceptable.",
-        "Nobody picked up when I called support.",
-        "It took three days to get a response to my email.",
-        "Can you please improve your support response time?",
-        "Frustratingly long hold times.",
-        "Support is very slow to respond.",
-        "I gave up waiting for a support agent.",
-        "Need more agents in customer support."
-    ]
-
-    pricing_questions = [
-        "Can you explain the difference between the basic and premium plans?",
-        "Is there a discount for yearly subscriptions?",
-        "What are the features included in the pro plan?",
-        "How much does the enterprise level cost?",
-        "Are there any hidden fees I should be aware of?",
-        "Is it possible to upgrade my plan later?",
-        "Do you offer a non-profit discount?",
-        "What payment methods do you accept?",
-        "Could you detail the limitations of the free trial?",
-        "Is the pricing per user or per team?"
-    ]
-
-    feature_suggestions = [
-        "It would be great if you could add a dark mode.",
-        "I wish there was an option to export data to CSV.",
-        "Please add an integration with Salesforce.",
-        "A mobile app would be fantastic!",
-        "Can you add support for two-factor authentication?",
-        "I'd love to see more customization options.",
-        "An API for developers would be a great addition.",
-        "Could you implement a bulk edit feature?",
-        "It would be helpful to have a search function within the settings.",
-        "Consider adding a feature to schedule reports."
-    ]
+    positive_usability = POSITIVE_USABILITY
+    support_complaints = SUPPORT_COMPLAINTS
+    pricing_questions = PRICING_QUESTIONS
+    feature_suggestions = FEATURE_SUGGESTIONS
 
     all_feedback_templates = positive_usability + support_complaints + pricing_questions + feature_suggestions
     
@@ -79,10 +149,14 @@ def get_sample_feedback():
     return feedback_list[:num_feedback_items] # Ensure exact number
 
 if __name__ == "__main__":
-    feedback_data = get_sample_feedback()
+    with stage("generate") as metrics:
+        feedback_data = get_sample_feedback()
+        metrics.rows = len(feedback_data)
     print(f"Generated {len(feedback_data)} feedback items.")
 
-    with open("sample_feedback.json", "w") as f:
-        json.dump(feedback_data, f, indent=2)
+    with stage("save", rows=len(feedback_data)) as metrics:
+        with open("sample_feedback.json", "w") as f:
+            json.dump(feedback_data, f, indent=2)
+        metrics.wrote_file("sample_feedback.json")
     
     print("Sample feedback saved to sample_feedback.json")
@@ -0,0 +1,351 @@
+import csv
+import json
+import os
+import numpy as np
+from quantized_embeddings import Int8Embeddings, check_dtype, quantize_int8, similarity_scores
+
+def normalize_rows(matrix):
+    # Same normalization as sklearn's cosine_similarity: zero vectors stay zero.
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))[:, np.newaxis]
+    return matrix / np.where(norms > 0, norms, 1)
+
+def top_k_indices(scores, top_k):
+    """
+    Returns the indices of the top_k scores of every row in descending order. Ties go to the
+    lower index, so the result matches sorted(..., reverse=True) over the same scores.
+    """
+    num_queries, num_nodes = scores.shape
+    k = min(top_k, num_nodes)
+    if k == 0:
+        return np.zeros((num_queries, 0), dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    # Order by index first, then stable-sort by score, so equal scores keep index order.
+    order = np.argsort(candidates, axis=1)
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    result = np.take_along_axis(candidates, order, axis=1)
+    # argpartition picks arbitrarily among ties at the boundary; fall back to a full sort there.
+    kth_scores = np.take_along_axis(scores, result[:, -1:], axis=1)
+    for row in np.flatnonzero((scores >= kth_scores).sum(axis=1) > k):
+        result[row] = np.argsort(-scores[row], kind='stable')[:k]
+    return result
+
+def load_edge_list(filepath):
+    """
+    Reads (source, target, relation) triples from a .csv file, or from a tab-separated edge list
+    for any other extension. The relation column is optional and a
+    'source,target,relation' header row is skipped.
+    """
+    delimiter = ',' if filepath.endswith('.csv') else '\t'
+    edges = []
+    with open(filepath, 'r', newline='', encoding='utf-8') as f:
+        for line_number, row in enumerate(csv.reader(f, delimiter=delimiter), start=1):
+            if not row or (line_number == 1 and [cell.strip().lower() for cell in row[:2]] == ['source', 'target']):
+                continue
+            if len(row) < 2:
+                raise ValueError(f"{filepath}:{line_number}: expected source and target columns, got {row}.")
+            edges.append((row[0].strip(), row[1].strip(), row[2].strip() if len(row) > 2 else ""))
+    return edges
+
+def dedupe_edges(sources, targets, relations):
+    """
+    Keeps one edge per unordered node pair, like nx.Graph: the edge stays at the position where
+    the pair first appeared and takes the relation of its last occurrence.
+    """
+    low, high = np.minimum(sources, targets), np.maximum(sources, targets)
+    keys = (low.astype(np.int64) << 32) | high.astype(np.int64)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    last = np.zeros(len(first), dtype=np.int64)
+    np.maximum.at(last, inverse, np.arange(len(keys)))
+    order = np.argsort(first, kind='stable')
+    return sources[first[order]], targets[first[order]], relations[last[order]]
+
+def build_csr(num_nodes, sources, targets, relations):
+    """
+    Builds symmetric CSR adjacency over undirected edges. Returns indptr, neighbor ids, relation id
+    and edge id per entry. Each node's neighbors are listed in edge order, like nx adjacency.
+    """
+    edge_ids = np.arange(len(sources), dtype=np.int64)
+    mirrored = sources != targets  # A self-loop appears once in its node's adjacency
+    rows = np.concatenate([sources, targets[mirrored]])
+    columns = np.concatenate([targets, sources[mirrored]])
+    entry_relations = np.concatenate([relations, relations[mirrored]])
+    entry_edges = np.concatenate([edge_ids, edge_ids[mirrored]])
+    order = np.lexsort((entry_edges, rows))
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+    return (indptr, columns[order].astype(np.int32), entry_relations[order].astype(np.int32),
+            entry_edges[order])
+
+def gather_neighbors(indptr, nodes):
+    """
+    Returns the flat CSR entry positions of every neighbor of nodes, and for each entry the
+    position in nodes it belongs to, without a Python loop over the nodes.
+    """
+    nodes = np.asarray(nodes, dtype=np.int64)
+    starts = np.asarray(indptr[nodes])
+    counts = np.asarray(indptr[nodes + 1]) - starts
+    owners = np.repeat(np.arange(len(nodes)), counts)
+    entries = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return entries, owners
+
+class GraphStore:
+    """
+    Build-once, query-many knowledge graph on disk, for one embedding model.
+
+    Node embeddings are L2-normalized when added and kept in a raw file that is memory-mapped
+    for reads and appended to for writes, so only new nodes are ever encoded. The file holds
+    float32 rows by default; embedding_dtype="float16" or "int8" (with a float32 scale per row in
+    embedding_scales.f32) chosen when the store is created cuts it to a half or about a quarter.
+    Edges are kept as id arrays (edge_source/edge_target/edge_relation.npy) and as symmetric
+    CSR adjacency (indptr/indices/indices_relation/indices_edge.npy); names live in nodes.json
+    and relations.json. meta.json is written last and carries a version that every change bumps.
+    """
+
+    EMBEDDING_FILES = {"float32": "embeddings.f32", "float16": "embeddings.f16", "int8": "embeddings.i8"}
+
+    def __init__(self, store_dir, model_name, embedding_dtype=None):
+        self.store_dir = store_dir
+        self.model_name = model_name
+        self.meta_path = os.path.join(store_dir, "meta.json")
+        self.scales_path = os.path.join(store_dir, "embedding_scales.f32")
+        os.makedirs(store_dir, exist_ok=True)
+
+        self.embedding_dtype = check_dtype(embedding_dtype or "float32")
+        self.dim = None
+        self.version = 0
+        self.nodes = []
+        self.relations = []
+        self.edge_source = np.empty(0, dtype=np.int32)
+        self.edge_target = np.empty(0, dtype=np.int32)
+        self.edge_relation = np.empty(0, dtype=np.int32)
+        if os.path.exists(self.meta_path):
+            self._load()
+        else:
+            self._rebuild_csr()
+        if embedding_dtype is not None and embedding_dtype != self.embedding_dtype:
+            raise ValueError(f"Graph store at {store_dir} keeps {self.embedding_dtype} embeddings, not {embedding_dtype}.")
+        self.embeddings_path = self._path(self.EMBEDDING_FILES[self.embedding_dtype])
+        self.node_id = {name: i for i, name in enumerate(self.nodes)}
+        self.relation_id = {name: i for i, name in enumerate(self.relations)}
+
+    def _path(self, name):
+        return os.path.join(self.store_dir, name)
+
+    def _load(self):
+        with open(self.meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('model_name') != self.model_name:
+            raise ValueError(f"Graph store at {self.store_dir} was built with model {meta.get('model_name')!r}, "
+                             f"not {self.model_name!r}.")
+        self.dim = meta['dim']
+        self.embedding_dtype = meta.get('embedding_dtype', "float32")
+        self.version = meta['version']
+        with open(self._path("nodes.json"), 'r', encoding='utf-8') as f:
+            self.nodes = json.load(f)
+        with open(self._path("relations.json"), 'r', encoding='utf-8') as f:
+            self.relations = json.load(f)
+        self.edge_source = np.load(self._path("edge_source.npy"))
+        self.edge_target = np.load(self._path("edge_target.npy"))
+        self.edge_relation = np.load(self._path("edge_relation.npy"))
+        self.indptr = np.load(self._path("indptr.npy"), mmap_mode='r')
+        self.indices = np.load(self._path("indices.npy"), mmap_mode='r')
+        self.indices_relation = np.load(self._path("indices_relation.npy"), mmap_mode='r')
+        self.indices_edge = np.load(self._path("indices_edge.npy"), mmap_mode='r')
+        if not (len(self.nodes) == meta['num_nodes'] == len(self.indptr) - 1
+                and len(self.edge_source) == meta['num_edges']):
+            raise ValueError(f"Graph store at {self.store_dir} is inconsistent; rebuild it from the edge list.")
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_source)
+
+    def embeddings(self):
+        """
+        Read-only memory map over the normalized node embeddings. int8 stores return an
+        Int8Embeddings view whose rows dequantize on indexing.
+        """
+        if self.dim is None or not self.nodes:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        shape = (len(self.nodes), self.dim)
+        if self.embedding_dtype == "int8":
+            return Int8Embeddings(np.memmap(self.embeddings_path, dtype=np.int8, mode='r', shape=shape),
+                                  np.memmap(self.scales_path, dtype=np.float32, mode='r', shape=shape[:1]))
+        return np.memmap(self.embeddings_path, dtype=np.dtype(self.embedding_dtype), mode='r', shape=shape)
+
+    def _write_rows(self, path, rows, row_bytes):
+        # Write at the indexed end rather than appending, so rows left behind by an add
+        # that crashed before save() are overwritten.
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.seek(len(self.nodes) * row_bytes)
+            f.write(rows.tobytes())
+            f.truncate()
+
+    def _rebuild_csr(self):
+        (self.indptr, self.indices, self.indices_relation,
+         self.indices_edge) = build_csr(len(self.nodes), self.edge_source, self.edge_target, self.edge_relation)
+
+    def add(self, edges=(), nodes=(), encode_fn=None):
+        """
+        Adds (source, target, relation) edges and standalone nodes, encodes only the nodes that
+        are new with encode_fn, and saves the store. Returns the number of new nodes.
+        """
+        edges = list(edges)
+        new_nodes = []
+        for name in [name for edge in edges for name in edge[:2]] + list(nodes):
+            name = str(name)
+            if name not in self.node_id:
+                self.node_id[name] = len(self.nodes) + len(new_nodes)
+                new_nodes.append(name)
+        if new_nodes:
+            try:
+                if encode_fn is None:
+                    raise ValueError("encode_fn is required to embed new nodes.")
+                embeddings = np.ascontiguousarray(normalize_rows(encode_fn(new_nodes)), dtype=np.float32)
+                if len(embeddings) != len(new_nodes):
+                    raise ValueError(f"encode_fn returned {len(embeddings)} embeddings for {len(new_nodes)} nodes.")
+                if self.dim is not None and embeddings.shape[1] != self.dim:
+                    raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match store dimension {self.dim}.")
+            except Exception:
+                # Nothing has been written yet; forget the ids handed out above so the store stays usable.
+                for name in new_nodes:
+                    del self.node_id[name]
+                raise
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+            if self.embedding_dtype == "int8":
+                codes, scales = quantize_int8(embeddings)
+                self._write_rows(self.embeddings_path, codes, self.dim)
+                self._write_rows(self.scales_path, scales, 4)
+            else:
+                rows = embeddings.astype(np.dtype(self.embedding_dtype), copy=False)
+                self._write_rows(self.embeddings_path, rows, rows.itemsize * self.dim)
+            self.nodes.extend(new_nodes)
+
+        if edges:
+            relation_ids = []
+            for edge in edges:
+                relation = edge[2] if len(edge) > 2 else ""
+                if relation not in self.relation_id:
+                    self.relation_id[relation] = len(self.relations)
+                    self.relations.append(relation)
+                relation_ids.append(self.relation_id[relation])
+            sources = np.fromiter((self.node_id[str(edge[0])] for edge in edges), dtype=np.int32, count=len(edges))
+            targets = np.fromiter((self.node_id[str(edge[1])] for edge in edges), dtype=np.int32, count=len(edges))
+            self.edge_source, self.edge_target, self.edge_relation = dedupe_edges(
+                np.concatenate([self.edge_source, sources]), np.concatenate([self.edge_target, targets]),
+                np.concatenate([self.edge_relation, np.array(relation_ids, dtype=np.int32)]))
+        self._rebuild_csr()
+        self.version += 1
+        self.save()
+        return len(new_nodes)
+
+    def save(self):
+        np.save(self._path("edge_source.npy"), self.edge_source)
+        np.save(self._path("edge_target.npy"), self.edge_target)
+        np.save(self._path("edge_relation.npy"), self.edge_relation)
+        np.save(self._path("indptr.npy"), self.indptr)
+        np.save(self._path("indices.npy"), self.indices)
+        np.save(self._path("indices_relation.npy"), self.indices_relation)
+        np.save(self._path("indices_edge.npy"), self.indices_edge)
+        with open(self._path("nodes.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.nodes, f, ensure_ascii=False)
+        with open(self._path("relations.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.relations, f, ensure_ascii=False)
+        meta = {
+            'model_name': self.model_name,
+            'dim': self.dim,
+            'embedding_dtype': self.embedding_dtype,
+            'num_nodes': len(self.nodes),
+            'num_edges': int(self.num_edges),
+            'version': self.version,
+        }
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    def search(self, query_embeddings, top_k=5):
+        """Returns the ids of the top_k most cosine-similar nodes for every query row."""
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if not self.nodes:
+            return np.zeros((len(query_embeddings), 0), dtype=np.int64)
+        return top_k_indices(similarity_scores(normalize_rows(query_embeddings), self.embeddings()), top_k)
+
+    def expand(self, seeds, query_embedding=None, hops=1, max_fanout=10, max_nodes=None, min_score=None):
+        """
+        Grows seed nodes by up to hops breadth-first steps over the CSR adjacency and returns the
+        sorted ids of every node reached, seeds included. When query_embedding is given, new
+        neighbors are scored by cosine similarity to it. Each hop drops neighbors below min_score,
+        keeps the max_fanout best neighbors per frontier node, and keeps the best nodes overall
+        until max_nodes are selected.
+        Each hop is a handful of array operations, so hubs and large graphs stay cheap.
+        """
+        seeds = np.unique(np.asarray(seeds, dtype=np.int64))
+        seeds = seeds[seeds >= 0]
+        visited = np.zeros(len(self.nodes), dtype=bool)
+        visited[seeds] = True
+        num_visited = len(seeds)
+        query = None if query_embedding is None else normalize_rows(np.atleast_2d(query_embedding))[0]
+        embeddings = self.embeddings()
+        frontier = seeds
+        for _ in range(hops):
+            if not len(frontier) or (max_nodes is not None and num_visited >= max_nodes):
+                break
+            entries, owners = gather_neighbors(self.indptr, frontier)
+            neighbors = np.asarray(self.indices[entries], dtype=np.int64)
+            fresh = ~visited[neighbors]
+            entries, owners, neighbors = entries[fresh], owners[fresh], neighbors[fresh]
+            if query is not None:
+                unique_neighbors, inverse = np.unique(neighbors, return_inverse=True)
+                scores = (np.asarray(embeddings[unique_neighbors], dtype=np.float32) @ query)[inverse]
+            else:
+                scores = np.zeros(len(neighbors), dtype=np.float32)
+            if min_score is not None:
+                keep = scores >= min_score
+                entries, owners, neighbors, scores = entries[keep], owners[keep], neighbors[keep], scores[keep]
+            if max_fanout is not None:
+                # Best-scoring neighbors first within each frontier node; edge order breaks ties.
+                order = np.lexsort((entries, -scores, owners))
+                sorted_owners = owners[order]
+                rank = np.arange(len(order)) - np.searchsorted(sorted_owners, sorted_owners, side='left')
+                order = order[rank < max_fanout]
+                neighbors, scores = neighbors[order], scores[order]
+            frontier, first = np.unique(neighbors, return_index=True)
+            if max_nodes is not None and num_visited + len(frontier) > max_nodes:
+                best = np.lexsort((frontier, -scores[first]))[:max_nodes - num_visited]
+                frontier = np.sort(frontier[best])
+            visited[frontier] = True
+            num_visited += len(frontier)
+        return np.flatnonzero(visited)
+
+    def subgraph(self, node_ids):
+        """
+        Builds the induced networkx subgraph over node_ids, with 'embedding' node attributes and
+        'relation' edge attributes, so it drops into code written against G.subgraph().
+        """
+        import networkx as nx  # Deferred: only needed once a query builds its answer graph
+        node_ids = np.unique(np.asarray(node_ids, dtype=np.int64))
+        node_ids = node_ids[node_ids >= 0]
+        S = nx.Graph()
+        if not len(node_ids):
+            return S
+        embeddings = self.embeddings()
+        for node, embedding in zip(node_ids.tolist(), np.array(embeddings[node_ids], dtype=np.float32)):
+            S.add_node(self.nodes[node], embedding=embedding)
+        entries, owners = gather_neighbors(self.indptr, node_ids)
+        neighbors = np.asarray(self.indices[entries], dtype=np.int64)
+        inside = np.isin(neighbors, node_ids)
+        entries, owners, neighbors = entries[inside], owners[inside], neighbors[inside]
+        # One entry per edge, in edge order, so neighbor order matches nx adjacency.
+        _, first = np.unique(np.asarray(self.indices_edge[entries]), return_index=True)
+        for node, neighbor, relation in zip(node_ids[owners[first]].tolist(), neighbors[first].tolist(),
+                                            np.asarray(self.indices_relation[entries[first]]).tolist()):
+            S.add_edge(self.nodes[node], self.nodes[neighbor], relation=self.relations[relation])
+        return S
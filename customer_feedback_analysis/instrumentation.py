@@ -0,0 +1,186 @@
+"""
+Lightweight per-stage metrics for the feedback scripts and graph-rag.py.
+
+Disabled unless FEEDBACK_METRICS is set (to a JSON-lines file path, or "stderr"); stage() then
+hands out a shared no-op object so instrumented code pays one dictionary lookup per stage.
+When enabled, every stage emits one JSON line with wall time, CPU time, process peak RSS,
+rows/sec and bytes read/written. FEEDBACK_PROFILE=cprofile|tracemalloc additionally captures a
+cProfile dump (under FEEDBACK_PROFILE_DIR, default "profiles") or the traced memory peak per stage.
+"""
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+_config = {
+    'metrics_path': os.environ.get('FEEDBACK_METRICS'),
+    'profile': os.environ.get('FEEDBACK_PROFILE'),
+    'profile_dir': os.environ.get('FEEDBACK_PROFILE_DIR', 'profiles'),
+}
+_lock = threading.Lock()
+_profiler_active = False
+_traced_stages = []  # Open stages measuring a tracemalloc peak, outermost first
+
+def configure(metrics_path=None, profile=None, profile_dir=None):
+    """Overrides the environment configuration, e.g. from a notebook or the benchmark harness."""
+    _config['metrics_path'] = metrics_path
+    _config['profile'] = profile
+    if profile_dir is not None:
+        _config['profile_dir'] = profile_dir
+
+def enabled():
+    return bool(_config['metrics_path'])
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def _max_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 1024
+
+def _emit(record):
+    line = json.dumps(record, ensure_ascii=False)
+    with _lock:
+        if _config['metrics_path'] == 'stderr':
+            print(line, file=sys.stderr)
+        else:
+            with open(_config['metrics_path'], 'a') as f:
+                f.write(line + "\n")
+
+class _NullStage:
+    # One instance is shared by every disabled stage, so it must never hold per-stage state.
+    __slots__ = ()
+
+    @property
+    def rows(self):
+        return None
+
+    @rows.setter
+    def rows(self, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add_rows(self, n):
+        pass
+
+    def read_file(self, path):
+        pass
+
+    def wrote_file(self, path):
+        pass
+
+    def add_bytes_read(self, n):
+        pass
+
+    def add_bytes_written(self, n):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class StageMetrics:
+    """Context manager measuring one stage; counters can be bumped while it runs."""
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._profiler = None
+        self._tracing = False
+        self._earlier_peak = 0
+
+    def add_rows(self, n):
+        self.rows = (self.rows or 0) + n
+
+    def read_file(self, path):
+        self.bytes_read += file_size(path)
+
+    def wrote_file(self, path):
+        self.bytes_written += file_size(path)
+
+    def add_bytes_read(self, n):
+        self.bytes_read += n
+
+    def add_bytes_written(self, n):
+        self.bytes_written += n
+
+    def __enter__(self):
+        global _profiler_active
+        profile = _config['profile']
+        if profile == 'cprofile' and not _profiler_active:
+            # Only the outermost stage profiles; cProfile does not nest.
+            _profiler_active = True
+            self._profiler = cProfile.Profile()
+        elif profile == 'tracemalloc':
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+            else:
+                # A nested stage resets the peak to measure its own; the enclosing stages keep
+                # their peak so far and merge it back in on exit.
+                peak = tracemalloc.get_traced_memory()[1]
+                for outer in _traced_stages:
+                    outer._earlier_peak = max(outer._earlier_peak, peak)
+                tracemalloc.reset_peak()
+            _traced_stages.append(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        if self._profiler is not None:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _profiler_active
+        if self._profiler is not None:
+            self._profiler.disable()
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        record = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'script': os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else None,
+            'pid': os.getpid(),
+            'stage': self.name,
+            'wall_s': round(wall, 6),
+            'cpu_s': round(cpu, 6),
+            'max_rss_mb': round(_max_rss_mb(), 1),
+            'rows': self.rows,
+            'rows_per_s': round(self.rows / wall, 1) if self.rows and wall > 0 else None,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+        }
+        if exc_type is not None:
+            record['error'] = f"{exc_type.__name__}: {exc_value}"
+        if self._profiler is not None:
+            os.makedirs(_config['profile_dir'], exist_ok=True)
+            profile_path = os.path.join(_config['profile_dir'], f"{record['script'] or 'python'}-{self.name}-{os.getpid()}.prof")
+            self._profiler.dump_stats(profile_path)
+            record['profile'] = profile_path
+            _profiler_active = False
+        if self in _traced_stages:
+            _traced_stages.remove(self)
+            if tracemalloc.is_tracing():
+                peak = max(tracemalloc.get_traced_memory()[1], self._earlier_peak)
+                record['traced_peak_mb'] = round(peak / 2**20, 1)
+                if self._tracing:
+                    tracemalloc.stop()
+        _emit(record)
+        return False
+
+def stage(name, rows=None):
+    """Returns a context manager measuring the named stage (a shared no-op when metrics are off)."""
+    if not _config['metrics_path']:
+        return _NULL_STAGE
+    return StageMetrics(name, rows)
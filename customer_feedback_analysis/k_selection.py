@@ -0,0 +1,134 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, silhouette_score
+from quantized_embeddings import load_embeddings, scales_path
+
+def file_fingerprint(filepath, chunk_size=1 << 24):
+    """SHA-1 of a file's contents, read in chunks."""
+    digest = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def read_rows(embeddings_filepaths, row_indices):
+    """
+    Gathers the given sorted global rows from one or more embedding files as float32. Only those
+    rows are read, and only those are dequantized when the files are float16 or int8.
+    """
+    blocks = []
+    offset = 0
+    for filepath in embeddings_filepaths:
+        embeddings = load_embeddings(filepath, mmap_mode='r')
+        local = row_indices[(row_indices >= offset) & (row_indices < offset + len(embeddings))] - offset
+        blocks.append(np.asarray(embeddings[local], dtype=np.float32))
+        offset += len(embeddings)
+    return np.concatenate(blocks)
+
+def score_k(k, sample_filepath, weights_filepath, random_state):
+    """Fits K-Means for one k on the shared subsample and returns its quality scores. Runs in a worker process."""
+    sample = np.load(sample_filepath)
+    sample_weight = np.load(weights_filepath) if weights_filepath else None
+    kmeans = KMeans(n_clusters=k, random_state=random_state, n_init='auto')
+    labels = kmeans.fit_predict(sample, sample_weight=sample_weight)
+    if len(np.unique(labels)) < 2:
+        scores = {'silhouette': float('nan'), 'calinski_harabasz': float('nan'), 'davies_bouldin': float('nan')}
+    else:
+        scores = {
+            'silhouette': float(silhouette_score(sample, labels)),
+            'calinski_harabasz': float(calinski_harabasz_score(sample, labels)),
+            'davies_bouldin': float(davies_bouldin_score(sample, labels)),
+        }
+    scores['inertia'] = float(kmeans.inertia_)
+    return scores
+
+def pick_best_k(results):
+    """Highest silhouette wins; Calinski-Harabasz breaks ties."""
+    scored = [(scores['silhouette'], scores['calinski_harabasz'], k) for k, scores in results.items()
+              if not np.isnan(scores['silhouette'])]
+    return max(scored)[2] if scored else None
+
+def sweep_k(embeddings_filepaths, k_values, weights_filepath=None, n_workers=None, sample_size=10000,
+            random_state=42, cache_filepath="k_sweep_cache.json", max_cache_entries=16):
+    """
+    Scores every candidate k in parallel across a process pool and returns {k: scores}.
+    embeddings_filepaths is one embedding file or a list of shard files read as one matrix.
+    Every k is fitted and scored on the same random subsample of at most sample_size rows, which
+    is gathered once, so the sweep never loads the full matrix and all three scores are comparable.
+    Results are cached per input fingerprint and sweep parameters, so only k values that were
+    never scored for this exact input are fitted again. Entries for an earlier version of the same
+    files are dropped, and at most max_cache_entries inputs are kept.
+    """
+    if isinstance(embeddings_filepaths, str):
+        embeddings_filepaths = [embeddings_filepaths]
+    num_rows = sum(load_embeddings(filepath, mmap_mode='r').shape[0] for filepath in embeddings_filepaths)
+    key = {
+        'filepaths': [os.path.abspath(filepath) for filepath in embeddings_filepaths],
+        # int8 embeddings: the row scales are part of the input
+        'embeddings': [[file_fingerprint(filepath),
+                        file_fingerprint(scales_path(filepath)) if os.path.exists(scales_path(filepath)) else None]
+                       for filepath in embeddings_filepaths],
+        'weights': file_fingerprint(weights_filepath) if weights_filepath else None,
+        'sample_size': sample_size,
+        'random_state': random_state,
+    }
+    cache_key = json.dumps(key, sort_keys=True)
+
+    cache = {}
+    if cache_filepath and os.path.exists(cache_filepath):
+        with open(cache_filepath, 'r') as f:
+            cache = json.load(f)
+    cached = {int(k): scores for k, scores in cache.get(cache_key, {}).items()}
+    sample_rows = min(sample_size, num_rows)
+    pending = [k for k in k_values if k not in cached and 1 < k < sample_rows]
+    print(f"k sweep: {len(cached)} cached results, {len(pending)} candidate(s) to fit.")
+
+    if pending:
+        rng = np.random.default_rng(random_state)
+        sample_indices = np.sort(rng.choice(num_rows, size=sample_rows, replace=False))
+        n_workers = min(n_workers or os.cpu_count() or 1, len(pending))
+        context = multiprocessing.get_context('spawn')
+        with tempfile.TemporaryDirectory(prefix="k_sweep_") as work_dir:
+            # Workers load the subsample from disk instead of each receiving a pickled copy.
+            sample_filepath = os.path.join(work_dir, "sample.npy")
+            np.save(sample_filepath, read_rows(embeddings_filepaths, sample_indices))
+            sample_weights_filepath = None
+            if weights_filepath:
+                sample_weights_filepath = os.path.join(work_dir, "sample_weights.npy")
+                np.save(sample_weights_filepath, np.load(weights_filepath, mmap_mode='r')[sample_indices])
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=context) as executor:
+                futures = {k: executor.submit(score_k, k, sample_filepath, sample_weights_filepath, random_state)
+                           for k in pending}
+                for k, future in futures.items():
+                    cached[k] = future.result()
+                    print(f"  k={k}: silhouette={cached[k]['silhouette']:.4f}, "
+                          f"calinski_harabasz={cached[k]['calinski_harabasz']:.1f}, davies_bouldin={cached[k]['davies_bouldin']:.4f}")
+        if cache_filepath:
+            cache = prune_cache(cache, key, max_cache_entries - 1)
+            cache[cache_key] = {str(k): scores for k, scores in sorted(cached.items())}
+            with open(cache_filepath, 'w') as f:
+                json.dump(cache, f, indent=2)
+
+    return {k: cached[k] for k in k_values if k in cached}
+
+def prune_cache(cache, key, max_entries):
+    """
+    Drops the entry for key and every entry for the same files with different contents, then
+    keeps the max_entries most recently written of the rest (the cache file preserves write order).
+    """
+    kept = {}
+    for cache_key, entry in cache.items():
+        try:
+            other = json.loads(cache_key)
+        except ValueError:
+            continue
+        if other == key or (other.get('filepaths') == key['filepaths'] and other.get('embeddings') != key['embeddings']):
+            continue
+        kept[cache_key] = entry
+    return dict(list(kept.items())[max(len(kept) - max_entries, 0):])
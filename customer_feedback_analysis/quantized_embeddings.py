@@ -0,0 +1,129 @@
+import os
+import numpy as np
+
+# Embedding files can be stored as float32 (the default), float16, or int8 with one float32
+# scale per row. An int8 file is an ordinary .npy of codes next to a "<name>.scales.npy" file.
+# Every format is memory-mapped and dequantized chunk by chunk, never as a whole.
+
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+def scales_path(embeddings_filepath):
+    root, _ = os.path.splitext(embeddings_filepath)
+    return root + ".scales.npy"
+
+def check_dtype(dtype):
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"Unknown embedding dtype {dtype!r}; expected one of {list(EMBEDDING_DTYPES)}.")
+    return dtype
+
+def quantize_int8(embeddings):
+    """
+    Symmetric per-row quantization: each row is divided by max|x| / 127 and rounded, so the
+    largest coordinate of every row maps to +-127. Returns (codes, scales); zero rows stay zero.
+    """
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    scales = np.abs(embeddings).max(axis=1, initial=0) / 127
+    codes = np.rint(embeddings / np.where(scales > 0, scales, 1)[:, np.newaxis])
+    return np.clip(codes, -127, 127).astype(np.int8), scales.astype(np.float32)
+
+def dequantize_int8(codes, scales):
+    return np.asarray(codes, dtype=np.float32) * np.asarray(scales, dtype=np.float32)[..., np.newaxis]
+
+class Int8Embeddings:
+    """
+    Read-only view over int8 codes and per-row scales. Indexing rows (an int, a slice or an
+    index array) returns dequantized float32 rows, so chunked readers written for float32
+    memory maps work on it unchanged.
+    """
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, codes, scales):
+        if codes.ndim != 2 or scales.shape != codes.shape[:1]:
+            raise ValueError(f"int8 codes {codes.shape} and scales {scales.shape} do not match.")
+        self.codes = codes
+        self.scales = scales
+        self.shape = codes.shape
+        self.ndim = 2
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, rows):
+        if isinstance(rows, tuple):
+            raise TypeError("Int8Embeddings can only be indexed by rows.")
+        return dequantize_int8(self.codes[rows], self.scales[rows])
+
+    def __array__(self, dtype=None, copy=None):
+        array = np.empty(self.shape, dtype=np.float32)
+        for start in range(0, len(self), 65536):
+            array[start:start + 65536] = self[start:start + 65536]
+        return array if dtype is None else array.astype(dtype, copy=False)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+def load_embeddings(embeddings_filepath, mmap_mode='r'):
+    """
+    Opens an embedding file in any supported format. With mmap_mode the rows stay on disk:
+    float32/float16 files come back as memory maps and int8 files as an Int8Embeddings view.
+    With mmap_mode=None the whole file is read and returned as a float32 array.
+    """
+    embeddings = np.load(embeddings_filepath, mmap_mode=mmap_mode)
+    if embeddings.dtype == np.int8:
+        embeddings = Int8Embeddings(embeddings, np.load(scales_path(embeddings_filepath), mmap_mode=mmap_mode))
+    if mmap_mode is None:
+        return np.asarray(embeddings, dtype=np.float32)
+    return embeddings
+
+def open_embeddings_output(embeddings_filepath, num_rows, dim, dtype="float32"):
+    """Creates a memory-mapped output for num_rows embeddings; returns (rows, scales or None)."""
+    check_dtype(dtype)
+    rows = np.lib.format.open_memmap(embeddings_filepath, mode='w+', dtype=np.dtype(dtype), shape=(num_rows, dim))
+    if dtype != "int8":
+        if os.path.exists(scales_path(embeddings_filepath)):
+            os.remove(scales_path(embeddings_filepath))  # Left over from an earlier int8 file
+        return rows, None
+    return rows, np.lib.format.open_memmap(scales_path(embeddings_filepath), mode='w+', dtype=np.float32,
+                                           shape=(num_rows,))
+
+def reopen_embeddings_output(embeddings_filepath):
+    """Reopens an output created by open_embeddings_output for writing, e.g. to resume."""
+    rows = np.lib.format.open_memmap(embeddings_filepath, mode='r+')
+    if rows.dtype != np.int8:
+        return rows, None
+    return rows, np.lib.format.open_memmap(scales_path(embeddings_filepath), mode='r+')
+
+def write_embedding_rows(rows, scales, start, embeddings):
+    """Stores float32 embeddings at rows start.., quantizing them to the output's format."""
+    if scales is None:
+        rows[start:start + len(embeddings)] = embeddings
+    else:
+        codes, row_scales = quantize_int8(embeddings)
+        rows[start:start + len(embeddings)] = codes
+        scales[start:start + len(embeddings)] = row_scales
+
+def save_embeddings(embeddings_filepath, embeddings, dtype="float32", chunk_size=65536):
+    """Writes embeddings in the given format, converting chunk_size rows at a time."""
+    if not hasattr(embeddings, 'shape'):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+    rows, scales = open_embeddings_output(embeddings_filepath, len(embeddings), embeddings.shape[1], dtype)
+    for start in range(0, len(embeddings), chunk_size):
+        write_embedding_rows(rows, scales, start, np.asarray(embeddings[start:start + chunk_size], dtype=np.float32))
+    rows.flush()
+    if scales is not None:
+        scales.flush()
+
+def similarity_scores(queries, embeddings, chunk_size=65536):
+    """
+    queries @ embeddings.T. float32 matrices are multiplied in one product; float16 and int8
+    storage is dequantized chunk_size rows at a time, so no float32 copy of the matrix is made.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    if isinstance(embeddings, np.ndarray) and embeddings.dtype == np.float32:
+        return queries @ embeddings.T
+    scores = np.empty((len(queries), len(embeddings)), dtype=np.float32)
+    for start in range(0, len(embeddings), chunk_size):
+        scores[:, start:start + chunk_size] = queries @ np.asarray(embeddings[start:start + chunk_size],
+                                                                   dtype=np.float32).T
+    return scores
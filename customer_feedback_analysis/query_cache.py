@@ -0,0 +1,162 @@
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+def normalize_query(text):
+    """
+    Applies NFC and collapses whitespace runs, so trivially different spellings of a
+    question share a cache key. Case and punctuation are kept because the encoder sees them.
+    """
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+def estimate_size(value):
+    """Approximate bytes held by a cached value: array buffers, string bytes, containers recursively."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 112
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if hasattr(value, 'nodes') and hasattr(value, 'edges'):
+        # networkx graphs: count attribute payloads, the dominant cost for embedded nodes
+        return sys.getsizeof(value) + sum(estimate_size(node) + estimate_size(data)
+                                          for node, data in value.nodes(data=True)) + 200 * value.number_of_edges()
+    return sys.getsizeof(value)
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by entry count and, optionally, approximate bytes, with an
+    optional time-to-live. Counts hits, misses, evictions and expirations for sizing.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=None, ttl_seconds=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and self.clock() - entry[2] > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, self.clock())
+            self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+class GraphRAGCache:
+    """
+    Two LRU layers for serving graphrag(): query embeddings keyed on (model, normalized query),
+    and finished results keyed on the normalized query plus retrieval parameters. Results belong to
+    one graph version; the first lookup against a newer graph version drops them all.
+    """
+
+    def __init__(self, max_embeddings=10000, max_responses=1000, ttl_seconds=3600, max_bytes=None):
+        self.embeddings = LRUCache(max_entries=max_embeddings, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+        self.responses = LRUCache(max_entries=max_responses, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+        self.graph_version = None
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def query_embedding(self, model_name, query, encode_fn):
+        """Returns the embedding of the normalized query, encoding it with encode_fn on a miss."""
+        return self.query_embeddings(model_name, [query], lambda texts: [encode_fn(texts[0])])[0]
+
+    def query_embeddings(self, model_name, queries, encode_fn):
+        """
+        Returns one embedding row per query. Every miss in the batch, each distinct normalized text
+        once, goes to a single encode_fn(texts) call so the model sees one forward pass.
+        """
+        texts = [normalize_query(query) for query in queries]
+        embeddings = [self.embeddings.get((model_name, text)) for text in texts]
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            encoded = np.asarray(encode_fn(missing), dtype=np.float32).reshape(len(missing), -1)
+            fresh = {}
+            for text, embedding in zip(missing, encoded):
+                embedding = embedding.copy()
+                embedding.flags.writeable = False  # Shared between callers
+                self.embeddings.put((model_name, text), embedding)
+                fresh[text] = embedding
+            embeddings = [fresh[text] if embedding is None else embedding for text, embedding in zip(texts, embeddings)]
+        if not embeddings:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(embeddings)
+
+    def _check_version(self, graph_version):
+        with self._lock:
+            if graph_version != self.graph_version:
+                if self.graph_version is not None:
+                    self.responses.clear()
+                    self.invalidations += 1
+                self.graph_version = graph_version
+
+    def get_response(self, graph_version, query, params):
+        self._check_version(graph_version)
+        return self.responses.get((normalize_query(query), params))
+
+    def put_response(self, graph_version, query, params, result):
+        with self._lock:
+            if graph_version != self.graph_version:
+                return  # Computed against a graph that has changed since; never cache it
+        self.responses.put((normalize_query(query), params), result)
+
+    def stats(self):
+        return {
+            'embeddings': self.embeddings.stats(),
+            'responses': dict(self.responses.stats(), invalidations=self.invalidations),
+        }
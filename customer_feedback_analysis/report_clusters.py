@@ -1,11 +1,134 @@
+import csv
+import heapq
 import json
-from collections import defaultdict
+import numpy as np
+from feedback_store import ColumnarFeedback
+from instrumentation import stage
+
+class StreamingThemeReport:
+    """
+    Single-pass, bounded-memory theme report. Rows arrive in chunks of theme codes; the engine
+    keeps a count per theme plus the samples_per_theme rows with the lowest priority in a
+    max-heap per theme. With centroid distances as priorities those are the rows nearest to
+    their cluster centroid; with uniform random priorities it is a reservoir (bottom-k) sample.
+    """
+
+    def __init__(self, theme_names, samples_per_theme=5, seed=42):
+        self.theme_names = list(theme_names)
+        self.samples_per_theme = samples_per_theme
+        self.counts = np.zeros(len(self.theme_names), dtype=np.int64)
+        self.heaps = [[] for _ in self.theme_names]  # (-priority, row) pairs
+        self.rng = np.random.default_rng(seed)
+        self.sample_strategy = None
+
+    def update(self, start_row, theme_codes, priorities=None):
+        theme_codes = np.asarray(theme_codes)
+        self.counts += np.bincount(theme_codes, minlength=len(self.theme_names))
+        if priorities is None:
+            priorities = self.rng.random(len(theme_codes))
+            self.sample_strategy = self.sample_strategy or "reservoir"
+        else:
+            priorities = np.asarray(priorities)
+            self.sample_strategy = self.sample_strategy or "nearest_to_centroid"
+        n = self.samples_per_theme
+        for code in np.unique(theme_codes).tolist():
+            rows = np.flatnonzero(theme_codes == code)
+            if len(rows) > n:
+                # Only the chunk-local best n can enter the heap, so prefilter them vectorized.
+                rows = rows[np.argpartition(priorities[rows], n - 1)[:n]]
+            heap = self.heaps[code]
+            for row, priority in zip(rows.tolist(), priorities[rows].tolist()):
+                item = (-priority, start_row + row)
+                if len(heap) < n:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+    def summary(self, text_of_row):
+        """Returns one dict per non-empty theme, sorted by theme name, with samples best first."""
+        total = int(self.counts.sum())
+        themes = []
+        for code in sorted(np.flatnonzero(self.counts).tolist(), key=lambda c: self.theme_names[c]):
+            samples = sorted(self.heaps[code], reverse=True)
+            themes.append({
+                'theme': self.theme_names[code],
+                'count': int(self.counts[code]),
+                'share': float(self.counts[code] / total),
+                'samples': [text_of_row(row) for _, row in samples],
+            })
+        return {'total_rows': total, 'sample_strategy': self.sample_strategy, 'themes': themes}
+
+def print_report(summary):
+    print("--- Customer Feedback Report by Theme ---")
+    for theme in summary['themes']:
+        print(f"\nTheme: {theme['theme']}")
+        print(f"Count: {theme['count']} ({theme['share']:.1%})")
+        print(f"Representative feedback ({summary['sample_strategy']}):")
+        for text in theme['samples']:
+            print(f"  - \"{text}\"")
+        print("\n" + "="*50) # Separator line
+    print("\n--- End of Report ---")
+
+def write_summaries(summary, json_filepath, csv_filepath):
+    if json_filepath:
+        with open(json_filepath, 'w') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"Report summary saved to {json_filepath}")
+    if csv_filepath:
+        with open(csv_filepath, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['theme', 'count', 'share'])
+            for theme in summary['themes']:
+                writer.writerow([theme['theme'], theme['count'], f"{theme['share']:.6f}"])
+        print(f"Report counts saved to {csv_filepath}")
+
+def report_columnar(input_dir, samples_per_theme=5, chunk_size=1 << 20):
+    """Streams the memory-mapped columns chunk by chunk; only sampled strings are ever decoded."""
+    try:
+        feedback = ColumnarFeedback(input_dir)
+        print(f"Successfully loaded {len(feedback)} analyzed feedback items from {input_dir}/\n")
+    except FileNotFoundError:
+        print(f"Error: The directory {input_dir} or one of its column files was not found.")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred while reading {input_dir}: {e}")
+        return None
+
+    if len(feedback) == 0:
+        print(f"Warning: {input_dir} is empty. No report to generate.")
+        return None
+
+    with stage("report", rows=len(feedback)) as metrics:
+        report = StreamingThemeReport(feedback.theme_names, samples_per_theme=samples_per_theme)
+        for start in range(0, len(feedback), chunk_size):
+            priorities = None
+            if feedback.centroid_distance is not None:
+                priorities = feedback.centroid_distance[start:start + chunk_size]
+            report.update(start, feedback.theme_code[start:start + chunk_size], priorities)
+        # Only the code (and distance) columns are scanned; the text column is touched for samples alone.
+        metrics.add_bytes_read(feedback.theme_code.nbytes)
+        if feedback.centroid_distance is not None:
+            metrics.add_bytes_read(feedback.centroid_distance.nbytes)
+        return report.summary(feedback.text)
 
 def main():
     """
     Loads analyzed feedback, groups it by theme, and prints a report.
     """
+    input_format = "columnar"  # "columnar" reads the column files written by analyze_clusters.py; "json" the JSON list
+    input_dir = "clustered_feedback_analyzed"
     input_filepath = "clustered_feedback_analyzed.json"
+    samples_per_theme = 5  # Representative feedback shown per theme
+    summary_json_filepath = "theme_report.json"  # Machine-readable summary; None to skip
+    summary_csv_filepath = "theme_report.csv"  # Per-theme counts and shares; None to skip
+
+    if input_format == "columnar":
+        summary = report_columnar(input_dir, samples_per_theme=samples_per_theme)
+        if summary is not None:
+            print_report(summary)
+            with stage("write_summaries"):
+                write_summaries(summary, summary_json_filepath, summary_csv_filepath)
+        return
 
     # 1. Load the analyzed feedback data
     try:
@@ -31,9 +154,10 @@ def main():
         print(f"Warning: The file {input_filepath} is empty. No report to generate.")
         return
 
-    # 2. Group feedback items by 'theme_label'
-    grouped_by_theme = defaultdict(list)
-    valid_items = 0
+    # 2. Dictionary-encode 'theme_label' for the report engine
+    theme_code_of = {}
+    valid_texts = []
+    valid_codes = []
     for i, item in enumerate(analyzed_feedback_list):
         if not isinstance(item, dict):
             print(f"Warning: Item at index {i} is not a dictionary, skipping.")
@@ -50,33 +174,21 @@ def main():
             print(f"Warning: 'theme_label' or 'feedback_text' for item at index {i} are not strings, skipping: {item}")
             continue
             
-        grouped_by_theme[theme_label].append(feedback_text)
-        valid_items += 1
+        valid_codes.append(theme_code_of.setdefault(theme_label, len(theme_code_of)))
+        valid_texts.append(feedback_text)
     
-    if valid_items == 0 and analyzed_feedback_list: # If there were items, but none were valid
+    if not valid_texts and analyzed_feedback_list: # If there were items, but none were valid
         print("No valid feedback items found after parsing. Ensure items have 'theme_label' and 'feedback_text'.")
         return
-    if not grouped_by_theme: # If no items were grouped (e.g. all items were invalid)
-        print("No themes found to report.")
-        return
-
 
     # 3. Print the report
-    print("--- Customer Feedback Report by Theme ---")
-    
-    # Sort themes for consistent output order, e.g., alphabetically
-    sorted_themes = sorted(grouped_by_theme.keys())
-
-    for theme in sorted_themes:
-        feedback_items = grouped_by_theme[theme]
-        print(f"\nTheme: {theme}")
-        print(f"Count: {len(feedback_items)}")
-        print("Feedback:")
-        for i, text in enumerate(feedback_items):
-            print(f"  - \"{text}\"")
-        print("\n" + "="*50) # Separator line
-
-    print("\n--- End of Report ---")
+    with stage("report", rows=len(valid_codes)):
+        report = StreamingThemeReport(list(theme_code_of), samples_per_theme=samples_per_theme)
+        report.update(0, np.array(valid_codes, dtype=np.int64))
+        summary = report.summary(valid_texts.__getitem__)
+    print_report(summary)
+    with stage("write_summaries"):
+        write_summaries(summary, summary_json_filepath, summary_csv_filepath)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,321 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import numpy as np
+from cluster_model import ClusterModel
+from dedup_feedback import deduplicate
+from embedding_cache import EmbeddingCache, encode_with_cache
+from encoding_pool import get_shared_encoder
+from feedback_store import save_columnar
+from report_clusters import StreamingThemeReport, print_report, write_summaries
+from theme_labeling import (THEME_SEEDS, UNASSIGNED_THEME, centroid_distances, cluster_centroids, encode_theme_column,
+                            label_clusters, match_themes, theme_prototypes)
+
+def get_model(model_name):
+    # Models stay loaded for the lifetime of the process, so repeated runs pay startup once.
+    return get_shared_encoder(model_name)
+
+def fingerprint(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+LOCAL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def referenced_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):  # Lambdas and nested functions
+            names |= referenced_names(const)
+    return names
+
+def code_fingerprint(function):
+    """
+    Digest of a stage function's source, the helpers it calls from its own module and the source
+    files of the local modules it uses, so editing any of them invalidates the stage's cached outputs.
+    """
+    digest = hashlib.sha1()
+    pending, seen, module_files = [function], set(), set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            digest.update(inspect.getsource(current).encode('utf-8'))
+        except (OSError, TypeError):
+            digest.update(f"{current.__module__}.{current.__qualname__}".encode('utf-8'))
+        for name in sorted(referenced_names(current.__code__)):
+            value = current.__globals__.get(name)
+            if inspect.isfunction(value) and value.__module__ == current.__module__:
+                pending.append(value)
+                continue
+            path = getattr(inspect.getmodule(value), '__file__', None) if value is not None else None
+            if path and os.path.dirname(os.path.abspath(path)) == LOCAL_DIR:
+                module_files.add(os.path.abspath(path))
+    for path in sorted(module_files):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def texts_fingerprint(texts):
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+# Stage functions take the outputs of earlier stages (keyed by stage name, plus 'feedback'
+# for the input strings) and their parameters, and return a dict of NumPy arrays.
+
+def dedup_stage(ctx, near_duplicates=False, threshold=0.8):
+    texts = ctx['feedback']
+    _, group_ids, weights = deduplicate(texts, near_duplicates=near_duplicates, threshold=threshold)
+    _, representatives = np.unique(group_ids, return_index=True)
+    return {'group_ids': group_ids, 'weights': weights, 'representatives': representatives}
+
+def embed_stage(ctx, model_name, cache_dir=None, max_cache_entries=1_000_000, max_cache_age_runs=30):
+    texts = ctx['feedback']
+    representatives = ctx['dedup']['representatives']
+    unique_texts = [texts[i] for i in representatives.tolist()]
+    encode = lambda batch: get_model(model_name).encode(batch, show_progress_bar=True)
+    if cache_dir:
+        cache = EmbeddingCache(cache_dir, model_name)
+        embeddings = encode_with_cache(unique_texts, cache, encode)
+        # Same bounds as embed_feedback.py, so the shared cache does not grow without limit.
+        cache.compact(max_entries=max_cache_entries, max_age_runs=max_cache_age_runs)
+    else:
+        embeddings = np.asarray(encode(unique_texts), dtype=np.float32)
+    return {'embeddings': embeddings}
+
+def cluster_stage(ctx, n_clusters, random_state=42):
+    from sklearn.cluster import KMeans
+    embeddings = ctx['embed']['embeddings']
+    weights = ctx['dedup']['weights']
+    kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init='auto')
+    kmeans.fit(embeddings, sample_weight=weights)
+    return {'labels': kmeans.labels_, 'centroids': kmeans.cluster_centers_.astype(np.float32)}
+
+def analyze_stage(ctx, model_name, theme_seeds=THEME_SEEDS, theme_labeling="centroid", threshold=0.3, cache_dir=None):
+    embeddings = ctx['embed']['embeddings']
+    labels = ctx['cluster']['labels']
+    group_ids = ctx['dedup']['group_ids']
+    encode = lambda batch: get_model(model_name).encode(batch)
+    cache = EmbeddingCache(cache_dir or "embedding_cache", model_name)
+    theme_names, prototypes = theme_prototypes(theme_seeds, cache, encode)
+
+    centroids = cluster_centroids(embeddings, labels, sample_weight=ctx['dedup']['weights'])
+    distance = centroid_distances(embeddings, labels, centroids)[group_ids]
+    cluster_ids = labels[group_ids]
+    if theme_labeling == "row":
+        theme_indices, _ = match_themes(embeddings, prototypes, threshold)
+        names = np.array(theme_names + [UNASSIGNED_THEME])
+        row_names, theme_codes = np.unique(names[np.where(theme_indices >= 0, theme_indices, len(theme_names))][group_ids],
+                                           return_inverse=True)
+        row_names = row_names.tolist()
+        theme_map = {}
+    else:
+        theme_map, _ = label_clusters(centroids, theme_names, prototypes, threshold)
+        row_names, theme_codes = encode_theme_column(cluster_ids, theme_map)
+    return {
+        'cluster_ids': cluster_ids,
+        'theme_codes': theme_codes,
+        'theme_names': np.array(row_names),
+        'centroid_distance': distance,
+        'theme_map': np.array(json.dumps({str(k): v for k, v in theme_map.items()})),
+    }
+
+def report_stage(ctx, samples_per_theme=5):
+    texts = ctx['feedback']
+    analyzed = ctx['analyze']
+    report = StreamingThemeReport(analyzed['theme_names'].tolist(), samples_per_theme=samples_per_theme)
+    report.update(0, analyzed['theme_codes'], analyzed['centroid_distance'])
+    return {'summary': np.array(json.dumps(report.summary(texts.__getitem__), ensure_ascii=False))}
+
+class Stage:
+    def __init__(self, name, run, inputs=(), **params):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.params = params
+
+class Pipeline:
+    """
+    Runs stages as a DAG in one process, handing arrays from stage to stage in memory.
+
+    Each stage's fingerprint covers its parameters, the source of its function and the fingerprints
+    of its inputs. Outputs are memoized in memory and, when cache_dir is set, under cache_dir/<stage>-<fingerprint>/
+    as .npy files that are memory-mapped back on a hit, so unchanged stages are skipped both
+    within a process and across re-runs. Only the max_cached_runs most recently used
+    directories of each stage are kept on disk.
+    """
+
+    def __init__(self, stages, cache_dir=None, max_cached_runs=3):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = cache_dir
+        self.max_cached_runs = max_cached_runs
+        self._memo = {}
+
+    def _order(self, targets):
+        order, seen = [], set()
+
+        def visit(name):
+            if name in seen or name == 'feedback':
+                return
+            seen.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency)
+            order.append(name)
+
+        for name in targets:
+            visit(name)
+        return order
+
+    def _load_cached(self, stage_dir):
+        marker = os.path.join(stage_dir, "_complete")
+        if not (self.cache_dir and os.path.exists(marker)):
+            return None
+        os.utime(marker)  # Marks the directory as recently used for _evict
+        return {filename[:-4]: np.load(os.path.join(stage_dir, filename), mmap_mode='r')
+                for filename in os.listdir(stage_dir) if filename.endswith(".npy")}
+
+    def _store(self, stage_dir, outputs):
+        if not self.cache_dir:
+            return
+        os.makedirs(stage_dir, exist_ok=True)
+        for key, value in outputs.items():
+            np.save(os.path.join(stage_dir, f"{key}.npy"), value)
+        # Marker written last, so a crash mid-store never produces a partial cache hit.
+        open(os.path.join(stage_dir, "_complete"), 'w').close()
+
+    def _evict(self, name, keep_dir):
+        """Removes all but the max_cached_runs most recently used cache directories of a stage."""
+        if not (self.cache_dir and os.path.isdir(self.cache_dir)):
+            return
+        prefix = f"{name}-"
+        stage_dirs = [os.path.join(self.cache_dir, entry) for entry in os.listdir(self.cache_dir)
+                      if entry.startswith(prefix) and '-' not in entry[len(prefix):]]
+
+        def last_used(stage_dir):
+            marker = os.path.join(stage_dir, "_complete")
+            # Incomplete directories from a crashed run sort first and are removed first.
+            return os.path.getmtime(marker) if os.path.exists(marker) else 0.0
+
+        stage_dirs.sort(key=last_used, reverse=True)
+        for stale_dir in stage_dirs[self.max_cached_runs:]:
+            if os.path.abspath(stale_dir) != os.path.abspath(keep_dir):
+                shutil.rmtree(stale_dir, ignore_errors=True)
+
+    def run(self, texts, targets=None):
+        """Runs (or reuses) every stage needed for targets and returns {stage: outputs}."""
+        ctx = {'feedback': texts}
+        fingerprints = {'feedback': texts_fingerprint(texts)}
+        for name in self._order(targets or list(self.stages)):
+            stage = self.stages[name]
+            stage_fingerprint = fingerprint(name, stage.params, code_fingerprint(stage.run),
+                                            [fingerprints[dependency] for dependency in stage.inputs])
+            fingerprints[name] = stage_fingerprint
+            stage_dir = os.path.join(self.cache_dir or "", f"{name}-{stage_fingerprint[:16]}")
+
+            memo = self._memo.get(name)
+            if memo is not None and memo[0] == stage_fingerprint:
+                ctx[name] = memo[1]
+                print(f"[{name}] unchanged, reusing in-memory result.")
+                continue
+            cached = self._load_cached(stage_dir)
+            if cached is not None:
+                print(f"[{name}] unchanged, reusing cached result from {stage_dir}")
+            else:
+                print(f"[{name}] running...")
+                cached = stage.run({dependency: ctx[dependency] for dependency in stage.inputs}, **stage.params)
+                self._store(stage_dir, cached)
+                self._evict(name, stage_dir)
+            ctx[name] = cached
+            self._memo[name] = (stage_fingerprint, cached)
+        return ctx
+
+def build_pipeline(model_name='all-MiniLM-L6-v2', n_clusters=4, random_state=42, near_duplicates=False,
+                   theme_labeling="centroid", theme_confidence_threshold=0.3, samples_per_theme=5,
+                   embedding_cache_dir="embedding_cache", cache_dir=None):
+    return Pipeline([
+        Stage('dedup', dedup_stage, ['feedback'], near_duplicates=near_duplicates),
+        Stage('embed', embed_stage, ['feedback', 'dedup'], model_name=model_name, cache_dir=embedding_cache_dir),
+        Stage('cluster', cluster_stage, ['embed', 'dedup'], n_clusters=n_clusters, random_state=random_state),
+        Stage('analyze', analyze_stage, ['embed', 'cluster', 'dedup'], model_name=model_name, theme_seeds=THEME_SEEDS,
+              theme_labeling=theme_labeling, threshold=theme_confidence_threshold, cache_dir=embedding_cache_dir),
+        Stage('report', report_stage, ['feedback', 'analyze'], samples_per_theme=samples_per_theme),
+    ], cache_dir=cache_dir)
+
+def write_artifacts(ctx, unique_filepath="unique_feedback.json", group_ids_filepath="feedback_group_ids.npy",
+                    weights_filepath="feedback_weights.npy", embeddings_filepath="feedback_embeddings.npy",
+                    labels_filepath="cluster_labels.npy", columnar_output_dir="clustered_feedback_analyzed",
+                    model_dir="cluster_models", summary_json_filepath="theme_report.json",
+                    summary_csv_filepath="theme_report.csv"):
+    """
+    Writes the same files the standalone scripts produce with use_dedup enabled, for tools
+    that still read them: embeddings and labels are per unique representative.
+    """
+    analyzed = ctx['analyze']
+    with open(unique_filepath, 'w') as f:
+        json.dump([ctx['feedback'][i] for i in ctx['dedup']['representatives'].tolist()], f, indent=2)
+    np.save(group_ids_filepath, ctx['dedup']['group_ids'])
+    np.save(weights_filepath, ctx['dedup']['weights'])
+    np.save(embeddings_filepath, ctx['embed']['embeddings'])
+    np.save(labels_filepath, ctx['cluster']['labels'])
+    save_columnar(columnar_output_dir, ctx['feedback'], analyzed['cluster_ids'], analyzed['theme_codes'],
+                  analyzed['theme_names'].tolist(), centroid_distance=analyzed['centroid_distance'])
+    model, _ = ClusterModel.from_fit(ctx['cluster']['centroids'], ctx['embed']['embeddings'], ctx['cluster']['labels'],
+                                     sample_weight=ctx['dedup']['weights'])
+    model.theme_map = {int(k): v for k, v in json.loads(str(analyzed['theme_map'])).items()}
+    print(f"Cluster model saved to {model.save(model_dir)}")
+    write_summaries(json.loads(str(ctx['report']['summary'])), summary_json_filepath, summary_csv_filepath)
+    print(f"Artifacts written: {embeddings_filepath}, {labels_filepath}, {columnar_output_dir}/")
+
+def main():
+    """
+    Runs dedup -> embed -> cluster -> analyze -> report in one process, skipping every stage
+    whose inputs and parameters are unchanged since the last run.
+    """
+    feedback_filepath = "sample_feedback.json"
+    cache_dir = "pipeline_cache"  # Stage outputs are kept here between runs; None keeps them in memory only
+    save_artifacts = False  # Set True to also write the .npy / columnar / report files of the standalone scripts
+
+    try:
+        with open(feedback_filepath, 'r') as f:
+            feedback_strings = json.load(f)
+        print(f"Successfully loaded {len(feedback_strings)} feedback strings from {feedback_filepath}")
+    except FileNotFoundError:
+        print(f"Error: The file {feedback_filepath} was not found.")
+        return
+    except json.JSONDecodeError:
+        print(f"Error: Could not decode JSON from {feedback_filepath}.")
+        return
+
+    if not isinstance(feedback_strings, list) or not all(isinstance(item, str) for item in feedback_strings):
+        print(f"Error: Expected {feedback_filepath} to contain a list of strings.")
+        return
+    if not feedback_strings:
+        print(f"Warning: {feedback_filepath} is empty. Nothing to run.")
+        return
+
+    pipeline = build_pipeline(cache_dir=cache_dir)
+    try:
+        ctx = pipeline.run(feedback_strings)
+    except Exception as e:
+        print(f"An error occurred while running the pipeline: {e}")
+        return
+
+    print()
+    print_report(json.loads(str(ctx['report']['summary'])))
+    if save_artifacts:
+        try:
+            write_artifacts(ctx)
+        except Exception as e:
+            print(f"Error writing pipeline artifacts: {e}")
+
+if __name__ == "__main__":
+    main()
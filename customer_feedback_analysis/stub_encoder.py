@@ -0,0 +1,39 @@
+import re
+import zlib
+import numpy as np
+
+class HashingEncoder:
+    """
+    Deterministic, dependency-free stand-in for SentenceTransformer used by the benchmarks.
+    Each lowercase word is hashed to a signed coordinate (feature hashing) and the bag of words
+    is L2-normalized, so texts sharing words land close together and clustering still has
+    structure to find. Exposes the subset of the SentenceTransformer API the pipeline uses.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _slot(self, token):
+        # Hashed on every call rather than memoized: a per-token dict would grow with the vocabulary.
+        h = zlib.crc32(token.encode('utf-8'))
+        return h % self.dim, 1.0 if (h >> 31) & 1 else -1.0
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False, **kwargs):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r'\w+', text.lower()):
+                column, sign = self._slot(token)
+                embeddings[row, column] += sign
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.maximum(norms, 1e-12)
+        return embeddings[0] if single else embeddings
+
+def load_hashing_encoder(model_name, dim=384):
+    """Model loader with the same signature as encoding_pool.load_sentence_transformer."""
+    return HashingEncoder(dim=dim)
@@ -0,0 +1,15 @@
+import os
+import sys
+import pytest
+
+# The pipeline scripts import each other as top-level modules, the way they run from this directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def graph_rag():
+    """A fresh graph-rag.py module using the offline HashingEncoder, so module state never leaks between tests."""
+    from benchmark_pipeline import load_graph_rag
+    from stub_encoder import HashingEncoder
+    module = load_graph_rag()
+    module.model = HashingEncoder(dim=64)
+    return module
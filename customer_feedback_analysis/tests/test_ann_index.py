@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from ann_index import build_index, load_index
+
+def vectors_and_queries(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(400, 16)).astype(np.float32), rng.normal(size=(25, 16)).astype(np.float32)
+
+def test_exact_index_matches_brute_force_and_pads():
+    vectors, queries = vectors_and_queries()
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids, scores = build_index("exact", vectors).search(queries, top_k=5)
+    np.testing.assert_array_equal(ids, np.argsort(-(queries @ unit.T), axis=1, kind='stable')[:, :5])
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+    ids, scores = build_index("exact", vectors[:3]).search(queries[:2], top_k=5)
+    assert (ids[:, 3:] == -1).all() and np.isneginf(scores[:, 3:]).all()
+
+def test_ivf_probing_every_cell_is_exact():
+    vectors, queries = vectors_and_queries()
+    exact_ids, exact_scores = build_index("exact", vectors).search(queries, top_k=10)
+    ivf_ids, ivf_scores = build_index("ivf", vectors, nlist=12, nprobe=12).search(queries, top_k=10)
+    np.testing.assert_array_equal(ivf_ids, exact_ids)
+    np.testing.assert_allclose(ivf_scores, exact_scores, rtol=1e-5)
+
+def test_ivf_recall_grows_with_nprobe():
+    vectors, queries = vectors_and_queries(1)
+    exact_ids, _ = build_index("exact", vectors).search(queries, top_k=10)
+    index = build_index("ivf", vectors, nlist=16, nprobe=1)
+    recalls = []
+    for nprobe in (1, 4, 16):
+        index.nprobe = nprobe
+        ids, _ = index.search(queries, top_k=10)
+        recalls.append(np.mean([len(set(a) & set(b)) / 10 for a, b in zip(ids.tolist(), exact_ids.tolist())]))
+    assert recalls[0] <= recalls[1] <= recalls[2] == 1.0
+
+@pytest.mark.parametrize("kind", ["exact", "ivf"])
+def test_saved_index_searches_the_same(tmp_path, kind):
+    vectors, queries = vectors_and_queries()
+    index = build_index(kind, vectors, **({'nlist': 8, 'nprobe': 3} if kind == "ivf" else {}))
+    index.save(str(tmp_path))
+    loaded = load_index(str(tmp_path))
+    np.testing.assert_array_equal(loaded.search(queries, top_k=7)[0], index.search(queries, top_k=7)[0])
+    if kind == "ivf":
+        assert load_index(str(tmp_path), nprobe=8).nprobe == 8
+
+def test_ivf_built_from_a_memory_map_writes_its_vectors_once(tmp_path):
+    vectors, queries = vectors_and_queries()
+    np.save(tmp_path / "vectors.npy", vectors)
+    expected = build_index("ivf", vectors, nlist=8, nprobe=3).search(queries, top_k=7)
+    index = build_index("ivf", np.load(tmp_path / "vectors.npy", mmap_mode='r'), index_dir=str(tmp_path / "index"),
+                        nlist=8, nprobe=3)
+    assert isinstance(index.vectors, np.memmap)
+    assert index.vectors.filename == str(tmp_path / "index" / "vectors.npy")
+    for searched in (index, load_index(str(tmp_path / "index"))):
+        ids, scores = searched.search(queries, top_k=7)
+        np.testing.assert_array_equal(ids, expected[0])
+        np.testing.assert_allclose(scores, expected[1], rtol=1e-5)
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        build_index("faiss", np.zeros((2, 2)))
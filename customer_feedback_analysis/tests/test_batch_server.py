@@ -0,0 +1,127 @@
+import asyncio
+import pytest
+from batch_server import HTTPClient, MicroBatcher, handle_http_request, start_http_server
+from graph_store import GraphStore
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_requests_are_batched_and_answered_in_order():
+    batches = []
+
+    def process(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    async def main():
+        async with MicroBatcher(process, max_batch_size=4, max_wait_ms=50) as batcher:
+            results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+            return results, batcher.stats()
+
+    results, stats = run(main())
+    assert results == [i * 2 for i in range(10)]
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert stats['items'] == 10 and stats['errors'] == 0
+
+def test_mixed_batch_fails_only_the_invalid_requests():
+    def process(items):
+        return [ValueError(f"bad {item}") if item < 0 else item for item in items]
+
+    async def main():
+        async with MicroBatcher(process, max_batch_size=8, max_wait_ms=50) as batcher:
+            return await asyncio.gather(*(batcher.submit(item) for item in [1, -1, 2, -2]),
+                                        return_exceptions=True), batcher.stats()
+
+    results, stats = run(main())
+    assert results[0] == 1 and results[2] == 2
+    assert [str(results[1]), str(results[3])] == ["bad -1", "bad -2"]
+    assert stats['errors'] == 2
+
+def test_raising_batch_function_fails_the_whole_batch():
+    def process(items):
+        raise RuntimeError("model crashed")
+
+    async def main():
+        async with MicroBatcher(process, max_wait_ms=20) as batcher:
+            return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    assert [str(result) for result in run(main())] == ["model crashed"] * 2
+
+def test_wait_budget_shrinks_with_batch_time():
+    batcher = MicroBatcher(lambda items: items, max_wait_ms=10, p99_target_ms=100)
+    batcher.batch_ms = 46
+    assert batcher.wait_ms() == 8
+    batcher.batch_ms = 60
+    assert batcher.wait_ms() == 0
+
+@pytest.fixture
+def served_graph_rag(graph_rag, tmp_path):
+    store = GraphStore(str(tmp_path), graph_rag.model_name)
+    store.add(edges=graph_rag.DEMO_EDGES, encode_fn=graph_rag.model.encode)
+    graph_rag._store = store
+    return graph_rag
+
+@pytest.mark.parametrize("bad", [{"top_k": "5"}, {"top_k": -1}, {"top_k": True}, {"top_k": [1]}, {"top_k": None},
+                                 {"top_k": 10**9}, {"hops": 1.5}, {"hops": -2}, {"hops": {}}])
+def test_invalid_parameters_are_rejected(served_graph_rag, bad):
+    with pytest.raises(ValueError):
+        served_graph_rag.validate_query_request(dict({"query": "Ankara"}, **bad))
+
+def test_handle_query_batch_reports_errors_per_request(served_graph_rag):
+    results = served_graph_rag.handle_query_batch([
+        {"query": "Ankara"}, {"query": "İstanbul", "top_k": [1]}, {"query": "Türkiye", "hops": 0, "embedding": True},
+        {"query": "nüfus", "top_k": -3}, {"query": "İstanbul", "top_k": 2}])
+    assert isinstance(results[1], ValueError) and isinstance(results[3], ValueError)
+    assert results[0]["response"].startswith("'Ankara'")
+    assert len(results[2]["embedding"]) == 64
+    assert results[4]["response"].startswith("'İstanbul'")
+
+def test_group_failure_is_isolated_to_the_failing_query(served_graph_rag, monkeypatch):
+    graphrag_batch = served_graph_rag.graphrag_batch
+
+    def flaky(queries, **kwargs):
+        if "boom" in queries:
+            raise ValueError("boom")
+        return graphrag_batch(queries, **kwargs)
+
+    monkeypatch.setattr(served_graph_rag, "graphrag_batch", flaky)
+    results = served_graph_rag.handle_query_batch([{"query": "Ankara"}, {"query": "boom"}, {"query": "Türkiye"}])
+    assert str(results[1]) == "boom"
+    assert "response" in results[0] and "response" in results[2]
+
+def test_systemic_group_failure_is_not_retried_per_query(served_graph_rag, monkeypatch):
+    calls = []
+
+    def broken_encoder(queries, **kwargs):
+        calls.append(list(queries))
+        raise RuntimeError("encoder unavailable")
+
+    monkeypatch.setattr(served_graph_rag, "graphrag_batch", broken_encoder)
+    results = served_graph_rag.handle_query_batch([{"query": "Ankara"}, {"query": "Türkiye"}, {"query": "nüfus"}])
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_http_server_answers_mixed_requests(served_graph_rag):
+    async def main():
+        batcher = MicroBatcher(served_graph_rag.handle_query_batch, max_batch_size=8, max_wait_ms=50)
+        async with batcher:
+            server = await start_http_server(batcher, "127.0.0.1", 0, validate=served_graph_rag.validate_query_request)
+            port = server.sockets[0].getsockname()[1]
+            clients = [HTTPClient("127.0.0.1", port) for _ in range(4)]
+            try:
+                payloads = [{"query": "Ankara"}, {"query": "Ankara", "top_k": "x"}, {"query": 3},
+                            {"query": "İstanbul", "hops": 1}]
+                answers = await asyncio.gather(*(client.post(payload) for client, payload in zip(clients, payloads)))
+                wrong_method = await clients[0].post({}, path="/stats")  # /stats is GET only
+            finally:
+                for client in clients:
+                    await client.close()
+                server.close()
+                await server.wait_closed()
+            not_found = await handle_http_request(batcher, "GET /missing HTTP/1.1", b"")
+        return answers, wrong_method, not_found
+
+    answers, wrong_method, not_found = run(main())
+    assert [status for status, _ in answers] == [200, 400, 400, 200]
+    assert "top_k" in answers[1][1]['error']
+    assert wrong_method[0] == 404 and not_found[0] == 404
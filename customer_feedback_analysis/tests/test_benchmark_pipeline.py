@@ -0,0 +1,38 @@
+import csv
+import numpy as np
+import pytest
+import benchmark_pipeline
+from stub_encoder import HashingEncoder
+
+def test_hashing_encoder_is_deterministic_and_unit_norm():
+    texts = ["Support was slow", "support WAS slow!", "Pricing is unclear"]
+    first = HashingEncoder(dim=64).encode(texts)
+    np.testing.assert_array_equal(first, HashingEncoder(dim=64).encode(texts))
+    np.testing.assert_allclose(np.linalg.norm(first, axis=1), 1, rtol=1e-6)
+    np.testing.assert_allclose(first[0], first[1])
+    assert first[0] @ first[2] < 0.5
+    assert vars(HashingEncoder()) == {'dim': 384}  # No per-token state that grows with the vocabulary
+
+def test_run_size_measures_every_stage(tmp_path):
+    records = benchmark_pipeline.run_size(300, str(tmp_path), HashingEncoder(dim=32), batch_size=128, graph_nodes=100,
+                                          graph_queries=3, trace_memory=False)
+    assert [record['stage'] for record in records] == ["generate", "embed", "cluster", "analyze", "report",
+                                                       "graph_retrieval"]
+
+def test_graph_stage_errors_are_not_swallowed(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("graph stage broke")
+
+    monkeypatch.setattr(benchmark_pipeline, "benchmark_graph_retrieval", fail)
+    with pytest.raises(RuntimeError, match="graph stage broke"):
+        benchmark_pipeline.run_size(200, str(tmp_path), HashingEncoder(dim=32), batch_size=128, trace_memory=False)
+
+def test_append_results_writes_tags_before_record_columns(tmp_path):
+    path = str(tmp_path / "results.csv")
+    for value in (1, 2):
+        benchmark_pipeline.append_results(path, [{'index': "ivf", 'mean_ms': value}], ['index', 'mean_ms'], "abc123",
+                                          num_vectors=10, top_k=5)
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ['commit', 'timestamp', 'num_vectors', 'top_k', 'index', 'mean_ms']
+    assert [row['mean_ms'] for row in rows] == ["1", "2"] and rows[1]['commit'] == "abc123"
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from cluster_feedback import EmbeddingShards, fit_minibatch_kmeans
+
+def blobs(num_per_cluster=200, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.eye(4, dim, dtype=np.float32) * 10
+    points = np.concatenate([center + rng.normal(scale=0.5, size=(num_per_cluster, dim)) for center in centers])
+    truth = np.repeat(np.arange(4), num_per_cluster)
+    order = rng.permutation(len(points))
+    return points[order].astype(np.float32), truth[order]
+
+def write_shards(tmp_path, embeddings, num_shards):
+    paths = []
+    for i, shard in enumerate(np.array_split(embeddings, num_shards)):
+        paths.append(str(tmp_path / f"embeddings_{i}.npy"))
+        np.save(paths[-1], shard)
+    return paths
+
+def test_shards_read_as_one_matrix(tmp_path):
+    embeddings, _ = blobs()
+    shards = EmbeddingShards(write_shards(tmp_path, embeddings, 3))
+    assert shards.shape == embeddings.shape
+    rows = np.concatenate([batch for _, batch in shards.iter_batches(64)])
+    np.testing.assert_array_equal(rows, embeddings)
+    starts = [start for start, _ in shards.iter_batches(64, rng=np.random.default_rng(1))]
+    assert sorted(starts) == [start for start, _ in shards.iter_batches(64)]
+
+def test_inconsistent_shards_are_rejected(tmp_path):
+    np.save(tmp_path / "a.npy", np.zeros((3, 4), dtype=np.float32))
+    np.save(tmp_path / "b.npy", np.zeros((3, 5), dtype=np.float32))
+    with pytest.raises(ValueError):
+        EmbeddingShards([str(tmp_path / "a.npy"), str(tmp_path / "b.npy")])
+
+def test_out_of_core_kmeans_recovers_clusters(tmp_path):
+    embeddings, truth = blobs()
+    shards = EmbeddingShards(write_shards(tmp_path, embeddings, 3))
+    _, labels = fit_minibatch_kmeans(shards, 4, batch_size=100, n_passes=2)
+    # Every true cluster maps onto exactly one label.
+    pairs = set(zip(truth.tolist(), labels.tolist()))
+    assert len(pairs) == 4 and len({label for _, label in pairs}) == 4
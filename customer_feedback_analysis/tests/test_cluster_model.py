@@ -0,0 +1,58 @@
+import numpy as np
+from cluster_feedback import EmbeddingShards
+from cluster_model import ClusterModel, align_to_previous, assign_nearest_centroid, load_latest
+
+def make_shards(tmp_path, embeddings, num_shards=3):
+    paths = []
+    for i, shard in enumerate(np.array_split(embeddings, num_shards)):
+        paths.append(str(tmp_path / f"embeddings_{i}.npy"))
+        np.save(paths[-1], shard)
+    return EmbeddingShards(paths)
+
+def test_shard_slices_cross_file_boundaries(tmp_path):
+    embeddings = np.arange(70, dtype=np.float32).reshape(35, 2)
+    shards = make_shards(tmp_path, embeddings)
+    for start, stop in [(0, 35), (5, 20), (10, 13), (30, 40), (35, 35)]:
+        np.testing.assert_array_equal(shards[start:stop], embeddings[start:stop])
+
+def test_chunked_assignment_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(500, 6)).astype(np.float32)
+    centroids = rng.normal(size=(5, 6)).astype(np.float32)
+    expected = ((embeddings[:, None, :] - centroids[None]) ** 2).sum(axis=2)
+    labels, squared_distances = assign_nearest_centroid(make_shards(tmp_path, embeddings), centroids, chunk_size=64)
+    np.testing.assert_array_equal(labels, expected.argmin(axis=1))
+    np.testing.assert_allclose(squared_distances, expected.min(axis=1), rtol=1e-4, atol=1e-4)
+
+def test_from_fit_on_shards_aligns_to_previous_model(tmp_path):
+    rng = np.random.default_rng(1)
+    centers = np.array([[0, 0], [10, 0], [0, 10]], dtype=np.float32)
+    truth = rng.integers(0, 3, size=300)
+    embeddings = (centers[truth] + rng.normal(scale=0.1, size=(300, 2))).astype(np.float32)
+    previous = ClusterModel(centers, theme_map={0: "a", 1: "b", 2: "c"})
+
+    # A refit that found the same clusters under shuffled IDs.
+    permutation = np.array([2, 0, 1])
+    model, labels = ClusterModel.from_fit(centers[permutation], make_shards(tmp_path, embeddings),
+                                          np.argsort(permutation)[truth], previous=previous)
+    np.testing.assert_array_equal(model.centroids, centers)
+    np.testing.assert_array_equal(labels, truth)
+    assert model.theme_map == previous.theme_map
+    assert 0 < model.baseline_sq_distance < 0.1
+
+def test_align_to_previous_is_a_permutation():
+    rng = np.random.default_rng(2)
+    previous = rng.normal(size=(6, 4))
+    order = rng.permutation(6)
+    permutation = align_to_previous(previous[order] + 0.01, previous)
+    np.testing.assert_array_equal(order[permutation], np.arange(6))
+
+def test_save_and_load_latest(tmp_path):
+    model = ClusterModel(np.eye(3), theme_map={1: "x"}, baseline_sq_distance=0.5, baseline_shares=[0.2, 0.3, 0.5])
+    model.save(str(tmp_path))
+    model.save(str(tmp_path))
+    loaded = load_latest(str(tmp_path))
+    assert loaded.version == 2
+    assert loaded.theme_map == {1: "x"}
+    np.testing.assert_array_equal(loaded.centroids, model.centroids)
+    np.testing.assert_array_equal(loaded.baseline_shares, model.baseline_shares)
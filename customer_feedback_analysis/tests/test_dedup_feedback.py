@@ -0,0 +1,28 @@
+import numpy as np
+from dedup_feedback import deduplicate, group_exact, lsh_groups, minhash_signatures
+
+def test_exact_duplicates_collapse_after_normalization():
+    texts = ["Great service!", "great   SERVICE", "Slow delivery.", "Great service"]
+    representatives, group_ids = group_exact(texts)
+    np.testing.assert_array_equal(representatives, [0, 2])
+    np.testing.assert_array_equal(group_ids, [0, 0, 1, 0])
+
+def test_deduplicate_maps_every_row_and_counts_weights():
+    texts = ["late parcel", "Late parcel!", "rude driver", "late parcel", "refund took weeks"]
+    unique_texts, group_ids, weights = deduplicate(texts)
+    assert unique_texts == ["late parcel", "rude driver", "refund took weeks"]
+    assert [unique_texts[group] for group in group_ids] == ["late parcel", "late parcel", "rude driver",
+                                                            "late parcel", "refund took weeks"]
+    np.testing.assert_array_equal(weights, [3, 1, 1])
+
+def test_near_duplicates_merge_only_above_threshold():
+    base = "The delivery was two days late and the box arrived damaged at my door"
+    texts = [base, base + " again", "The customer support team resolved my billing problem quickly"]
+    unique_texts, group_ids, weights = deduplicate(texts, near_duplicates=True, num_perm=128, bands=32, threshold=0.7)
+    assert unique_texts == [base, texts[2]]
+    np.testing.assert_array_equal(group_ids, [0, 0, 1])
+    np.testing.assert_array_equal(weights, [2, 1])
+
+def test_identical_signatures_share_a_group():
+    signatures = minhash_signatures(["same text here", "same text here", "something else entirely"])
+    np.testing.assert_array_equal(lsh_groups(signatures), [0, 0, 2])
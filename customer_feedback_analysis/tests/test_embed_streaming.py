@@ -0,0 +1,55 @@
+import json
+import numpy as np
+import pytest
+from embed_feedback import embed_streaming
+from generate_sample_feedback import write_feedback_jsonl
+from stub_encoder import HashingEncoder
+
+TEXTS = [f"feedback number {i} about the delivery" for i in range(45)]
+
+@pytest.fixture
+def feedback_file(tmp_path):
+    path = tmp_path / "feedback.jsonl"
+    write_feedback_jsonl(str(path), TEXTS)
+    return str(path)
+
+def test_streaming_matches_in_memory_encode(tmp_path, feedback_file):
+    encoder = HashingEncoder(dim=16)
+    output = str(tmp_path / "embeddings.npy")
+    rows = embed_streaming(feedback_file, output, output + ".checkpoint.json", encoder.encode, batch_size=10)
+    assert rows == len(TEXTS)
+    np.testing.assert_array_equal(np.load(output), encoder.encode(TEXTS))
+    assert not (tmp_path / "embeddings.npy.checkpoint.json").exists()
+
+def test_interrupted_run_resumes_at_last_batch(tmp_path, feedback_file):
+    encoder = HashingEncoder(dim=16)
+    output = str(tmp_path / "embeddings.npy")
+    checkpoint = output + ".checkpoint.json"
+    encoded = []
+
+    def failing_encode(texts):
+        if len(encoded) == 2:
+            raise RuntimeError("interrupted")
+        encoded.append(list(texts))
+        return encoder.encode(texts)
+
+    with pytest.raises(RuntimeError):
+        embed_streaming(feedback_file, output, checkpoint, failing_encode, batch_size=10)
+    with open(checkpoint) as f:
+        assert json.load(f)['rows_done'] == 20
+
+    resumed = []
+    embed_streaming(feedback_file, output, checkpoint, lambda texts: resumed.append(list(texts)) or encoder.encode(texts),
+                    batch_size=10)
+    assert resumed[0] == TEXTS[20:30]
+    np.testing.assert_array_equal(np.load(output), encoder.encode(TEXTS))
+
+def test_changed_input_restarts_from_scratch(tmp_path, feedback_file):
+    encoder = HashingEncoder(dim=16)
+    output = str(tmp_path / "embeddings.npy")
+    checkpoint = output + ".checkpoint.json"
+    with open(checkpoint, 'w') as f:
+        json.dump({'input_filepath': 'elsewhere', 'rows_done': 40}, f)
+    np.save(output, np.zeros((45, 16), dtype=np.float32))
+    embed_streaming(feedback_file, output, checkpoint, encoder.encode, batch_size=10)
+    np.testing.assert_array_equal(np.load(output), encoder.encode(TEXTS))
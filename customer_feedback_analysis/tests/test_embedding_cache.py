@@ -0,0 +1,59 @@
+import numpy as np
+from embedding_cache import EmbeddingCache, encode_with_cache
+from stub_encoder import HashingEncoder
+
+# SHA-1 digests of these texts end in a NUL byte, which an 'S20' key array silently dropped.
+NUL_TERMINATED = ['text3', 'text66', 'text208']
+
+def counting_encoder():
+    encoder = HashingEncoder(dim=16)
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return encoder.encode(texts)
+    return encode, calls
+
+def test_digests_ending_in_nul_survive_reload(tmp_path):
+    assert all(EmbeddingCache.text_key(text)[-1] == 0 for text in NUL_TERMINATED)
+    texts = NUL_TERMINATED + ['alpha', 'beta', 'gamma']
+    encode, calls = counting_encoder()
+    first = encode_with_cache(texts, EmbeddingCache(tmp_path, "m"), encode)
+
+    for _ in range(3):
+        cache = EmbeddingCache(tmp_path, "m")
+        again = encode_with_cache(texts, cache, encode)
+        np.testing.assert_array_equal(again, first)
+        assert len(cache) == len(cache.keys) == len(texts)
+    assert calls == [texts]
+
+def test_new_rows_never_overwrite_saved_vectors(tmp_path):
+    encode, _ = counting_encoder()
+    first = encode_with_cache(NUL_TERMINATED, EmbeddingCache(tmp_path, "m"), encode)
+    encode_with_cache(['delta', 'epsilon'], EmbeddingCache(tmp_path, "m"), encode)
+    cache = EmbeddingCache(tmp_path, "m")
+    np.testing.assert_array_equal(encode_with_cache(NUL_TERMINATED, cache, encode), first)
+    assert cache.vectors().shape == (5, 16)
+
+def test_unsaved_rows_from_a_crashed_run_are_overwritten(tmp_path):
+    encode, _ = counting_encoder()
+    encode_with_cache(['alpha'], EmbeddingCache(tmp_path, "m"), encode)
+    crashed = EmbeddingCache(tmp_path, "m")
+    crashed.add([EmbeddingCache.text_key('lost')], np.ones((1, 16), dtype=np.float32))  # never saved
+
+    cache = EmbeddingCache(tmp_path, "m")
+    embeddings = encode_with_cache(['beta'], cache, encode)
+    np.testing.assert_array_equal(embeddings, HashingEncoder(dim=16).encode(['beta']))
+    assert cache.vectors().shape == (2, 16)
+
+def test_compact_keeps_recent_entries(tmp_path):
+    encode, _ = counting_encoder()
+    encode_with_cache(['old'], EmbeddingCache(tmp_path, "m"), encode)
+    for _ in range(3):
+        encode_with_cache(['new', 'text3'], EmbeddingCache(tmp_path, "m"), encode)
+    cache = EmbeddingCache(tmp_path, "m")
+    assert cache.compact(max_age_runs=2) == 1
+    reloaded = EmbeddingCache(tmp_path, "m")
+    keys, rows = reloaded.lookup(['old', 'new', 'text3'])
+    assert rows[0] == -1 and (rows[1:] >= 0).all()
+    np.testing.assert_array_equal(reloaded.vectors()[rows[1:]], HashingEncoder(dim=16).encode(['new', 'text3']))
@@ -0,0 +1,24 @@
+import numpy as np
+import encoding_pool
+from encoding_pool import ParallelEncoder, get_shared_encoder
+from stub_encoder import HashingEncoder, load_hashing_encoder
+
+def test_parallel_encoder_preserves_input_order():
+    texts = [f"text {i} about refunds and delivery {i % 7}" for i in range(103)]
+    with ParallelEncoder("stub", num_workers=2, chunk_size=10, model_loader=load_hashing_encoder) as encoder:
+        embeddings = encoder.encode(texts)
+        again = encoder.encode(texts[:5])
+    np.testing.assert_array_equal(embeddings, HashingEncoder().encode(texts))
+    np.testing.assert_array_equal(again, embeddings[:5])
+
+def test_shared_encoder_loads_once(monkeypatch):
+    monkeypatch.setattr(encoding_pool, '_shared_encoders', {})
+    loads = []
+
+    def loader(model_name):
+        loads.append(model_name)
+        return HashingEncoder()
+
+    first = get_shared_encoder("stub", model_loader=loader)
+    assert get_shared_encoder("stub", model_loader=loader) is first
+    assert loads == ["stub"]
@@ -0,0 +1,32 @@
+import json
+import numpy as np
+from feedback_store import ColumnarFeedback, save_columnar, smallest_int_dtype
+
+TEXTS = ["Harika bir ürün!", "", "Support was slow 😞", "Fiyatlar?"]
+
+def test_round_trip_keeps_unicode_and_small_dtypes(tmp_path):
+    save_columnar(str(tmp_path), TEXTS, [3, 0, 1, 3], [1, 0, 2, 1], ["Unknown", "A", "B"],
+                  centroid_distance=[0.1, 0.2, 0.3, 0.4])
+    feedback = ColumnarFeedback(str(tmp_path))
+    assert len(feedback) == 4
+    assert [feedback.text(i) for i in range(4)] == TEXTS
+    assert feedback.cluster_id.dtype == np.int8 and feedback.theme_code.dtype == np.uint8
+    assert feedback.row(2) == {'feedback_text': TEXTS[2], 'cluster_id': 1, 'theme_label': "B"}
+    np.testing.assert_allclose(feedback.centroid_distance, [0.1, 0.2, 0.3, 0.4])
+
+def test_export_json_matches_rows(tmp_path):
+    save_columnar(str(tmp_path / "store"), TEXTS, [0, 1, 0, 1], [0, 1, 0, 1], ["A", "B"])
+    feedback = ColumnarFeedback(str(tmp_path / "store"))
+    feedback.export_json(str(tmp_path / "out.json"))
+    with open(tmp_path / "out.json", encoding='utf-8') as f:
+        assert json.load(f) == [feedback.row(i) for i in range(len(feedback))]
+
+def test_rewrite_without_distances_drops_stale_column(tmp_path):
+    save_columnar(str(tmp_path), TEXTS, [0] * 4, [0] * 4, ["A"], centroid_distance=[0.0] * 4)
+    save_columnar(str(tmp_path), TEXTS[:2], [0] * 2, [0] * 2, ["A"])
+    assert ColumnarFeedback(str(tmp_path)).centroid_distance is None
+
+def test_smallest_int_dtype():
+    assert smallest_int_dtype(127) == np.int8
+    assert smallest_int_dtype(128) == np.int16
+    assert smallest_int_dtype(255, signed=False) == np.uint8
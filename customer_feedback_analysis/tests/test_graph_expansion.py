@@ -0,0 +1,44 @@
+import networkx as nx
+import numpy as np
+from graph_store import GraphStore
+from stub_encoder import HashingEncoder
+
+def random_store(tmp_path, num_nodes=60, num_edges=120, seed=0):
+    rng = np.random.default_rng(seed)
+    edges = [(f"n{a}", f"n{b}", "r") for a, b in rng.integers(0, num_nodes, size=(num_edges, 2)).tolist()]
+    store = GraphStore(str(tmp_path), "stub")
+    store.add(edges=edges, encode_fn=HashingEncoder(dim=16).encode)
+    G = nx.Graph()
+    G.add_edges_from((store.node_id[a], store.node_id[b]) for a, b, _ in edges)
+    return store, G
+
+def test_uncapped_expansion_matches_networkx_bfs(tmp_path):
+    store, G = random_store(tmp_path)
+    seeds = [0, 5, 9]
+    for hops in range(4):
+        expected = nx.multi_source_dijkstra_path_length(G, seeds, cutoff=hops)
+        np.testing.assert_array_equal(store.expand(seeds, hops=hops, max_fanout=None), sorted(expected))
+
+def test_caps_bound_the_expansion(tmp_path):
+    store, G = random_store(tmp_path, seed=1)
+    query = HashingEncoder(dim=16).encode("n3")
+    capped = store.expand([3], query, hops=3, max_fanout=2, max_nodes=8)
+    assert 3 in capped and len(capped) <= 8
+    assert set(capped) <= set(nx.single_source_shortest_path_length(G, 3, cutoff=3))
+    first_hop = store.expand([3], query, hops=1, max_fanout=2)
+    assert len(first_hop) <= 3
+    assert len(store.expand([3], query, hops=2, max_fanout=None, min_score=1.01)) == 1
+
+def test_expansion_settings_are_read_at_call_time(graph_rag, tmp_path):
+    store = GraphStore(str(tmp_path), graph_rag.model_name)
+    store.add(edges=[("hub", f"leaf {i}", "r") for i in range(20)], encode_fn=graph_rag.model.encode)
+    graph_rag.max_fanout = 3
+    graph_rag.max_subgraph_nodes = 100
+    assert graph_rag.extract_subgraph_from_store(store, "hub", top_k=1, hops=1).number_of_nodes() == 4
+    assert graph_rag.extract_subgraph_from_store(store, "hub", top_k=1, hops=1, fanout=5).number_of_nodes() == 6
+
+    # The response cache is keyed by these settings, so changing one recomputes the answer.
+    first, _ = graph_rag.graphrag("hub", store=store, top_k=1, hops=1)
+    graph_rag.max_fanout = 10
+    second, _ = graph_rag.graphrag("hub", store=store, top_k=1, hops=1)
+    assert first.count("  - r leaf") == 3 and second.count("  - r leaf") == 10
@@ -0,0 +1,44 @@
+import networkx as nx
+import numpy as np
+from graph_store import top_k_indices
+
+def test_top_k_indices_matches_a_stable_full_sort():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 5, size=(20, 30)).astype(np.float32)  # Many ties
+    for top_k in (1, 3, 30, 50):
+        expected = np.argsort(-scores, axis=1, kind='stable')[:, :top_k]
+        np.testing.assert_array_equal(top_k_indices(scores, top_k), expected)
+    assert top_k_indices(scores, 0).shape == (20, 0)
+
+def test_batched_extract_subgraphs_matches_brute_force(graph_rag):
+    G = nx.Graph()
+    G.add_edge("Türkiye", "İstanbul", relation="şehri")
+    G.add_edge("Türkiye", "Ankara", relation="başkenti")
+    G.add_edge("İstanbul", "Boğaziçi Köprüsü", relation="landmark")
+    graph_rag.encode_nodes(G)
+    G.add_node("Added later")  # Not encoded, so never retrieved
+
+    queries = ["İstanbul köprü", "Ankara başkenti"]
+    subgraphs = graph_rag.extract_subgraphs(G, queries, top_k=2)
+    nodes = [node for node in G.nodes() if 'embedding' in G.nodes[node]]
+    assert "Added later" not in nodes
+    vectors = graph_rag.model.encode(nodes)
+    for query, subgraph in zip(queries, subgraphs):
+        scores = vectors @ graph_rag.model.encode(query)
+        expected = {nodes[i] for i in np.argsort(-scores, kind='stable')[:2]}
+        assert set(subgraph.nodes()) == expected
+    assert set(graph_rag.extract_subgraph(G, queries[0], top_k=2).nodes()) == set(subgraphs[0].nodes())
+
+def test_node_index_follows_node_and_embedding_changes(graph_rag):
+    G = nx.Graph()
+    G.add_edge("a", "b", relation="r")
+    graph_rag.encode_nodes(G)
+    assert graph_rag.get_node_index(G)[1] is graph_rag.get_node_index(G)[1]
+
+    G.remove_node("b")
+    G.add_node("c", embedding=graph_rag.model.encode(["c"])[0])  # Same node count, different node
+    assert graph_rag.get_node_index(G)[0] == ["a", "c"]
+
+    G.nodes["a"]['embedding'] = graph_rag.model.encode(["c"])[0]
+    node_ids, matrix = graph_rag.get_node_index(G)
+    np.testing.assert_allclose(matrix[0], matrix[1], atol=1e-6)
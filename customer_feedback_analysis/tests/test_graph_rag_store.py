@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+import encoding_pool
+import instrumentation
+from graph_store import GraphStore
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def test_explicit_empty_store_is_not_replaced(graph_rag, tmp_path, monkeypatch):
+    def unexpected():
+        raise AssertionError("graphrag_batch loaded the default store")
+
+    monkeypatch.setattr(graph_rag, "get_graph_store", unexpected)
+    store = GraphStore(str(tmp_path), graph_rag.model_name)
+    assert len(store) == 0
+    response, graph_embedding = graph_rag.graphrag("Türkiye", store=store)
+    assert response.startswith("'Türkiye'")
+    assert graph_embedding.shape == (64,)
+
+def test_graphrag_answers_from_the_persisted_store(graph_rag, tmp_path):
+    store = GraphStore(str(tmp_path), graph_rag.model_name)
+    store.add(edges=graph_rag.DEMO_EDGES, encode_fn=graph_rag.model.encode)
+    response, _ = graph_rag.graphrag("İstanbul nüfus", store=store, top_k=1, hops=1)
+    assert "İstanbul" in response and "nüfus 15 milyon" in response
+    assert graph_rag.graphrag_batch(["İstanbul nüfus"], store=store, top_k=1, hops=1)[0][0] == response
+
+def test_graph_rag_shares_the_pipeline_modules(graph_rag):
+    assert graph_rag.GraphStore is GraphStore
+    assert graph_rag.stage is instrumentation.stage
+    assert graph_rag.get_shared_encoder is encoding_pool.get_shared_encoder
+
+def test_graph_rag_loads_each_module_once_from_the_repo_root():
+    probe = ("import importlib.util, sys; spec = importlib.util.spec_from_file_location('graph_rag', 'graph-rag.py'); "
+             "spec.loader.exec_module(importlib.util.module_from_spec(spec)); "
+             "print(sorted(name for name in sys.modules if name.startswith('customer_feedback_analysis')))")
+    output = subprocess.run([sys.executable, "-c", probe], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
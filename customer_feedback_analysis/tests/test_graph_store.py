@@ -0,0 +1,64 @@
+import networkx as nx
+import numpy as np
+import pytest
+from graph_store import GraphStore, load_edge_list
+from stub_encoder import HashingEncoder
+
+EDGES = [("Türkiye", "İstanbul", "şehri"), ("Türkiye", "Ankara", "başkenti"), ("İstanbul", "Boğaziçi Köprüsü", "landmark"),
+         ("İstanbul", "15 milyon", "nüfus"), ("Ankara", "5.6 milyon", "nüfus"), ("İstanbul", "Türkiye", "ülkesi")]
+
+def reference_graph(edges):
+    G = nx.Graph()
+    for source, target, relation in edges:
+        G.add_edge(source, target, relation=relation)
+    return G
+
+def test_reload_matches_networkx_and_encodes_only_new_nodes(tmp_path):
+    encoder = HashingEncoder(dim=32)
+    encoded = []
+
+    def encode(texts):
+        encoded.extend(texts)
+        return encoder.encode(texts)
+
+    store = GraphStore(str(tmp_path), "stub")
+    assert store.add(edges=EDGES[:3], encode_fn=encode) == 4
+    reloaded = GraphStore(str(tmp_path), "stub")
+    assert reloaded.add(edges=EDGES[3:], nodes=["Ankara", "İzmir"], encode_fn=encode) == 3
+    assert len(encoded) == 7 and reloaded.version == 2
+
+    reloaded = GraphStore(str(tmp_path), "stub")
+    G = reference_graph(EDGES)
+    G.add_node("İzmir")
+    S = reloaded.subgraph(np.arange(len(reloaded)))
+    assert set(S.nodes()) == set(G.nodes())
+    assert {frozenset(edge): S.edges[edge]['relation'] for edge in S.edges()} == \
+           {frozenset(edge): G.edges[edge]['relation'] for edge in G.edges()}
+    for node in G.nodes():
+        assert list(S.neighbors(node)) == list(G.neighbors(node))
+    np.testing.assert_allclose(np.asarray(reloaded.embeddings()[reloaded.node_id["Ankara"]]),
+                               encoder.encode("Ankara"), atol=1e-6)
+
+def test_failed_add_leaves_the_store_usable(tmp_path):
+    store = GraphStore(str(tmp_path), "stub")
+    store.add(edges=EDGES[:2], encode_fn=HashingEncoder(dim=32).encode)
+    with pytest.raises(ValueError):
+        store.add(nodes=["İzmir"], encode_fn=HashingEncoder(dim=16).encode)
+    with pytest.raises(ValueError):
+        store.add(nodes=["İzmir"])
+    assert "İzmir" not in store.node_id and store.version == 1
+
+    assert store.add(edges=[("Türkiye", "İzmir", "şehri")], encode_fn=HashingEncoder(dim=32).encode) == 1
+    reloaded = GraphStore(str(tmp_path), "stub")
+    assert reloaded.nodes == ["Türkiye", "İstanbul", "Ankara", "İzmir"]
+    assert reloaded.search(HashingEncoder(dim=32).encode(["İzmir"]), top_k=1).tolist() == [[3]]
+
+def test_store_rejects_another_model(tmp_path):
+    GraphStore(str(tmp_path), "stub").add(nodes=["a"], encode_fn=HashingEncoder(dim=8).encode)
+    with pytest.raises(ValueError):
+        GraphStore(str(tmp_path), "other")
+
+def test_load_edge_list_skips_header(tmp_path):
+    path = tmp_path / "edges.csv"
+    path.write_text("source,target,relation\nA,B,knows\nB,C\n", encoding='utf-8')
+    assert load_edge_list(str(path)) == [("A", "B", "knows"), ("B", "C", "")]
@@ -0,0 +1,43 @@
+import json
+import numpy as np
+import pytest
+import instrumentation
+from instrumentation import stage
+
+@pytest.fixture
+def metrics_path(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    yield path
+    instrumentation.configure()
+
+def read_records(path):
+    with open(path) as f:
+        return {record['stage']: record for record in map(json.loads, f)}
+
+def test_disabled_stages_are_shared_no_ops():
+    instrumentation.configure()
+    assert stage("a") is stage("b")
+    with stage("a") as metrics:
+        metrics.rows = 10
+    assert stage("b").rows is None
+
+def test_nested_stage_keeps_the_outer_peak(metrics_path):
+    instrumentation.configure(metrics_path=metrics_path, profile='tracemalloc')
+    with stage("outer", rows=10) as outer:
+        buffer = np.ones(4 * 2**20, dtype=np.uint8)  # 4 MiB, freed before the inner stage starts
+        del buffer
+        with stage("inner"):
+            small = np.ones(2**18, dtype=np.uint8)
+            del small
+        outer.add_bytes_read(123)
+    records = read_records(metrics_path)
+    assert records['outer']['traced_peak_mb'] >= 4
+    assert records['inner']['traced_peak_mb'] < 1
+    assert records['outer']['rows'] == 10 and records['outer']['bytes_read'] == 123
+
+def test_failed_stage_records_its_error(metrics_path):
+    instrumentation.configure(metrics_path=metrics_path)
+    with pytest.raises(ValueError):
+        with stage("broken"):
+            raise ValueError("bad input")
+    assert read_records(metrics_path)['broken']['error'] == "ValueError: bad input"
@@ -0,0 +1,51 @@
+import json
+import numpy as np
+from k_selection import pick_best_k, prune_cache, read_rows, sweep_k
+from quantized_embeddings import save_embeddings
+
+def blobs(num_rows=600, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.eye(3, 5, dtype=np.float32) * 10
+    return (centers[rng.integers(0, 3, size=num_rows)] + rng.normal(scale=0.3, size=(num_rows, 5))).astype(np.float32)
+
+def save_shards(tmp_path, embeddings, dtype="float32", num_shards=3):
+    paths = []
+    for i, shard in enumerate(np.array_split(embeddings, num_shards)):
+        paths.append(str(tmp_path / f"embeddings_{i}.npy"))
+        save_embeddings(paths[-1], shard, dtype=dtype)
+    return paths
+
+def test_read_rows_gathers_across_shards(tmp_path):
+    embeddings = blobs(100)
+    rows = np.array([0, 33, 34, 66, 67, 99])
+    np.testing.assert_array_equal(read_rows(save_shards(tmp_path, embeddings), rows), embeddings[rows])
+    quantized = read_rows(save_shards(tmp_path, embeddings, dtype="int8"), rows)
+    np.testing.assert_allclose(quantized, embeddings[rows], atol=0.1)
+
+def test_sweep_over_shards_picks_true_k_and_reuses_cache(tmp_path, capsys):
+    cache_filepath = str(tmp_path / "cache.json")
+    paths = save_shards(tmp_path, blobs())
+    results = sweep_k(paths, [2, 3, 4], n_workers=2, sample_size=300, cache_filepath=cache_filepath)
+    assert pick_best_k(results) == 3
+    assert all(set(scores) == {'silhouette', 'calinski_harabasz', 'davies_bouldin', 'inertia'}
+               for scores in results.values())
+
+    capsys.readouterr()
+    assert sweep_k(paths, [2, 3, 4], sample_size=300, cache_filepath=cache_filepath) == results
+    assert "0 candidate(s) to fit" in capsys.readouterr().out
+
+def test_rewritten_input_replaces_its_stale_cache_entry(tmp_path):
+    cache_filepath = str(tmp_path / "cache.json")
+    paths = save_shards(tmp_path, blobs(), num_shards=1)
+    sweep_k(paths, [2], n_workers=1, sample_size=200, cache_filepath=cache_filepath)
+    save_embeddings(paths[0], blobs(seed=1))
+    sweep_k(paths, [2], n_workers=1, sample_size=200, cache_filepath=cache_filepath)
+    with open(cache_filepath) as f:
+        assert len(json.load(f)) == 1
+
+def test_prune_cache_keeps_most_recent_entries():
+    key = {'filepaths': ['/a.npy'], 'embeddings': [['new', None]]}
+    cache = {json.dumps({'filepaths': ['/a.npy'], 'embeddings': [['old', None]]}): {}}
+    cache.update({json.dumps({'filepaths': [f'/{i}.npy'], 'embeddings': [[str(i), None]]}): {} for i in range(5)})
+    kept = prune_cache(cache, key, 2)
+    assert [json.loads(cache_key)['filepaths'] for cache_key in kept] == [['/3.npy'], ['/4.npy']]
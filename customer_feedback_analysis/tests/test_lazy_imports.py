@@ -0,0 +1,15 @@
+import pytest
+from benchmark_startup import TARGETS, time_import
+
+@pytest.mark.parametrize("label, cwd, statement", TARGETS, ids=[target[0] for target in TARGETS])
+def test_entry_points_do_not_import_heavy_modules(label, cwd, statement):
+    _, loaded = time_import(statement, cwd, runs=1)
+    assert loaded == []
+
+def test_model_loads_only_on_first_use(graph_rag, monkeypatch):
+    loads = []
+    monkeypatch.setattr(graph_rag, "model", None)
+    monkeypatch.setattr(graph_rag, "get_shared_encoder", lambda name: loads.append(name) or "encoder")
+    assert loads == []
+    assert graph_rag.get_model() == "encoder" and graph_rag.get_model() == "encoder"
+    assert loads == [graph_rag.model_name]
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from graph_store import GraphStore
+from k_selection import read_rows
+from quantized_embeddings import (Int8Embeddings, dequantize_int8, load_embeddings, quantize_int8, save_embeddings,
+                                  scales_path, similarity_scores)
+from stub_encoder import HashingEncoder
+
+def random_rows(num_rows=300, dim=24, seed=0):
+    return np.random.default_rng(seed).normal(size=(num_rows, dim)).astype(np.float32)
+
+def test_int8_round_trip_error_is_within_half_a_step():
+    rows = random_rows()
+    rows[3] = 0
+    codes, scales = quantize_int8(rows)
+    assert codes.dtype == np.int8 and np.abs(codes).max(axis=1)[0] == 127
+    error = np.abs(dequantize_int8(codes, scales) - rows)
+    assert np.all(error <= scales[:, None] / 2 + 1e-6)
+    assert not dequantize_int8(codes, scales)[3].any()
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 0), ("float16", 1e-2), ("int8", 3e-2)])
+def test_saved_embeddings_load_in_every_mode(tmp_path, dtype, tolerance):
+    rows = random_rows()
+    path = str(tmp_path / "embeddings.npy")
+    save_embeddings(path, rows, dtype=dtype, chunk_size=64)
+    mapped = load_embeddings(path)
+    assert mapped.shape == rows.shape
+    np.testing.assert_allclose(np.asarray(mapped[10:20], dtype=np.float32), rows[10:20], atol=tolerance)
+    loaded = load_embeddings(path, mmap_mode=None)
+    assert loaded.dtype == np.float32
+    np.testing.assert_allclose(loaded, rows, atol=tolerance)
+    assert (dtype == "int8") == isinstance(mapped, Int8Embeddings)
+
+def test_sampled_reads_never_dequantize_the_whole_file(tmp_path, monkeypatch):
+    rows = random_rows()
+    path = str(tmp_path / "embeddings.npy")
+    save_embeddings(path, rows, dtype="int8")
+
+    def whole_file(*args, **kwargs):
+        raise AssertionError("dequantized the whole file")
+
+    monkeypatch.setattr(Int8Embeddings, "__array__", whole_file)
+    sample = np.array([0, 7, 150, 299])
+    np.testing.assert_allclose(read_rows([path], sample), rows[sample], atol=3e-2)
+
+def test_chunked_similarity_matches_dense(tmp_path):
+    rows = random_rows()
+    queries = random_rows(5, seed=1)
+    codes, scales = quantize_int8(rows)
+    for embeddings in (rows.astype(np.float16), Int8Embeddings(codes, scales)):
+        np.testing.assert_allclose(similarity_scores(queries, embeddings, chunk_size=37),
+                                   queries @ np.asarray(embeddings, dtype=np.float32).T, rtol=1e-5, atol=1e-4)
+
+def test_switching_back_to_float_removes_stale_scales(tmp_path):
+    path = str(tmp_path / "embeddings.npy")
+    save_embeddings(path, random_rows(), dtype="int8")
+    save_embeddings(path, random_rows(), dtype="float16")
+    assert not (tmp_path / "embeddings.scales.npy").exists() and scales_path(path).endswith("embeddings.scales.npy")
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_graph_store_keeps_its_embedding_dtype(tmp_path, dtype):
+    encoder = HashingEncoder(dim=32)
+    nodes = [f"node {i}" for i in range(40)]
+    store = GraphStore(str(tmp_path), "stub", embedding_dtype=dtype)
+    store.add(nodes=nodes[:20], encode_fn=encoder.encode)
+    reloaded = GraphStore(str(tmp_path), "stub")
+    assert reloaded.embedding_dtype == dtype
+    reloaded.add(nodes=nodes[20:], encode_fn=encoder.encode)
+    assert reloaded.search(encoder.encode(nodes[25:30]), top_k=1)[:, 0].tolist() == list(range(25, 30))
+    with pytest.raises(ValueError):
+        GraphStore(str(tmp_path), "stub", embedding_dtype="float32")
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_ivf_index_over_a_quantized_store_keeps_its_dtype(graph_rag, tmp_path, dtype):
+    rows = random_rows()
+    store = GraphStore(str(tmp_path), "m", embedding_dtype=dtype)
+    store.add(nodes=[f"node {i}" for i in range(len(rows))], encode_fn=lambda texts: rows)
+    index = graph_rag.load_graph_index(store, "ivf", nlist=6, nprobe=6)
+    vectors_path = tmp_path / f"index-ivf-v{store.version}" / "vectors.npy"
+    assert np.load(vectors_path, mmap_mode='r').dtype == np.dtype(dtype)
+    assert (dtype == "int8") == (tmp_path / f"index-ivf-v{store.version}" / "vectors.scales.npy").exists()
+    queries = random_rows(10, seed=1)
+    exact = store.search(queries, top_k=5)
+    for searched in (index, graph_rag.load_graph_index(store, "ivf", nprobe=6)):
+        ids, _ = searched.search(queries, top_k=5)
+        assert np.mean([len(set(a) & set(b)) / 5 for a, b in zip(ids.tolist(), exact.tolist())]) >= 0.9
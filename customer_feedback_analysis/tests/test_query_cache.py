@@ -0,0 +1,58 @@
+import numpy as np
+from query_cache import GraphRAGCache, LRUCache, normalize_query
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()['evictions'] == 1
+
+def test_lru_byte_budget_and_ttl():
+    clock = FakeClock()
+    cache = LRUCache(max_entries=100, max_bytes=3000, ttl_seconds=10, clock=clock)
+    cache.put("x", np.zeros(250, dtype=np.float32))
+    cache.put("y", np.zeros(250, dtype=np.float32))
+    cache.put("z", np.zeros(250, dtype=np.float32))
+    assert len(cache) == 2 and cache.bytes <= 3000 and cache.get("x") is None
+    clock.now = 10.5
+    assert cache.get("y") is None
+    assert cache.stats()['expirations'] == 1
+
+def test_query_embeddings_encode_each_distinct_miss_once():
+    cache = GraphRAGCache()
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+    first = cache.query_embeddings("m", ["a  b", "a b", "cde"], encode)
+    second = cache.query_embeddings("m", ["cde", "f"], encode)
+    assert calls == [["a b", "cde"], ["f"]]
+    np.testing.assert_array_equal(first[:, 0], [3, 3, 3])
+    np.testing.assert_array_equal(second[:, 0], [3, 1])
+    cache.query_embedding("m", "f", encode)[:] = 0  # Callers get copies, never the cached rows
+    np.testing.assert_array_equal(cache.query_embedding("m", "f", encode), [1, 1])
+    assert normalize_query(" caf\u0065\u0301\t latte ") == "caf\u00e9 latte"
+
+def test_new_graph_version_drops_responses():
+    cache = GraphRAGCache()
+    params = (5, 1)
+    cache.get_response(("g", 1), "q", params)
+    cache.put_response(("g", 1), "q", params, "answer")
+    assert cache.get_response(("g", 1), " q ", params) == "answer"
+    assert cache.get_response(("g", 1), "q", (5, 2)) is None
+    assert cache.get_response(("g", 2), "q", params) is None
+    cache.put_response(("g", 1), "q", params, "stale")  # Computed before the graph changed
+    assert cache.get_response(("g", 2), "q", params) is None
+    assert cache.stats()['responses']['invalidations'] == 1
@@ -0,0 +1,31 @@
+import numpy as np
+from feedback_store import save_columnar
+from report_clusters import StreamingThemeReport, report_columnar
+
+def test_chunked_updates_match_one_pass():
+    rng = np.random.default_rng(0)
+    codes = rng.integers(0, 3, size=1000)
+    priorities = rng.random(1000)
+    whole = StreamingThemeReport(["a", "b", "c"], samples_per_theme=4)
+    whole.update(0, codes, priorities)
+    chunked = StreamingThemeReport(["a", "b", "c"], samples_per_theme=4)
+    for start in range(0, 1000, 77):
+        chunked.update(start, codes[start:start + 77], priorities[start:start + 77])
+    assert chunked.summary(str) == whole.summary(str)
+
+def test_summary_counts_shares_and_nearest_samples():
+    report = StreamingThemeReport(["z", "a", "unused"], samples_per_theme=2)
+    report.update(0, [0, 1, 0, 0], [0.5, 0.9, 0.1, 0.3])
+    summary = report.summary(lambda row: f"row{row}")
+    assert summary['sample_strategy'] == "nearest_to_centroid"
+    assert [(theme['theme'], theme['count']) for theme in summary['themes']] == [("a", 1), ("z", 3)]
+    assert summary['themes'][1]['share'] == 0.75
+    assert summary['themes'][1]['samples'] == ["row2", "row3"]
+
+def test_report_columnar_streams_the_store(tmp_path):
+    texts = [f"text {i}" for i in range(10)]
+    save_columnar(str(tmp_path), texts, [i % 2 for i in range(10)], [i % 2 for i in range(10)], ["A", "B"],
+                  centroid_distance=np.arange(10) / 10)
+    summary = report_columnar(str(tmp_path), samples_per_theme=2, chunk_size=3)
+    assert summary['total_rows'] == 10
+    assert [theme['samples'] for theme in summary['themes']] == [["text 0", "text 2"], ["text 1", "text 3"]]
@@ -0,0 +1,68 @@
+import importlib
+import os
+import sys
+import numpy as np
+import run_pipeline
+from run_pipeline import Pipeline, Stage, build_pipeline, code_fingerprint
+from theme_labeling import THEME_SEEDS
+
+calls = []
+stage_helpers = None  # Set to a temporary local module by the fingerprint test
+
+def count_stage(ctx, scale=1):
+    calls.append(scale)
+    return {'lengths': np.array([len(text) * scale for text in ctx['feedback']])}
+
+def count_stage_v2(ctx, scale=1):
+    calls.append(scale)
+    return {'lengths': np.array([len(text) * scale + 1 for text in ctx['feedback']])}
+
+def total_stage(ctx):
+    return {'total': np.array(ctx['count']['lengths'].sum())}
+
+def helper_stage(ctx):
+    return {'value': np.array(stage_helpers.value())}
+
+def make_pipeline(cache_dir, run=count_stage, scale=1, max_cached_runs=3):
+    return Pipeline([Stage('count', run, ['feedback'], scale=scale), Stage('total', total_stage, ['count'])],
+                    cache_dir=cache_dir, max_cached_runs=max_cached_runs)
+
+def test_unchanged_stages_are_reused_across_runs(tmp_path):
+    calls.clear()
+    texts = ["ab", "cde"]
+    assert int(make_pipeline(str(tmp_path)).run(texts)['total']['total']) == 5
+    assert int(make_pipeline(str(tmp_path)).run(texts)['total']['total']) == 5
+    assert calls == [1]
+    make_pipeline(str(tmp_path), scale=2).run(texts)
+    make_pipeline(str(tmp_path)).run(texts + ["f"])
+    assert calls == [1, 2, 1]
+
+def test_changed_stage_code_invalidates_its_cache(tmp_path):
+    calls.clear()
+    make_pipeline(str(tmp_path)).run(["ab"])
+    assert int(make_pipeline(str(tmp_path), run=count_stage_v2).run(["ab"])['total']['total']) == 3
+    assert calls == [1, 1]
+
+def test_theme_seeds_are_part_of_the_analyze_fingerprint():
+    analyze = build_pipeline(cache_dir=None).stages['analyze']
+    assert analyze.params['theme_seeds'] == THEME_SEEDS
+
+def test_only_recent_stage_outputs_stay_on_disk(tmp_path):
+    for scale in range(1, 5):
+        make_pipeline(str(tmp_path), scale=scale, max_cached_runs=2).run(["ab"])
+    assert sorted(entry.split('-')[0] for entry in os.listdir(tmp_path)) == ['count', 'count', 'total', 'total']
+    calls.clear()
+    make_pipeline(str(tmp_path), scale=4, max_cached_runs=2).run(["ab"])
+    assert calls == []
+
+def test_editing_a_used_local_module_changes_the_fingerprint(tmp_path, monkeypatch):
+    (tmp_path / "stage_helpers.py").write_text("def value():\n    return 1\n")
+    monkeypatch.setattr(run_pipeline, "LOCAL_DIR", str(tmp_path))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    helpers = importlib.import_module("stage_helpers")
+    monkeypatch.setitem(sys.modules, "stage_helpers", helpers)  # Dropped again on teardown
+    monkeypatch.setitem(globals(), "stage_helpers", helpers)
+    before = code_fingerprint(helper_stage)
+    assert code_fingerprint(helper_stage) == before
+    (tmp_path / "stage_helpers.py").write_text("def value():\n    return 2\n")
+    assert code_fingerprint(helper_stage) != before
@@ -0,0 +1,55 @@
+import numpy as np
+from embedding_cache import EmbeddingCache
+from theme_labeling import (UNASSIGNED_THEME, centroid_distances, cluster_centroids, encode_theme_column,
+                            label_clusters, match_themes, theme_prototypes)
+
+def test_prototypes_are_unit_means_encoded_once(tmp_path):
+    seeds = {"a": ["x", "y"], "b": ["z"]}
+    vectors = {"x": [2.0, 0.0], "y": [0.0, 2.0], "z": [0.0, -3.0]}
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([vectors[text] for text in texts], dtype=np.float32)
+
+    for _ in range(2):
+        names, prototypes = theme_prototypes(seeds, EmbeddingCache(str(tmp_path), "fake"), encode)
+    assert names == ["a", "b"]
+    np.testing.assert_allclose(prototypes, [[np.sqrt(0.5), np.sqrt(0.5)], [0.0, -1.0]], atol=1e-6)
+    assert calls == [["x", "y", "z"]]
+
+def test_match_themes_applies_threshold_per_chunk():
+    prototypes = np.eye(2, dtype=np.float32)
+    vectors = np.array([[3, 0.1], [0.2, 5], [1, 1], [-1, 0]], dtype=np.float32)
+    indices, confidences = match_themes(vectors, prototypes, threshold=0.8, chunk_size=3)
+    np.testing.assert_array_equal(indices, [0, 1, -1, -1])
+    np.testing.assert_allclose(confidences[2], np.sqrt(0.5), atol=1e-6)
+
+def test_label_clusters_marks_weak_matches_unassigned():
+    theme_map, confidences = label_clusters(np.array([[1, 0], [1, 1]], dtype=np.float32), ["a", "b"],
+                                            np.eye(2, dtype=np.float32), threshold=0.9)
+    assert theme_map == {0: "a", 1: UNASSIGNED_THEME}
+    assert confidences[0] > 0.99
+
+def test_centroids_and_distances_match_direct_computation():
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(50, 4)).astype(np.float32)
+    labels = rng.integers(0, 3, size=50)
+    weights = rng.integers(1, 5, size=50)
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    expected = np.stack([np.average(unit[labels == c], axis=0, weights=weights[labels == c]) for c in range(3)])
+    centroids = cluster_centroids(embeddings, labels, sample_weight=weights, chunk_size=7)
+    np.testing.assert_allclose(centroids, expected, rtol=1e-5, atol=1e-5)
+    unit_centroids = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+    np.testing.assert_allclose(centroid_distances(embeddings, labels, centroids, chunk_size=7),
+                               1 - (unit * unit_centroids[labels]).sum(axis=1), atol=1e-5)
+
+def test_unweighted_centroids_are_means_of_unit_rows():
+    embeddings = np.array([[2, 0], [0, 3], [0, -1], [5, 0]], dtype=np.float32)
+    centroids = cluster_centroids(embeddings, np.array([0, 0, 1, 1]))
+    np.testing.assert_allclose(centroids, [[0.5, 0.5], [0.5, -0.5]], atol=1e-6)
+
+def test_encode_theme_column_uses_default_for_unmapped_clusters():
+    names, codes = encode_theme_column(np.array([0, 2, 1, 2]), {0: "b", 2: "a"})
+    assert names == ["Unknown Theme", "a", "b"]
+    assert [names[code] for code in codes] == ["b", "a", "Unknown Theme", "a"]
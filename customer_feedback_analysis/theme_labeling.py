@@ -0,0 +1,102 @@
+import numpy as np
+from embedding_cache import encode_with_cache
+from graph_store import normalize_rows
+
+UNASSIGNED_THEME = "Unassigned"
+
+# A short description plus a few seed examples per theme. Each theme's prototype is the
+# normalized mean of these embeddings, which is more robust than the bare theme name.
+THEME_SEEDS = {
+    "Positive Product Usability": [
+        "Praise for how easy, intuitive and well designed the product is to use.",
+        "The interface is simple and a pleasure to work with.",
+        "Everything just works and navigation is effortless.",
+    ],
+    "Customer Support Complaints": [
+        "Complaints about slow customer support and long waiting times.",
+        "Nobody answered my support request for days.",
+        "The hold times on the support line are far too long.",
+    ],
+    "Pricing Plan Questions": [
+        "Questions about pricing, plans, subscriptions, discounts and billing.",
+        "How much does the premium tier cost per month?",
+        "Which payment options and discounts are available?",
+    ],
+    "New Feature Suggestions": [
+        "Requests and suggestions for new features, integrations or apps.",
+        "Please add an option to export my data.",
+        "It would be great to have a mobile app and more integrations.",
+    ],
+}
+
+def theme_prototypes(theme_seeds, cache, encode_fn):
+    """
+    Returns (theme_names, prototypes) where prototypes is a (n_themes, dim) matrix of unit vectors.
+    Seed texts go through the embedding cache, so they are only encoded on the first run.
+    """
+    theme_names = list(theme_seeds)
+    seed_texts = [text for name in theme_names for text in theme_seeds[name]]
+    seed_embeddings = normalize_rows(encode_with_cache(seed_texts, cache, encode_fn))
+    seed_theme = np.repeat(np.arange(len(theme_names)), [len(theme_seeds[name]) for name in theme_names])
+    prototypes = np.zeros((len(theme_names), seed_embeddings.shape[1]), dtype=np.float32)
+    np.add.at(prototypes, seed_theme, seed_embeddings)
+    return theme_names, normalize_rows(prototypes)
+
+def match_themes(vectors, prototypes, threshold, chunk_size=65536):
+    """
+    Matches each row of vectors to its most similar prototype by cosine similarity, one
+    matrix product per chunk. Rows whose best similarity is below threshold get -1.
+    Returns (theme_indices, confidences).
+    """
+    theme_indices = np.empty(len(vectors), dtype=np.int64)
+    confidences = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), chunk_size):
+        similarities = normalize_rows(vectors[start:start + chunk_size]) @ prototypes.T
+        best = similarities.argmax(axis=1)
+        best_similarity = similarities[np.arange(len(best)), best]
+        theme_indices[start:start + len(best)] = np.where(best_similarity >= threshold, best, -1)
+        confidences[start:start + len(best)] = best_similarity
+    return theme_indices, confidences
+
+def cluster_centroids(embeddings, labels, sample_weight=None, chunk_size=65536):
+    """
+    Weighted mean of the unit-normalized embeddings in each cluster, accumulated chunk by chunk.
+    sample_weight is the dedup multiplicity of each row, as passed to ClusterModel.from_fit.
+    """
+    n_clusters = int(labels.max()) + 1
+    sums = np.zeros((n_clusters, embeddings.shape[1]), dtype=np.float64)
+    weights = np.ones(len(embeddings)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+    for start in range(0, len(embeddings), chunk_size):
+        chunk = normalize_rows(embeddings[start:start + chunk_size]) * weights[start:start + chunk_size, np.newaxis]
+        np.add.at(sums, labels[start:start + chunk_size], chunk)
+    totals = np.bincount(labels, weights=weights, minlength=n_clusters)[:, np.newaxis]
+    return (sums / np.where(totals > 0, totals, 1)).astype(np.float32)
+
+def centroid_distances(embeddings, labels, centroids, chunk_size=65536):
+    """Cosine distance of every row to the centroid of its own cluster, computed chunk by chunk."""
+    unit_centroids = normalize_rows(centroids)
+    distances = np.empty(len(embeddings), dtype=np.float32)
+    for start in range(0, len(embeddings), chunk_size):
+        chunk = normalize_rows(embeddings[start:start + chunk_size])
+        own_centroids = unit_centroids[labels[start:start + chunk_size]]
+        distances[start:start + len(chunk)] = 1.0 - np.einsum('ij,ij->i', chunk, own_centroids)
+    return distances
+
+def label_clusters(centroids, theme_names, prototypes, threshold):
+    """Returns ({cluster_id: theme}, {cluster_id: confidence}), using UNASSIGNED_THEME below threshold."""
+    theme_indices, confidences = match_themes(centroids, prototypes, threshold)
+    theme_map = {cid: theme_names[t] if t >= 0 else UNASSIGNED_THEME for cid, t in enumerate(theme_indices.tolist())}
+    return theme_map, dict(enumerate(confidences.tolist()))
+
+def encode_theme_column(cluster_labels, cluster_to_theme_map, default_theme="Unknown Theme"):
+    """
+    Dictionary-encodes the per-row theme of cluster_labels under cluster_to_theme_map.
+    Returns (theme_names, theme_codes); clusters missing from the map get default_theme.
+    """
+    theme_names = sorted(set(cluster_to_theme_map.values()) | {default_theme})
+    code_of_theme = {name: code for code, name in enumerate(theme_names)}
+    code_of_cluster = np.full(int(cluster_labels.max()) + 1 if len(cluster_labels) else 0, code_of_theme[default_theme])
+    for cid, theme in cluster_to_theme_map.items():
+        if 0 <= cid < len(code_of_cluster):
+            code_of_cluster[cid] = code_of_theme[theme]
+    return theme_names, code_of_cluster[cluster_labels]
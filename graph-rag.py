@@ -1,35 +1,93 @@
-import networkx as nx
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import os
+import shutil
+import sys
 import numpy as np
 
+# customer_feedback_analysis modülleri birbirini üst düzey modül olarak içe aktarır; burada da aynı adlarla
+# yüklenmeleri gerekir, yoksa ikinci bir kopya oluşur ve paylaşılan kodlayıcılar ile ölçüm ayarları ayrışır.
+FEEDBACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "customer_feedback_analysis")
+if FEEDBACK_DIR not in sys.path:
+    sys.path.insert(0, FEEDBACK_DIR)
+
+from ann_index import build_index, load_index
+from encoding_pool import ParallelEncoder, get_shared_encoder
+from graph_store import GraphStore, load_edge_list, normalize_rows, top_k_indices
+from instrumentation import stage
+from query_cache import GraphRAGCache
+
 # 2. Metin Kodlayıcı
-model = SentenceTransformer('all-MiniLM-L6-v2')
+model_name = 'all-MiniLM-L6-v2'
+model = None  # İlk kullanımda yüklenir; kütüphane olarak içe aktarmak modeli yüklemez
+
+def get_model():
+    """Süreç genelinde paylaşılan kodlayıcı; model yalnızca ilk gerçek kodlamada yüklenir."""
+    global model
+    if model is None:
+        model = get_shared_encoder(model_name)
+    return model
 
 # 3. Düğüm Kodlama
-def encode_nodes(G, model):
+def encode_nodes(G, model=None, num_workers=0, chunk_size=256):
     node_texts = [str(node) for node in G.nodes()]
-    embeddings = model.encode(node_texts)
+    if num_workers > 1:
+        # Büyük graflar için düğüm metinlerini CPU süreç havuzunda paralel kodla
+        with ParallelEncoder(model_name, num_workers=num_workers, chunk_size=chunk_size) as encoder:
+            embeddings = encoder.encode(node_texts)
+    else:
+        embeddings = (model if model is not None else get_model()).encode(node_texts)
     for node, embedding in zip(G.nodes(), embeddings):
         G.nodes[node]['embedding'] = embedding
+    build_node_index(G)
     return G
 
 # 4. Alt Graf Çıkarma
-def extract_subgraph(G, query, top_k=5):  # top_k değerini artırdık
-    query_embedding = model.encode(query)
-    similarities = {
-        node: cosine_similarity([query_embedding], [G.nodes[node]['embedding']])[0][0]
-        for node in G.nodes() if 'embedding' in G.nodes[node]
-    }
-    
-    relevant_nodes = sorted(similarities, key=similarities.get, reverse=True)[:top_k]
-    subgraph = G.subgraph(relevant_nodes)
-    return subgraph
+def build_node_index(G):
+    """Kodlanmış düğümleri bitişik, normalize edilmiş float32 bir matris ve düğüm listesi olarak G.graph'ta saklar."""
+    node_ids = [node for node in G.nodes() if 'embedding' in G.nodes[node]]
+    if node_ids:
+        matrix = normalize_rows(np.asarray([G.nodes[node]['embedding'] for node in node_ids], dtype=np.float32))
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    G.graph['node_index'] = (node_ids, matrix, node_index_key(G))
+    return node_ids, matrix
+
+def node_index_key(G):
+    """Düğümler ve gömme nesneleri; düğüm eklenir, silinir, yeniden adlandırılır ya da gömmesi değişirse anahtar değişir."""
+    return [(node, G.nodes[node].get('embedding')) for node in G.nodes()]
+
+def get_node_index(G):
+    cached = G.graph.get('node_index')
+    if cached is not None:
+        key = node_index_key(G)
+        # Gömmeler kimlikleriyle karşılaştırılır; anahtar onlara referans tuttuğu için kimlikler yeniden kullanılamaz
+        if len(key) == len(cached[2]) and all(node == old_node and embedding is old_embedding
+                                              for (node, embedding), (old_node, old_embedding) in zip(key, cached[2])):
+            return cached[0], cached[1]
+    return build_node_index(G)
+
+def extract_subgraphs(G, queries, top_k=5, index=None):
+    """
+    Birden çok sorguyu tek bir matris çarpımıyla yanıtlar ve her sorgu için bir alt graf döndürür.
+    index verilirse (build_index(kind, get_node_index(G)[1]) ile kurulmuş) aday düğümler ondan gelir.
+    """
+    node_ids, matrix = get_node_index(G)
+    if not node_ids:
+        return [G.subgraph([]) for _ in queries]
+    query_embeddings = np.asarray(get_model().encode(list(queries)), dtype=np.float32).reshape(len(queries), -1)
+    if index is not None:
+        rows, _ = index.search(query_embeddings, top_k)
+    else:
+        rows = top_k_indices(normalize_rows(query_embeddings) @ matrix.T, top_k)
+    return [G.subgraph([node_ids[i] for i in row if i >= 0]) for row in rows]
+
+def extract_subgraph(G, query, top_k=5, index=None):  # top_k değerini artırdık
+    return extract_subgraphs(G, [query], top_k=top_k, index=index)[0]
 
 # 5. Graf Kodlama
 def encode_graph(G):
     embeddings = np.array([G.nodes[node]['embedding'] for node in G.nodes() if 'embedding' in G.nodes[node]])
-    return np.mean(embeddings, axis=0) if embeddings.size else np.zeros(model.get_sentence_embedding_dimension())
+    return np.mean(embeddings, axis=0) if embeddings.size else np.zeros(get_model().get_sentence_embedding_dimension())
 
 # 6. Yanıt Üretimi
 def generate_response(subgraph, query):
@@ -41,48 +99,244 @@ def generate_response(subgraph, query):
             response += f"  - {edge_data['relation']} {neighbor}\n"
     return response
 
+# 7. Kalıcı Graf Deposu
+DEMO_EDGES = [
+    ("Türkiye", "İstanbul", "şehri"),
+    ("Türkiye", "Ankara", "başkenti"),
+    ("İstanbul", "Boğaziçi Köprüsü", "landmark"),
+    ("İstanbul", "15 milyon", "nüfus"),
+    ("Ankara", "5.6 milyon", "nüfus"),
+]
+graph_store_dir = "graph_store"
+graph_embedding_dtype = "float32"  # "float16" ya da "int8": düğüm gömmeleri diskte yarı/çeyrek boyutta tutulur
+index_kind = "exact"  # "exact" kaba kuvvet; büyük graflar için "ivf" ya da "hnsw" (pip install hnswlib)
+index_params = {}  # Örn. {"nprobe": 16} (ivf) veya {"ef_search": 128} (hnsw): isabet/gecikme dengesi
+expansion_hops = 1  # Bulunan düğümlerin komşuları da alınır (ör. bir şehrin nüfus kenarları); 0 kapatır
+max_fanout = 10  # Her adımda düğüm başına en fazla bu kadar komşu, sorguya en benzer olanlar
+max_subgraph_nodes = 50
+min_neighbor_score = None  # Sorguya benzerliği bunun altındaki komşular budanır
+use_query_cache = True  # Tekrarlanan sorgular için gömme ve yanıt önbelleği
+query_cache = GraphRAGCache(max_embeddings=10000, max_responses=1000, ttl_seconds=3600)
+_store = None
+_index = None
+
+def load_graph_store(store_dir=graph_store_dir, edges_filepath=None):
+    """
+    Graf deposunu diskten yükler; depo boşsa kenar listesinden (CSV/TSV) ya da örnek kenarlardan
+    bir kez oluşturup kaydeder. Sonraki çalıştırmalarda düğümler yeniden kodlanmaz.
+    """
+    store = GraphStore(store_dir, model_name, embedding_dtype=graph_embedding_dtype)
+    if len(store) == 0:
+        edges = load_edge_list(edges_filepath) if edges_filepath else DEMO_EDGES
+        store.add(edges=edges, encode_fn=get_model().encode)
+    return store
+
+def get_graph_store():
+    global _store
+    if _store is None:
+        _store = load_graph_store()
+    return _store
+
+def load_graph_index(store, kind=index_kind, **params):
+    """
+    Depo için ANN indeksini diskten yükler ya da kurup kaydeder. İndeks deponun sürümüne bağlıdır;
+    düğüm eklenince eskisi silinir ve yenisi kurulur.
+    """
+    index_dir = os.path.join(store.store_dir, f"index-{kind}-v{store.version}")
+    if os.path.exists(os.path.join(index_dir, "index.json")):
+        return load_index(index_dir, **params)
+    for name in os.listdir(store.store_dir):
+        if name.startswith(f"index-{kind}-v"):
+            shutil.rmtree(os.path.join(store.store_dir, name), ignore_errors=True)
+    if kind == "ivf":
+        params.setdefault("dtype", store.embedding_dtype)  # İndeks kopyası da deponun float16/int8 biçiminde tutulur
+    return build_index(kind, store.embeddings(), index_dir=index_dir, **params)  # IVF vektörleri parça parça diske yazılır
+
+def get_graph_index(store):
+    global _index
+    if index_kind == "exact":
+        return None  # GraphStore.search zaten kesin arama yapar
+    if _index is None or _index[0] is not store or _index[1] != store.version:
+        _index = (store, store.version, load_graph_index(store, index_kind, **index_params))
+    return _index[2]
+
+def encode_queries(queries):
+    """Sorguları tek bir model.encode çağrısıyla kodlar; önbellekte olanlar yeniden kodlanmaz."""
+    if use_query_cache:
+        return query_cache.query_embeddings(model_name, queries, lambda texts: get_model().encode(texts))
+    return np.asarray(get_model().encode(list(queries)), dtype=np.float32).reshape(len(queries), -1)
+
+def extract_subgraphs_from_store(store, queries, top_k=5, index=None, hops=0, fanout=None, max_nodes=None,
+                                 min_score=None):
+    """
+    En benzer top_k düğümü bulur; hops > 0 ise onları CSR komşuluğu üzerinden hops adım genişletir,
+    böylece yanıt, bulunan düğümlere bağlı bilgileri (komşular puanlarına göre budanarak) de içerir.
+    Birden çok sorgu tek kodlama çağrısı ve tek matris çarpımıyla aranır. Verilmeyen fanout, max_nodes
+    ve min_score çağrı anında max_fanout, max_subgraph_nodes ve min_neighbor_score ayarlarından okunur.
+    """
+    fanout = max_fanout if fanout is None else fanout
+    max_nodes = max_subgraph_nodes if max_nodes is None else max_nodes
+    min_score = min_neighbor_score if min_score is None else min_score
+    query_embeddings = encode_queries(queries)  # Sorgu başına kodlanan tek metin sorgunun kendisi
+    if index is not None:
+        rows = index.search(query_embeddings, top_k)[0]
+    else:
+        rows = store.search(query_embeddings, top_k=top_k)
+    subgraphs = []
+    for node_ids, query_embedding in zip(rows, query_embeddings):
+        node_ids = node_ids[node_ids >= 0]
+        if hops > 0:
+            node_ids = store.expand(node_ids, query_embedding, hops=hops, max_fanout=fanout, max_nodes=max_nodes,
+                                    min_score=min_score)
+        subgraphs.append(store.subgraph(node_ids))
+    return subgraphs
+
+def extract_subgraph_from_store(store, query, top_k=5, index=None, hops=0, fanout=None, max_nodes=None,
+                                min_score=None):
+    return extract_subgraphs_from_store(store, [query], top_k=top_k, index=index, hops=hops, fanout=fanout,
+                                        max_nodes=max_nodes, min_score=min_score)[0]
+
 # GraphRAG ana fonksiyonu
-def graphrag(query):
-    # 1. Graf Oluşturma
+def graphrag_batch(queries, store=None, top_k=5, hops=None):
+    """Birden çok sorguyu birlikte yanıtlar; her sorgu için (yanıt, graf gömmesi) döndürür."""
+    # 1. Graf bir kez oluşturulup diskte saklanır; her sorguda yeniden kurulmaz
+    if store is None:  # GraphStore.__len__ yüzünden boş bir depo yanlışlıkla "store or ..." ile değiştirilirdi
+        store = get_graph_store()
+    hops = expansion_hops if hops is None else hops
+    # Graf sürümü değişince (düğüm/kenar eklenince) önbellekteki yanıtlar geçersiz olur
+    graph_version = (os.path.abspath(store.store_dir), store.version)
+    params = (top_k, hops, max_fanout, max_subgraph_nodes, min_neighbor_score, index_kind,
+              tuple(sorted(index_params.items())))
+    results = [None] * len(queries)
+    if use_query_cache:
+        for position, query in enumerate(queries):
+            cached = query_cache.get_response(graph_version, query, params)
+            if cached is not None:
+                cached_query, subgraph, graph_embedding, response = cached
+                if cached_query != query:
+                    response = generate_response(subgraph, query)  # Yanıt metni sorgunun kendisini içerir
+                results[position] = (response, graph_embedding)
+    missing = [position for position, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+    index = get_graph_index(store)
+
+    # FEEDBACK_METRICS ayarlıysa her adımın süresi ve bellek kullanımı kaydedilir
+    with stage("extract_subgraph", rows=len(missing)):
+        subgraphs = extract_subgraphs_from_store(store, [queries[position] for position in missing], top_k=top_k,
+                                                 index=index, hops=hops)
+    with stage("generate_response", rows=len(missing)):
+        for position, subgraph in zip(missing, subgraphs):
+            query = queries[position]
+            graph_embedding = encode_graph(subgraph)
+            response = generate_response(subgraph, query)
+            if use_query_cache:
+                graph_embedding.flags.writeable = False  # Önbellekteki sonuç çağıranlar arasında paylaşılır
+                query_cache.put_response(graph_version, query, params, (query, subgraph, graph_embedding, response))
+            results[position] = (response, graph_embedding)
+    return results
+
+def graphrag(query, store=None, top_k=5, hops=None):
+    return graphrag_batch([query], store=store, top_k=top_k, hops=hops)[0]
+
+# 8. Toplu Sorgu Sunucusu
+serve_max_batch_size = 32  # Tek model.encode çağrısında kodlanacak en fazla sorgu
+serve_max_wait_ms = 10  # İlk sorgu, toplu işe başka sorgular katılsın diye en fazla bu kadar bekler
+serve_p99_target_ms = 250  # Bekleme süresi, gecikmenin p99'u bu sınırı aşmayacak şekilde kısaltılır
+serve_max_top_k = 100  # Daha büyük top_k isteyen sorgular 400 ile reddedilir; arama dizileri top_k ile büyür
+
+def handle_query_batch(requests):
+    """
+    Sunucunun işçi iş parçacığında çalışır: {"query", "top_k", "hops", "embedding"} isteklerini
+    aynı parametreli gruplar halinde graphrag_batch ile yanıtlar. Hatalı bir istek toplu işin
+    geri kalanını düşürmez: onun sonucu, yalnızca o isteği başarısız kılan bir istisna olur.
+    Grup ValueError ile düşerse (isteğin verisinden kaynaklanabilir) sorgular tek tek denenir; kodlayıcı
+    ya da depo hatası gibi diğer hatalar sistemiktir, yeniden denenmez ve gruptaki her isteğe döner.
+    """
+    groups = {}
+    results = [None] * len(requests)
+    for position, request in enumerate(requests):
+        try:
+            request = validate_query_request(request)
+            groups.setdefault((request.get("top_k", 5), request.get("hops")), []).append(position)
+        except ValueError as e:
+            results[position] = e
+    for (top_k, hops), positions in groups.items():
+        try:
+            answers = graphrag_batch([requests[position]["query"] for position in positions], top_k=top_k, hops=hops)
+        except Exception as e:
+            answers = [e] * len(positions)
+            if isinstance(e, ValueError) and len(positions) > 1:
+                # Grup başarısız olduysa sorguları tek tek dene, yalnızca sorunlu olanlar hata alsın
+                answers = []
+                for position in positions:
+                    try:
+                        answers.append(graphrag_batch([requests[position]["query"]], top_k=top_k, hops=hops)[0])
+                    except Exception as error:
+                        answers.append(error)
+        for position, answer in zip(positions, answers):
+            if isinstance(answer, Exception):
+                results[position] = answer
+                continue
+            response, graph_embedding = answer
+            results[position] = {"response": response}
+            if requests[position].get("embedding"):
+                results[position]["embedding"] = graph_embedding.tolist()
+    return results
+
+def validate_query_request(request):
+    if not isinstance(request, dict) or not isinstance(request.get("query"), str):
+        raise ValueError('Beklenen gövde: {"query": "...", "top_k": 5}')
+    hops = request.get("hops")  # None ise expansion_hops kullanılır
+    for name, value in (("top_k", request.get("top_k", 5)), ("hops", 0 if hops is None else hops)):
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f'"{name}" negatif olmayan bir tamsayı olmalı, {value!r} verildi')
+    if request.get("top_k", 5) > serve_max_top_k:
+        raise ValueError(f'"top_k" en fazla {serve_max_top_k} olabilir, {request["top_k"]} verildi')
+    return request
+
+def serve(host="127.0.0.1", port=8080):
+    """POST / ile gelen sorguları mikro toplu işler halinde yanıtlayan HTTP sunucusunu çalıştırır."""
+    from batch_server import MicroBatcher, run_http_server
+    get_graph_store()  # Graf ve model ilk istekten önce hazır olsun
+    get_model()
+    batcher = MicroBatcher(handle_query_batch, max_batch_size=serve_max_batch_size, max_wait_ms=serve_max_wait_ms,
+                           p99_target_ms=serve_p99_target_ms)
+    run_http_server(batcher, host, port, validate=validate_query_request)
+
+if __name__ == "__main__":
+    if os.environ.get("GRAPHRAG_SERVE"):  # Örn. GRAPHRAG_SERVE=127.0.0.1:8080 python graph-rag.py
+        host, _, port = os.environ["GRAPHRAG_SERVE"].rpartition(":")
+        serve(host or "127.0.0.1", int(port))
+        raise SystemExit
+    # Örnek kullanım
+    query = "İstanbul ve Ankara"
+    result, embedding = graphrag(query)
+    print(result)
+    print(f"\nSorgu embedding boyutu: {len(embedding)}")
+    graphrag(query)  # Aynı sorgu ikinci kez önbellekten yanıtlanır
+    print(f"Önbellek istatistikleri: {query_cache.stats()}")
+
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
+    # Create an empty graph
     G = nx.Graph()
-    G.add_edge("Türkiye", "İstanbul", relation="şehri")
-    G.add_edge("Türkiye", "Ankara", relation="başkenti")
-    G.add_edge("İstanbul", "Boğaziçi Köprüsü", relation="landmark")
-    G.add_edge("İstanbul", "15 milyon", relation="nüfus")
-    G.add_edge("Ankara", "5.6 milyon", relation="nüfus")
-
-    G = encode_nodes(G, model)  # Düğümleri kodla
-    subgraph = extract_subgraph(G, query)
-    graph_embedding = encode_graph(subgraph)
-    response = generate_response(subgraph, query)
-    return response, graph_embedding
-
-# Örnek kullanım
-query = "İstanbul ve Ankara"
-result, embedding = graphrag(query)
-print(result)
-print(f"\nSorgu embedding boyutu: {len(embedding)}")
-
-import networkx as nx
-import matplotlib.pyplot as plt
-
-# Create an empty graph
-G = nx.Graph()
-
-# Add nodes
-G.add_node("A")
-G.add_node("B")
-G.add_node("C")
-
-# Add edges
-G.add_edge("A", "B")
-G.add_edge("B", "C")
-G.add_edge("C", "A")
-
-# Print graph information
-print("Nodes:", G.nodes()) # Nodes nedir : düğümler
-print("Edges:", G.edges()) # Edge nedir : düğümler arasındaki bağlantılar
-
-# Draw the graph
-nx.draw(G, with_labels=True)
-plt.show()
+
+    # Add nodes
+    G.add_node("A")
+    G.add_node("B")
+    G.add_node("C")
+
+    # Add edges
+    G.add_edge("A", "B")
+    G.add_edge("B", "C")
+    G.add_edge("C", "A")
+
+    # Print graph information
+    print("Nodes:", G.nodes()) # Nodes nedir : düğümler
+    print("Edges:", G.edges()) # Edge nedir : düğümler arasındaki bağlantılar
+
+    # Draw the graph
+    nx.draw(G, with_labels=True)
+    plt.show()